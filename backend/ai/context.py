@@ -0,0 +1,71 @@
+"""The overview the AI assistant starts every conversation from.
+
+The prompt carries only a few lines about the user; anything more specific is
+fetched on demand through the tools in ``ai.tools``, so its size no longer
+grows with the number of friends or expenses. The overview is rendered from
+the pair ledgers and cached per user under their ledger version, which every
+balance change bumps. The rendered prompt is byte-identical while the version
+and the date hold, which is what provider-side prompt caching needs.
+"""
+from datetime import date
+
+from django.core.cache import caches
+
+from users import services
+
+
+CACHE_ALIAS = 'ai_context'
+
+
+def build_context(user):
+    """Render ``user``'s overview: who they are and where their balances stand overall."""
+    lines = [f"User: {user.name} (@{getattr(user, 'username', '') or ''})"]
+    friendships = services.list_friend_ledgers(user)
+    if not friendships:
+        lines.append('No friends added yet.')
+        return '\n'.join(lines)
+    balances = [float(f.balance or 0) for f in friendships]
+    owed_to_you = sum(b for b in balances if b > 0.01)
+    you_owe = sum(-b for b in balances if b < -0.01)
+    open_count = sum(1 for b in balances if abs(b) > 0.01)
+    lines.append(
+        f"Overall: you are owed ${owed_to_you:.2f}, you owe ${you_owe:.2f}, net ${sum(balances):+.2f} "
+        f"across {len(friendships)} friend{'s' if len(friendships) != 1 else ''} ({open_count} unsettled)"
+    )
+    return '\n'.join(lines)
+
+
+SYSTEM_PROMPT = """\
+You are a helpful personal finance assistant embedded in Balance Studio, a shared expense tracking app.
+
+Today is {today}. The overview below is all you know up front. Use the tools to look up balances with a friend, expenses in a date range, spending per group or a settle-up plan before answering; call only the ones the question needs. Answer using ONLY the overview and tool results — do not invent numbers or assume anything not shown. Be concise, friendly, and specific. Format all money as $X.XX.
+
+If the user asks something unrelated to their finances, politely redirect them to ask about their expenses or balances.
+
+USER OVERVIEW:
+{context}"""
+
+
+def context_version(user) -> str:
+    return str(services.ledger_version(user))
+
+
+def cached_context(user) -> str:
+    """Return ``build_context(user)``, rendered at most once per context version."""
+    # Read the version before the data so a cached snapshot is never older than its key.
+    key = f"context:{user.id}:{context_version(user)}"
+    cache = caches[CACHE_ALIAS]
+    context = cache.get(key)
+    if context is None:
+        context = build_context(user)
+        cache.set(key, context)
+    return context
+
+
+def system_prompt(user) -> list:
+    """The system prompt as content blocks, marked so the provider caches it across turns."""
+    return [{
+        'type': 'text',
+        'text': SYSTEM_PROMPT.format(today=date.today().isoformat(), context=cached_context(user)),
+        'cache_control': {'type': 'ephemeral'},
+    }]
@@ -0,0 +1,149 @@
+"""A deterministic stand-in for the provider client, for tests and local runs.
+
+Set ``AI_FAKE_MODEL=true`` and the gateway hands out these clients instead of
+the real ones. The fake picks a tool from keywords in the user's message, and
+once tool results come back it replies with them verbatim, so a test can drive
+the whole tool loop and assert on exactly what was looked up. Asked without
+tools (conversation summaries), it answers with the tail of the prompt. Only
+the slice of the SDK the gateway uses is implemented: ``messages.create`` and
+``messages.stream``.
+"""
+import json
+import re
+from types import SimpleNamespace
+
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_HANDLE = re.compile(r'@[\w.-]+')
+_WORD = re.compile(r"[\w'-]+")
+
+FALLBACK_REPLY = 'Ask me about your balances, expenses, groups or how to settle up.'
+SUMMARY_CHARS = 200
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return ' '.join(block.get('text', '') for block in content if isinstance(block, dict) and block.get('type') == 'text')
+
+
+def _tool_results(messages) -> list:
+    """``(tool name, result)`` pairs when the last turn is tool results, else ``[]``."""
+    if not messages or not isinstance(messages[-1].get('content'), list):
+        return []
+    results = [block for block in messages[-1]['content'] if isinstance(block, dict) and block.get('type') == 'tool_result']
+    if not results or len(messages) < 2:
+        return []
+    names = {
+        block['id']: block['name']
+        for block in messages[-2].get('content') or []
+        if isinstance(block, dict) and block.get('type') == 'tool_use'
+    }
+    return [(names.get(block['tool_use_id'], 'tool'), block.get('content', '')) for block in results]
+
+
+def pick_tool(message):
+    """The ``(name, input)`` the fake calls for ``message``, or ``None`` to answer directly."""
+    lowered = message.lower()
+    if 'settle' in lowered or 'plan' in lowered:
+        return 'get_simplification_plan', {}
+    if 'group' in lowered:
+        return 'get_group_totals', {}
+    if 'spent' in lowered or 'spend' in lowered or 'expense' in lowered:
+        dates = _DATE.findall(message)
+        return 'list_expenses', dict(zip(('start', 'end'), dates))
+    if 'owe' in lowered or 'balance' in lowered:
+        handle = _HANDLE.search(message)
+        words = _WORD.findall(message)
+        friend = handle.group(0) if handle else (words[-1] if words else '')
+        return 'get_friend_balance', {'friend': friend}
+    return None
+
+
+def reply(params):
+    """Build the response message for a ``messages.create`` call."""
+    messages = params.get('messages') or []
+    results = _tool_results(messages)
+    tool = None
+    if results:
+        text = ' '.join(f"{name}: {content}" for name, content in results)
+    else:
+        user_text = _text(messages[-1]['content']) if messages else ''
+        if not params.get('tools'):
+            text = f"Summary: {user_text[-SUMMARY_CHARS:]}"
+        else:
+            if (params.get('tool_choice') or {}).get('type') != 'none':
+                tool = pick_tool(user_text)
+            text = FALLBACK_REPLY
+
+    if tool:
+        name, arguments = tool
+        content = [SimpleNamespace(type='tool_use', id=f"toolu_fake_{len(messages)}", name=name, input=arguments)]
+        stop_reason = 'tool_use'
+        output = json.dumps(arguments)
+    else:
+        content = [SimpleNamespace(type='text', text=text)]
+        stop_reason = 'end_turn'
+        output = text
+    prompt = json.dumps([params.get('system'), messages, params.get('tools')], default=str)
+    return SimpleNamespace(
+        id='msg_fake',
+        type='message',
+        role='assistant',
+        model=params.get('model'),
+        content=content,
+        stop_reason=stop_reason,
+        usage=SimpleNamespace(
+            # Roughly four characters per token, like the real tokenizer on English.
+            input_tokens=len(prompt) // 4,
+            output_tokens=max(1, len(output) // 4),
+            cache_read_input_tokens=0,
+            cache_creation_input_tokens=0,
+        ),
+    )
+
+
+class _Messages:
+    def create(self, timeout=None, **params):
+        return reply(params)
+
+
+class FakeClient:
+    def __init__(self):
+        self.messages = _Messages()
+
+
+class _Stream:
+    def __init__(self, message):
+        self._message = message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        return self._words()
+
+    async def _words(self):
+        for block in self._message.content:
+            if block.type == 'text':
+                for word in re.findall(r'\S+\s*', block.text):
+                    yield word
+
+    async def get_final_message(self):
+        return self._message
+
+
+class _AsyncMessages:
+    async def create(self, timeout=None, **params):
+        return reply(params)
+
+    def stream(self, timeout=None, **params):
+        return _Stream(reply(params))
+
+
+class AsyncFakeClient:
+    def __init__(self):
+        self.messages = _AsyncMessages()
@@ -0,0 +1,293 @@
+"""The one way out to the AI provider.
+
+Every model call goes through here so they all share:
+
+* one keep-alive client per process (and one async client per event loop),
+* a per-call deadline and a bounded retry policy,
+* a process-wide cap on calls in flight; callers over it are turned away,
+* a circuit breaker: after ``AI_BREAKER_FAILURES`` consecutive provider
+  failures, calls fail fast for ``AI_BREAKER_COOLDOWN`` seconds, then one
+  trial call decides whether to close it again,
+* per-operation latency and token metrics.
+
+Callers catch ``GatewayUnavailable`` and answer 503.
+"""
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+
+class GatewayUnavailable(Exception):
+    """The provider cannot be called right now; the message is safe to show users."""
+
+
+class CircuitOpen(GatewayUnavailable):
+    pass
+
+
+class GatewayBusy(GatewayUnavailable):
+    pass
+
+
+class ConcurrencyLimit:
+    """Non-blocking counter of calls in flight; callers are turned away instead of queued."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.active = max(0, self.active - 1)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            # Half-open: let one call through to probe the provider.
+            self._trial = True
+            return True
+
+    def release_trial(self) -> None:
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class Metrics:
+    """Per-operation counters and latency histogram, rendered in the Prometheus text format."""
+
+    BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+
+    def _row(self, operation):
+        return self.operations.setdefault(operation, {
+            'calls': 0,
+            'failures': 0,
+            'rejected': 0,
+            'latency_sum': 0.0,
+            'latency_buckets': [0] * len(self.BUCKETS),
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0,
+        })
+
+    def reject(self, operation) -> None:
+        with self._lock:
+            self._row(operation)['rejected'] += 1
+
+    def observe(self, operation, seconds, ok, usage=None) -> None:
+        with self._lock:
+            row = self._row(operation)
+            row['calls'] += 1
+            row['failures'] += 0 if ok else 1
+            row['latency_sum'] += seconds
+            for index, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    row['latency_buckets'][index] += 1
+            for field in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                value = getattr(usage, field, None)
+                if isinstance(value, int):
+                    row[field] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {operation: dict(row, latency_buckets=list(row['latency_buckets'])) for operation, row in self.operations.items()}
+
+    def render(self) -> str:
+        lines = []
+        for operation, row in sorted(self.snapshot().items()):
+            label = f'operation="{operation}"'
+            lines.append(f"ai_calls_total{{{label}}} {row['calls']}")
+            lines.append(f"ai_call_failures_total{{{label}}} {row['failures']}")
+            lines.append(f"ai_calls_rejected_total{{{label}}} {row['rejected']}")
+            for bound, count in zip(self.BUCKETS, row['latency_buckets']):
+                lines.append(f'ai_call_latency_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'ai_call_latency_seconds_bucket{{{label},le="+Inf"}} {row["calls"]}')
+            lines.append(f"ai_call_latency_seconds_sum{{{label}}} {row['latency_sum']:.6f}")
+            lines.append(f"ai_call_latency_seconds_count{{{label}}} {row['calls']}")
+            for field in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                lines.append(f"ai_{field}_total{{{label}}} {row[field]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _provider_failure(exc) -> bool:
+    """Timeouts, connection errors, rate limits and 5xx trip the breaker; bad requests do not."""
+    status_code = getattr(exc, 'status_code', None)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+limit = ConcurrencyLimit(settings.AI_MAX_CONCURRENCY)
+breaker = CircuitBreaker(settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_COOLDOWN)
+metrics = Metrics()
+_client = None
+_client_lock = threading.Lock()
+# The async client's connection pool is bound to the event loop that created it.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _client_options() -> dict:
+    return {
+        'api_key': settings.ANTHROPIC_API_KEY,
+        'base_url': settings.ANTHROPIC_BASE_URL or None,
+        'timeout': settings.AI_TIMEOUT_SECONDS,
+        'max_retries': settings.AI_MAX_RETRIES,
+    }
+
+
+def client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if settings.AI_FAKE_MODEL:
+                    from .fake import FakeClient
+
+                    _client = FakeClient()
+                else:
+                    import anthropic
+
+                    _client = anthropic.Anthropic(**_client_options())
+    return _client
+
+
+def async_client(loop):
+    found = _async_clients.get(loop)
+    if found is None:
+        if settings.AI_FAKE_MODEL:
+            from .fake import AsyncFakeClient
+
+            found = AsyncFakeClient()
+        else:
+            import anthropic
+
+            found = anthropic.AsyncAnthropic(**_client_options())
+        _async_clients[loop] = found
+    return found
+
+
+def configured() -> bool:
+    """Whether there is a provider to call: an API key, or the fake model."""
+    return bool(getattr(settings, 'ANTHROPIC_API_KEY', '') or settings.AI_FAKE_MODEL)
+
+
+def reset() -> None:
+    """Drop pooled clients and breaker, limit and metrics state (settings changes, tests)."""
+    global _client, limit, breaker, metrics
+    _client = None
+    _async_clients.clear()
+    limit = ConcurrencyLimit(settings.AI_MAX_CONCURRENCY)
+    breaker = CircuitBreaker(settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_COOLDOWN)
+    metrics = Metrics()
+
+
+class Call:
+    """One admitted provider call: holds a concurrency slot until ``finish``."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = time.monotonic()
+        self._done = False
+
+    def finish(self, usage=None, error=None) -> None:
+        if error is not None and not isinstance(error, Exception):
+            # A caller going away (cancellation, closed generator) says nothing about the provider.
+            self.cancel()
+            return
+        if self._done:
+            return
+        self._done = True
+        limit.release()
+        breaker.record(not (error is not None and _provider_failure(error)))
+        metrics.observe(self.operation, time.monotonic() - self.started, error is None, usage)
+
+    def cancel(self) -> None:
+        """Give back the slot of a call that never reached the provider; a no-op once finished."""
+        if self._done:
+            return
+        self._done = True
+        limit.release()
+        # Nothing was learned about the provider, so a half-open trial goes to the next caller.
+        breaker.release_trial()
+
+
+def admit(operation) -> Call:
+    """Reserve a slot for one call, or raise ``GatewayUnavailable`` without touching the provider."""
+    if not breaker.allow():
+        metrics.reject(operation)
+        raise CircuitOpen('AI assistant is unavailable right now. Try again in a moment.')
+    if not limit.try_acquire():
+        # The breaker may have handed this caller its half-open trial; give it back.
+        breaker.release_trial()
+        metrics.reject(operation)
+        raise GatewayBusy('AI assistant is busy right now. Try again in a moment.')
+    return Call(operation)
+
+
+def create_message(operation, timeout=None, **params):
+    """Blocking ``messages.create`` through the gateway."""
+    call = admit(operation)
+    try:
+        result = client().messages.create(timeout=timeout or settings.AI_TIMEOUT_SECONDS, **params)
+    except Exception as exc:
+        call.finish(error=exc)
+        raise
+    call.finish(usage=getattr(result, 'usage', None))
+    return result
+
+
+@asynccontextmanager
+async def stream_message(call, loop, timeout=None, **params):
+    """``messages.stream`` on the async client for an already admitted ``call``; finishes it on exit."""
+    usage = None
+    try:
+        async with async_client(loop).messages.stream(timeout=timeout or settings.AI_TIMEOUT_SECONDS, **params) as stream:
+            yield stream
+            usage = (await stream.get_final_message()).usage
+    except BaseException as exc:
+        call.finish(error=exc)
+        raise
+    call.finish(usage=usage)
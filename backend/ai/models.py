@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from mongoengine import (
+    DateTimeField,
+    DictField,
+    Document,
+    IntField,
+    ListField,
+    ReferenceField,
+    StringField,
+    CASCADE,
+)
+
+
+class ChatSession(Document):
+    """One AI conversation, held server-side so clients send only the new message.
+
+    ``turns`` are the recent ``{role, content}`` exchanges kept verbatim;
+    anything older has been folded into ``summary``. ``revision`` moves on every
+    write so compaction can tell when a newer turn landed underneath it.
+    """
+
+    user = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+    summary = StringField(default='')
+    turns = ListField(DictField(), default=list)
+    revision = IntField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'collection': 'ai_chat_sessions',
+        'indexes': [
+            {'fields': ['user', '-updated_at']},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+    }
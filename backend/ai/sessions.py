@@ -0,0 +1,164 @@
+"""Server-side AI chat sessions with a rolling summary.
+
+A client names its conversation with the ``session_id`` the first reply hands
+back and from then on sends only the new message. Each finished exchange is
+appended to the session (the final reply text, not the tool traffic behind
+it). Once the stored turns cost more than ``AI_HISTORY_TOKEN_BUDGET``
+estimated tokens, all but the last ``KEEP_TURNS`` are folded into the session
+summary with one cheap model call. The prompt then carries the summary plus
+the recent turns, so it stays bounded however long the conversation runs.
+Sessions expire ``AI_SESSION_TTL_HOURS`` after their last message through a
+TTL index.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.conf import settings
+
+from . import gateway, streaming
+from .models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+# Turns always kept verbatim: the last two exchanges.
+KEEP_TURNS = 4
+# Hard cap on stored turns, in case summarizing keeps failing.
+MAX_STORED_TURNS = 40
+SUMMARY_MAX_TOKENS = 300
+
+SUMMARY_PROMPT = """\
+You maintain the running summary of a conversation between a user and the personal finance assistant of Balance Studio, a shared expense tracking app.
+
+Merge the new turns into the summary so far. Keep names, amounts, dates and anything the user asked the assistant to remember; drop greetings and small talk. Write at most 120 words of plain prose and reply with the summary only."""
+
+
+def estimate_tokens(text) -> int:
+    # About four characters per token for English; close enough for a budget.
+    return len(text or '') // 4 + 1
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(hours=settings.AI_SESSION_TTL_HOURS)
+
+
+def open_session(user, session_id=None) -> ChatSession:
+    """Return ``user``'s live session ``session_id``, or start a new one when it is missing or expired."""
+    if session_id and ObjectId.is_valid(str(session_id)):
+        # The TTL monitor only sweeps once a minute, so check the expiry here too.
+        session = ChatSession.objects(id=session_id, user=user, expires_at__gt=datetime.utcnow()).first()
+        if session is not None:
+            return session
+    return ChatSession(user=user, expires_at=_expiry()).save()
+
+
+def prompt(session, system, message):
+    """Return the ``(system, messages)`` for ``message``: the summary, then the newest turns that fit the budget."""
+    budget = settings.AI_HISTORY_TOKEN_BUDGET
+    turns = []
+    for turn in reversed(session.turns or []):
+        budget -= estimate_tokens(turn.get('content'))
+        if budget < 0:
+            break
+        turns.append({'role': turn['role'], 'content': turn['content']})
+    turns.reverse()
+    # The conversation sent to the provider must open with a user turn.
+    while turns and turns[0]['role'] != 'user':
+        turns.pop(0)
+    if session.summary:
+        # After the cached block, so a new summary does not invalidate the cached prefix.
+        system = system + [{'type': 'text', 'text': f"EARLIER IN THIS CONVERSATION:\n{session.summary}"}]
+    return system, turns + [{'role': 'user', 'content': message}]
+
+
+def record(session, message, reply) -> None:
+    """Append one exchange and push the session's expiry out."""
+    now = datetime.utcnow()
+    ChatSession._get_collection().update_one(
+        {'_id': session.id},
+        {
+            '$push': {'turns': {
+                '$each': [{'role': 'user', 'content': message}, {'role': 'assistant', 'content': reply}],
+                '$slice': -MAX_STORED_TURNS,
+            }},
+            '$inc': {'revision': 1},
+            '$set': {'updated_at': now, 'expires_at': _expiry()},
+        },
+    )
+
+
+def _transcript(turns) -> str:
+    return '\n'.join(f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in turns)
+
+
+def compact(session) -> bool:
+    """Fold the older turns into the summary once the stored turns exceed the budget.
+
+    Best effort: it runs after the reply has gone out, so on any error or a
+    concurrent write the turns stay as they are and the next exchange tries
+    again. Returns whether it compacted.
+    """
+    try:
+        return _compact(session)
+    except Exception as exc:
+        logger.exception('AI chat compaction failed for session %s: %s', session.id, exc)
+        return False
+
+
+def _compact(session) -> bool:
+    collection = ChatSession._get_collection()
+    document = collection.find_one({'_id': session.id}, {'turns': 1, 'summary': 1, 'revision': 1})
+    if not document:
+        return False
+    turns = document.get('turns') or []
+    if sum(estimate_tokens(turn.get('content')) for turn in turns) <= settings.AI_HISTORY_TOKEN_BUDGET:
+        return False
+    # Cut on an exchange boundary so the kept turns still open with the user.
+    cut = len(turns) - KEEP_TURNS
+    cut -= cut % 2
+    if cut <= 0:
+        return False
+
+    previous = document.get('summary') or '(none yet)'
+    try:
+        result = gateway.create_message(
+            'chat_summary',
+            model=streaming.MODEL,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            system=SUMMARY_PROMPT,
+            messages=[{'role': 'user', 'content': f"Summary so far:\n{previous}\n\nNew turns:\n{_transcript(turns[:cut])}"}],
+        )
+    except Exception as exc:
+        logger.warning('AI chat summary failed for session %s: %s', session.id, exc)
+        return False
+    summary = streaming.reply_text(result).strip()
+    if not summary:
+        return False
+
+    updated = collection.update_one(
+        {'_id': session.id, 'revision': document.get('revision', 0)},
+        {'$set': {'summary': summary, 'turns': turns[cut:]}, '$inc': {'revision': 1}},
+    )
+    return updated.modified_count == 1
+
+
+async def relay(call, system, messages, user, session, message):
+    """``streaming.relay`` for a session: names the session first, records the reply, then compacts."""
+    frames = streaming.relay(
+        call,
+        system,
+        messages,
+        user,
+        on_reply=lambda reply: record(session, message, reply),
+    )
+    try:
+        yield streaming.sse('session', {'session_id': str(session.id)})
+        async for frame in frames:
+            yield frame
+    finally:
+        # Close the relay so its open round finishes now; if it never started, free the call here.
+        await frames.aclose()
+        call.cancel()
+    # After ``done``, so the summary call never holds up the answer.
+    await sync_to_async(compact)(session)
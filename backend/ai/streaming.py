@@ -0,0 +1,88 @@
+"""AI chat replies, blocking or streamed over Server-Sent Events.
+
+A reply may take several model rounds: while the model asks for tools, they
+are run and their results sent back, up to ``MAX_TOOL_ROUNDS`` times. Streamed
+replies use the gateway's async client and are relayed token by token, so an
+open chat holds a coroutine instead of a worker thread.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+
+from . import gateway, tools
+
+logger = logging.getLogger(__name__)
+
+MODEL = 'claude-haiku-4-5-20251001'
+MAX_TOKENS = 600
+MAX_MESSAGE_LENGTH = 600
+# Rounds of tool calls per reply; the round after the last must answer in text.
+MAX_TOOL_ROUNDS = 4
+
+
+def request_params(system, messages, rounds_used) -> dict:
+    params = {
+        'model': MODEL,
+        'max_tokens': MAX_TOKENS,
+        'system': system,
+        'messages': messages,
+        'tools': tools.DEFINITIONS,
+    }
+    if rounds_used >= MAX_TOOL_ROUNDS:
+        params['tool_choice'] = {'type': 'none'}
+    return params
+
+
+def reply_text(message) -> str:
+    return ''.join(block.text for block in message.content if block.type == 'text')
+
+
+def complete(user, system, messages) -> str:
+    """Blocking reply to ``messages``, running whatever tools the model asks for along the way."""
+    messages = list(messages)
+    for rounds_used in range(MAX_TOOL_ROUNDS + 1):
+        result = gateway.create_message('chat', **request_params(system, messages, rounds_used))
+        if result.stop_reason != 'tool_use':
+            break
+        messages.extend(tools.run_tool_calls(user, result.content))
+    return reply_text(result)
+
+
+def sse(event, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def relay(call, system, messages, user, on_reply=None):
+    """Yield SSE frames for an admitted gateway ``call``.
+
+    Each text delta is a ``token`` frame and each tool the model runs a ``tool``
+    frame; the stream ends with ``done`` (or ``error``). Rounds after the first
+    are admitted through the gateway like any other call. ``on_reply`` is
+    called (in the sync thread pool) with the finished reply text before ``done``.
+    """
+    messages = list(messages)
+    loop = asyncio.get_running_loop()
+    try:
+        for rounds_used in range(MAX_TOOL_ROUNDS + 1):
+            if call is None:
+                call = gateway.admit('chat_stream')
+            async with gateway.stream_message(call, loop, **request_params(system, messages, rounds_used)) as stream:
+                async for text in stream.text_stream:
+                    yield sse('token', {'text': text})
+                final = await stream.get_final_message()
+            call = None
+            if final.stop_reason != 'tool_use':
+                break
+            for name in tools.tool_names(final.content):
+                yield sse('tool', {'name': name})
+            messages.extend(await sync_to_async(tools.run_tool_calls)(user, final.content))
+        if on_reply is not None:
+            await sync_to_async(on_reply)(reply_text(final))
+        yield sse('done', {'stop_reason': final.stop_reason})
+    except gateway.GatewayUnavailable as exc:
+        yield sse('error', {'error': str(exc)})
+    except Exception as exc:
+        logger.exception('AI chat stream error for user %s: %s', user.id, exc)
+        yield sse('error', {'error': 'AI assistant is unavailable right now. Try again in a moment.'})
@@ -0,0 +1,99 @@
+"""A local stand-in for the Anthropic Messages API.
+
+Serves ``POST /v1/messages`` from a background thread, streaming a canned
+reply in the real SSE event format (or answering with plain JSON when the
+request is not streamed), and records every request body it receives.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _event(name, data) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class FakeAnthropicServer:
+    def __init__(self, chunks=('Hello', ' there'), status=200):
+        self.chunks = list(chunks)
+        self.status = status
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                server.requests.append(body)
+                if server.status != 200:
+                    payload = json.dumps({'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}}).encode()
+                    self.send_response(server.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                if body.get('stream'):
+                    self._stream()
+                else:
+                    self._message()
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                self.wfile.write(_event('message_start', {'type': 'message_start', 'message': server.message(content=[])}))
+                self.wfile.write(_event('content_block_start', {
+                    'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''},
+                }))
+                for chunk in server.chunks:
+                    self.wfile.write(_event('content_block_delta', {
+                        'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': chunk},
+                    }))
+                    self.wfile.flush()
+                self.wfile.write(_event('content_block_stop', {'type': 'content_block_stop', 'index': 0}))
+                self.wfile.write(_event('message_delta', {
+                    'type': 'message_delta',
+                    'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                    'usage': {'output_tokens': len(server.chunks)},
+                }))
+                self.wfile.write(_event('message_stop', {'type': 'message_stop'}))
+                self.wfile.flush()
+
+            def _message(self):
+                payload = json.dumps(server.message(content=[{'type': 'text', 'text': ''.join(server.chunks)}])).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def message(self, content):
+        return {
+            'id': 'msg_fake',
+            'type': 'message',
+            'role': 'assistant',
+            'model': 'fake-model',
+            'content': content,
+            'stop_reason': 'end_turn' if content else None,
+            'stop_sequence': None,
+            'usage': {'input_tokens': 12, 'output_tokens': len(self.chunks)},
+        }
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,35 @@
+"""
+Overview cache tests for the AI assistant.
+"""
+from unittest.mock import patch
+
+from ai import context
+from users import services
+from users.models import LedgerEntry
+
+
+class TestContextCache:
+    def test_renders_once_per_version(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        first = context.cached_context(alice)
+        with patch("ai.context.build_context") as build:
+            assert context.cached_context(alice) == first
+        build.assert_not_called()
+        assert "you are owed $10.00" in first
+        assert "Bob" not in first
+
+    def test_ledger_writes_invalidate(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        version = context.context_version(alice)
+        assert "you owe $0.00" in context.cached_context(alice)
+        services.apply_balance_change(alice, bob, -25.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        assert context.context_version(alice) != version
+        assert "you owe $15.00" in context.cached_context(alice)
+
+    def test_system_prompt_is_marked_for_prompt_caching(self, make_user):
+        alice = make_user("Alice")
+        blocks = context.system_prompt(alice)
+        assert blocks[0]["cache_control"] == {"type": "ephemeral"}
+        assert blocks[0]["text"].endswith(context.cached_context(alice))
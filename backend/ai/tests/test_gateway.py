@@ -0,0 +1,104 @@
+"""
+AI gateway tests: breaker, concurrency cap and metrics, with the provider client mocked.
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ai import gateway
+
+
+class _ProviderError(Exception):
+    def __init__(self, status_code=None):
+        super().__init__(f"provider error {status_code}")
+        self.status_code = status_code
+
+
+def _fake_client(*effects):
+    client = MagicMock()
+    client.messages.create.side_effect = list(effects)
+    return patch.object(gateway, "client", return_value=client), client
+
+
+def _reply(text="ok", input_tokens=10, output_tokens=3):
+    return MagicMock(content=[MagicMock(text=text)], usage=MagicMock(
+        input_tokens=input_tokens, output_tokens=output_tokens,
+        cache_read_input_tokens=0, cache_creation_input_tokens=0,
+    ))
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures_and_fails_fast(self, settings):
+        settings.AI_BREAKER_FAILURES = 2
+        gateway.reset()
+        patcher, client = _fake_client(_ProviderError(529), _ProviderError())
+        with patcher:
+            for _ in range(2):
+                with pytest.raises(_ProviderError):
+                    gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+            with pytest.raises(gateway.CircuitOpen):
+                gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+        assert client.messages.create.call_count == 2
+        assert gateway.breaker.state == "open"
+        assert gateway.metrics.snapshot()["chat"]["rejected"] == 1
+
+    def test_half_open_trial_closes_on_success(self, settings):
+        settings.AI_BREAKER_FAILURES = 1
+        settings.AI_BREAKER_COOLDOWN = 0
+        gateway.reset()
+        patcher, _ = _fake_client(_ProviderError(500), _reply())
+        with patcher:
+            with pytest.raises(_ProviderError):
+                gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+            assert gateway.breaker.state == "half_open"
+            gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+        assert gateway.breaker.state == "closed"
+
+    def test_a_cancelled_trial_leaves_the_breaker_half_open(self, settings):
+        settings.AI_BREAKER_FAILURES = 1
+        settings.AI_BREAKER_COOLDOWN = 0
+        settings.AI_FAKE_MODEL = True
+        gateway.reset()
+        patcher, _ = _fake_client(_ProviderError(500))
+        with patcher, pytest.raises(_ProviderError):
+            gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+
+        async def disconnect():
+            call = gateway.admit("chat_stream")
+            async with gateway.stream_message(call, asyncio.get_running_loop(), model="m", max_tokens=1,
+                                              messages=[{"role": "user", "content": "hi"}]):
+                raise asyncio.CancelledError
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(disconnect())
+        assert gateway.breaker.state == "half_open"
+        assert gateway.breaker.failures == 1
+        assert "chat_stream" not in gateway.metrics.snapshot()
+        assert gateway.limit.active == 0
+        # The trial went back, so the next caller may probe the provider.
+        assert gateway.breaker.allow()
+
+    def test_bad_requests_do_not_trip_the_breaker(self, settings):
+        settings.AI_BREAKER_FAILURES = 1
+        gateway.reset()
+        patcher, _ = _fake_client(_ProviderError(400))
+        with patcher, pytest.raises(_ProviderError):
+            gateway.create_message("chat", model="m", max_tokens=1, messages=[])
+        assert gateway.breaker.state == "closed"
+
+
+class TestLimitsAndMetrics:
+    def test_calls_over_the_cap_are_rejected(self):
+        with patch.object(gateway.limit, "limit", 0), pytest.raises(gateway.GatewayBusy):
+            gateway.create_message("receipt_scan", model="m", max_tokens=1, messages=[])
+
+    def test_records_latency_and_tokens_per_operation(self):
+        patcher, client = _fake_client(_reply(input_tokens=120, output_tokens=8))
+        with patcher:
+            gateway.create_message("chat", timeout=5, model="m", max_tokens=1, messages=[])
+        assert client.messages.create.call_args.kwargs["timeout"] == 5
+        row = gateway.metrics.snapshot()["chat"]
+        assert (row["calls"], row["failures"], row["input_tokens"], row["output_tokens"]) == (1, 0, 120, 8)
+        assert 'ai_input_tokens_total{operation="chat"} 120' in gateway.metrics.render()
+        assert gateway.limit.active == 0
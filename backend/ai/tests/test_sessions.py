@@ -0,0 +1,142 @@
+"""
+AI chat session tests: server-side turns, expiry and rolling summaries, with the fake model.
+"""
+import json
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pymongo.errors import PyMongoError
+from rest_framework.test import APIRequestFactory
+
+from ai import gateway, sessions
+from ai.models import ChatSession
+from ai.views import AIChatView
+
+
+def _chat(user, payload):
+    raw = APIRequestFactory().post("/", data=json.dumps(payload), content_type="application/json")
+    raw._force_auth_user = user
+    response = AIChatView.as_view()(raw)
+    # As the server does once the response is sent; the session is compacted then.
+    response.close()
+    return response
+
+
+@pytest.fixture(autouse=True)
+def fake_model(settings):
+    settings.AI_FAKE_MODEL = True
+
+
+class TestSessions:
+    def test_turns_are_kept_server_side(self, make_user):
+        alice = make_user()
+        first = _chat(alice, {"message": "Hello"})
+        session_id = first.data["session_id"]
+        second = _chat(alice, {"message": "Hi again", "session_id": session_id})
+        assert second.data["session_id"] == session_id
+        session = ChatSession.objects.get(id=session_id)
+        assert [turn["role"] for turn in session.turns] == ["user", "assistant"] * 2
+        assert session.turns[2]["content"] == "Hi again"
+        _, messages = sessions.prompt(session, [], "And now?")
+        assert [message["content"] for message in messages][::2] == ["Hello", "Hi again", "And now?"]
+
+    def test_unknown_expired_or_foreign_sessions_start_afresh(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        bobs = _chat(bob, {"message": "Hello"}).data["session_id"]
+        expired = ChatSession(user=alice, expires_at=datetime.utcnow() - timedelta(minutes=1)).save()
+        started = []
+        for session_id in (bobs, str(expired.id), "not-an-id"):
+            started.append(_chat(alice, {"message": "Hello", "session_id": session_id}).data["session_id"])
+            assert started[-1] != session_id
+        assert len(set(started)) == 3
+        assert all(ChatSession.objects.get(id=session_id).user == alice for session_id in started)
+        # Neither old session took Alice's turn; the TTL index may already have dropped the expired one.
+        assert len(ChatSession.objects.get(id=bobs).turns) == 2
+        assert not ChatSession.objects(id=expired.id, revision__gt=0).count()
+
+    def test_prompt_keeps_the_newest_turns_within_budget(self, settings, make_user):
+        settings.AI_HISTORY_TOKEN_BUDGET = 40
+        session = ChatSession(user=make_user(), expires_at=datetime.utcnow(), summary="Alice owes Bob $5.00.", turns=[
+            {"role": "user", "content": "x" * 80},
+            {"role": "assistant", "content": "y" * 40},
+            {"role": "user", "content": "z" * 40},
+            {"role": "assistant", "content": "w" * 40},
+        ])
+        system, messages = sessions.prompt(session, [{"type": "text", "text": "base"}], "next")
+        # The newest turns that fit start with an assistant turn, which is dropped.
+        assert messages == [{"role": "user", "content": "z" * 40}, {"role": "assistant", "content": "w" * 40}, {"role": "user", "content": "next"}]
+        assert system[1]["text"].endswith("Alice owes Bob $5.00.")
+
+
+class TestCompaction:
+    def test_older_turns_fold_into_the_summary(self, settings, make_user):
+        settings.AI_HISTORY_TOKEN_BUDGET = 50
+        alice = make_user()
+        session_id = None
+        for index in range(4):
+            session_id = _chat(alice, {"message": f"question {index} " + "x" * 60, "session_id": session_id}).data["session_id"]
+        session = ChatSession.objects.get(id=session_id)
+        assert session.summary.startswith("Summary: ")
+        assert len(session.turns) <= sessions.KEEP_TURNS
+        assert session.turns[0]["role"] == "user"
+        assert session.turns[-2]["content"].startswith("question 3")
+        assert gateway.metrics.snapshot()["chat_summary"]["calls"] >= 1
+
+    def test_compaction_waits_until_the_response_is_closed(self, settings, make_user):
+        settings.AI_HISTORY_TOKEN_BUDGET = 10
+        session = ChatSession(user=make_user(), expires_at=datetime.utcnow() + timedelta(hours=1)).save()
+        for index in range(3):
+            sessions.record(session, f"question {index} " + "x" * 40, "answer")
+        raw = APIRequestFactory().post("/", data=json.dumps({"message": "Hello", "session_id": str(session.id)}), content_type="application/json")
+        raw._force_auth_user = session.user
+        response = AIChatView.as_view()(raw)
+        assert response.status_code == 200
+        assert "chat_summary" not in gateway.metrics.snapshot()
+        response.close()
+        assert ChatSession.objects.get(id=session.id).summary.startswith("Summary: ")
+
+    def test_storage_errors_do_not_fail_the_reply(self, make_user):
+        alice = make_user()
+        with patch.object(sessions, "record", side_effect=PyMongoError("down")):
+            response = _chat(alice, {"message": "Hello"})
+        assert response.status_code == 200
+        assert response.data["reply"]
+        session = ChatSession.objects.get(id=response.data["session_id"])
+        collection = MagicMock()
+        collection.find_one.side_effect = PyMongoError("down")
+        with patch.object(ChatSession, "_get_collection", return_value=collection):
+            assert sessions.compact(session) is False
+
+    def test_under_budget_sessions_are_left_alone(self, make_user):
+        alice = make_user()
+        session = ChatSession.objects.get(id=_chat(alice, {"message": "Hello"}).data["session_id"])
+        assert sessions.compact(session) is False
+        assert "chat_summary" not in gateway.metrics.snapshot()
+
+    def test_a_concurrent_turn_wins_over_compaction(self, settings, make_user):
+        settings.AI_HISTORY_TOKEN_BUDGET = 10
+        session = ChatSession(user=make_user(), expires_at=datetime.utcnow() + timedelta(hours=1)).save()
+        for index in range(3):
+            sessions.record(session, f"question {index} " + "x" * 40, "answer")
+        real = gateway.create_message
+
+        def create_message(*args, **kwargs):
+            sessions.record(session, "late question", "late answer")
+            return real(*args, **kwargs)
+
+        with patch.object(gateway, "create_message", side_effect=create_message):
+            assert sessions.compact(session) is False
+        session.reload()
+        assert session.summary == ""
+        assert len(session.turns) == 8
+
+    def test_provider_failures_keep_the_turns(self, settings, make_user):
+        settings.AI_HISTORY_TOKEN_BUDGET = 10
+        session = ChatSession(user=make_user(), expires_at=datetime.utcnow() + timedelta(hours=1)).save()
+        for index in range(3):
+            sessions.record(session, f"question {index} " + "x" * 40, "answer")
+        with patch.object(gateway.limit, "limit", 0):
+            assert sessions.compact(session) is False
+        session.reload()
+        assert len(session.turns) == 6
@@ -0,0 +1,68 @@
+"""
+Streaming chat tests: the async view runs against a local fake Anthropic server.
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+from django.test import AsyncRequestFactory, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ai import gateway
+from ai.tests.fake_anthropic import FakeAnthropicServer
+from ai.views import AIChatStreamView
+
+
+def _call(payload, user=None):
+    """Run the view and drain the stream; returns ``(response, body)``."""
+    headers = {}
+    if user is not None:
+        headers["Authorization"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+    request = AsyncRequestFactory().post("/", data=json.dumps(payload), content_type="application/json", headers=headers)
+
+    async def run():
+        response = await AIChatStreamView.as_view()(request)
+        if not response.streaming:
+            return response, response.content
+        return response, b"".join([chunk async for chunk in response.streaming_content])
+
+    return asyncio.run(run())
+
+
+def _events(body):
+    events = []
+    for frame in body.decode().strip().split("\n\n"):
+        name, data = frame.split("\n", 1)
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+class TestChatStream:
+    def test_relays_tokens_as_server_sent_events(self, make_user):
+        user = make_user()
+        with FakeAnthropicServer(chunks=["You owe ", "Bob $5.00."]) as server:
+            with override_settings(ANTHROPIC_BASE_URL=server.url):
+                response, body = _call({"message": "What do I owe?"}, user)
+        assert response["Content-Type"] == "text/event-stream"
+        events = _events(body)
+        assert events[0][0] == "session"
+        assert [data["text"] for name, data in events if name == "token"] == ["You owe ", "Bob $5.00."]
+        assert events[-1] == ("done", {"stop_reason": "end_turn"})
+        sent = server.requests[0]
+        assert sent["stream"] is True
+        assert sent["messages"][-1] == {"role": "user", "content": "What do I owe?"}
+        assert "USER OVERVIEW" in sent["system"][0]["text"]
+        assert [tool["name"] for tool in sent["tools"]][0] == "get_friend_balance"
+        assert gateway.limit.active == 0
+        assert gateway.metrics.snapshot()["chat_stream"]["output_tokens"] == 2
+
+    def test_rejects_when_the_process_is_at_its_limit(self, make_user):
+        user = make_user()
+        with patch.object(gateway.limit, "limit", 0):
+            response, body = _call({"message": "hi"}, user)
+        assert response.status_code == 503
+        assert response["Retry-After"] == "5"
+
+    def test_requires_authentication_and_a_message(self, make_user):
+        assert _call({"message": "hi"})[0].status_code == 401
+        assert _call({"message": "  "}, make_user())[0].status_code == 400
@@ -0,0 +1,193 @@
+"""
+AI tool tests: each lookup against mongomock, and the chat tool loop driven by the fake model.
+"""
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from django.test import AsyncRequestFactory
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ai import gateway, tools
+from ai.views import AIChatStreamView, AIChatView
+from expenses import rollups
+from expenses.models import Expense, ExpenseParticipant
+from users import services
+from users.models import LedgerEntry, User
+
+
+def _expense(payer, shares, note, group_name="", when=datetime(2026, 3, 5)):
+    expense = Expense(
+        payer=payer,
+        note=note,
+        group_name=group_name,
+        total_amount=sum(amount for _, amount in shares),
+        participants=[ExpenseParticipant(user=user, amount=amount, is_payer=user == payer) for user, amount in shares],
+        created_at=when,
+    )
+    expense.sync_participant_snapshot()
+    expense.save()
+    rollups.apply_expense(expense)
+    return expense
+
+
+def _circle(make_user):
+    alice, bob, cara = make_user("Alice"), make_user("Bob Stone"), make_user("Cara")
+    services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+    services.apply_balance_change(alice, cara, -4.0, "Rent", source=LedgerEntry.SOURCE_EXPENSE)
+    return alice, bob, cara
+
+
+class TestTools:
+    def test_friend_balance_by_first_name_or_handle(self, make_user):
+        alice, bob, _ = _circle(make_user)
+        by_name = tools.run(alice, "get_friend_balance", {"friend": "Bob"})
+        assert (by_name["friend"], by_name["username"], by_name["balance"]) == ("Bob Stone", "bob", 10.0)
+        assert by_name["groups"][0]["label"] == "Trip"
+        assert tools.run(alice, "get_friend_balance", {"friend": "@Bob"}) == by_name
+        assert tools.run(alice, "get_friend_balance", {"friend": "Stone"}) == {"error": "No friend called Stone was found."}
+
+    def test_strangers_are_not_found(self, make_user):
+        alice, _, _ = _circle(make_user)
+        make_user("Dave")
+        assert "error" in tools.run(alice, "get_friend_balance", {"friend": "Dave"})
+
+    def test_strangers_with_the_same_name_do_not_hide_a_friend(self, make_user):
+        alice, _, cara = _circle(make_user)
+        for index in range(12):
+            stranger = User(email=f"cara{index}@example.com", username=f"cara{index}", name="Cara")
+            stranger.set_password("password123")
+            stranger.save()
+        assert tools.run(alice, "get_friend_balance", {"friend": "cara"})["username"] == cara.username
+
+    def test_list_expenses_filters_by_range_friend_and_group(self, make_user):
+        alice, bob, cara = _circle(make_user)
+        _expense(alice, [(alice, 6.0), (bob, 6.0)], "Dinner", "Trip", datetime(2026, 3, 5))
+        _expense(cara, [(alice, 5.0), (cara, 5.0)], "Groceries", "Rent", datetime(2026, 3, 20))
+        _expense(alice, [(alice, 2.0), (bob, 2.0)], "Coffee", "", datetime(2026, 4, 2))
+
+        march = tools.run(alice, "list_expenses", {"start": "2026-03-01", "end": "2026-03-31"})
+        assert [row["note"] for row in march["expenses"]] == ["Groceries", "Dinner"]
+        assert march["expenses"][0] == {
+            "date": "2026-03-20", "note": "Groceries", "group": "Rent", "total": 10.0,
+            "paid_by": "Cara", "your_share": 5.0, "with": ["Cara"],
+        }
+        with_bob = tools.run(alice, "list_expenses", {"friend": "Bob"})
+        assert [row["note"] for row in with_bob["expenses"]] == ["Coffee", "Dinner"]
+        assert [row["note"] for row in tools.run(alice, "list_expenses", {"group": "rent"})["expenses"]] == ["Groceries"]
+        assert tools.run(alice, "list_expenses", {"start": "March"}) == {"error": "start must be a date in YYYY-MM-DD format."}
+
+    def test_group_totals_come_from_the_rollups(self, make_user):
+        alice, bob, cara = _circle(make_user)
+        _expense(alice, [(alice, 6.0), (bob, 6.0)], "Dinner", "Trip", datetime(2026, 3, 5))
+        _expense(cara, [(alice, 5.0), (cara, 5.0)], "Groceries", "Rent", datetime(2026, 3, 20))
+        _expense(alice, [(alice, 2.0), (bob, 2.0)], "Lunch", "Trip", datetime(2026, 4, 2))
+
+        totals = tools.run(alice, "get_group_totals", {})
+        assert totals == {
+            "from": "2026-03", "to": "2026-04",
+            "groups": [{"group": "Trip", "your_share": 8.0}, {"group": "Rent", "your_share": 5.0}],
+        }
+        assert tools.run(alice, "get_group_totals", {"start": "2026-04-01"})["groups"] == [{"group": "Trip", "your_share": 2.0}]
+
+    def test_simplification_plan_and_unknown_tools(self, make_user):
+        alice, _, _ = _circle(make_user)
+        plan = tools.run(alice, "get_simplification_plan", {})
+        assert plan["simplified_count"] == 2
+        assert tools.run(alice, "drop_tables", {}) == {"error": "Unknown tool drop_tables."}
+        assert tools.run(alice, "get_simplification_plan", {"friend": "x"}) == {"error": "Unexpected arguments for get_simplification_plan."}
+
+
+class TestToolLoop:
+    @pytest.fixture(autouse=True)
+    def fake_model(self, settings):
+        settings.AI_FAKE_MODEL = True
+
+    def test_chat_runs_the_requested_tool_and_answers_from_it(self, make_user):
+        alice, _, _ = _circle(make_user)
+        raw = APIRequestFactory().post("/", data=json.dumps({"message": "How much does @bob owe me?"}), content_type="application/json")
+        raw._force_auth_user = alice
+        response = AIChatView.as_view()(raw)
+        assert response.status_code == 200
+        assert response.data["reply"].startswith("get_friend_balance: ")
+        assert json.loads(response.data["reply"].split(": ", 1)[1])["balance"] == 10.0
+        assert gateway.metrics.snapshot()["chat"]["calls"] == 2
+        assert gateway.limit.active == 0
+
+    def test_questions_needing_no_data_take_one_round(self, make_user):
+        alice = make_user("Alice")
+        raw = APIRequestFactory().post("/", data=json.dumps({"message": "Hello"}), content_type="application/json")
+        raw._force_auth_user = alice
+        response = AIChatView.as_view()(raw)
+        assert gateway.metrics.snapshot()["chat"]["calls"] == 1
+        assert response.data["reply"]
+
+    def test_stream_reports_tools_then_streams_the_answer(self, make_user):
+        alice, _, _ = _circle(make_user)
+        request = AsyncRequestFactory().post(
+            "/",
+            data=json.dumps({"message": "How should we settle up?"}),
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {RefreshToken.for_user(alice).access_token}"},
+        )
+
+        async def run():
+            response = await AIChatStreamView.as_view()(request)
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        frames = asyncio.run(run()).decode().strip().split("\n\n")
+        names = [frame.split("\n", 1)[0][len("event: "):] for frame in frames]
+        assert names[:2] == ["session", "tool"]
+        assert json.loads(frames[1].split("data: ", 1)[1]) == {"name": "get_simplification_plan"}
+        assert names[-1] == "done"
+        assert "token" in names
+        assert gateway.metrics.snapshot()["chat_stream"]["calls"] == 2
+        assert gateway.limit.active == 0
+
+    def _stream_request(self, user, message="How should we settle up?"):
+        return AsyncRequestFactory().post(
+            "/",
+            data=json.dumps({"message": message}),
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"},
+        )
+
+    def test_a_request_cancelled_before_streaming_takes_no_slot(self, make_user):
+        alice, _, _ = _circle(make_user)
+        request = self._stream_request(alice)
+        with patch("ai.views.system_prompt", side_effect=asyncio.CancelledError), pytest.raises(asyncio.CancelledError):
+            asyncio.run(AIChatStreamView.as_view()(request))
+        assert gateway.limit.active == 0
+
+    def test_closing_an_unstarted_stream_frees_its_slot(self, make_user):
+        alice, _, _ = _circle(make_user)
+        request = self._stream_request(alice)
+
+        async def run():
+            response = await AIChatStreamView.as_view()(request)
+            assert gateway.limit.active == 1
+            response.close()
+
+        asyncio.run(run())
+        assert gateway.limit.active == 0
+
+    def test_closing_after_the_session_frame_frees_the_half_open_trial(self, settings, make_user):
+        settings.AI_BREAKER_COOLDOWN = 0
+        gateway.reset()
+        gateway.breaker.opened_at = 0
+        alice, _, _ = _circle(make_user)
+        request = self._stream_request(alice)
+
+        async def run():
+            response = await AIChatStreamView.as_view()(request)
+            frames = response.streaming_content
+            assert (await anext(frames)).startswith(b"event: session")
+            await frames.aclose()
+            response.close()
+
+        asyncio.run(run())
+        assert gateway.limit.active == 0
+        assert gateway.breaker.allow()
@@ -0,0 +1,226 @@
+"""Tools the AI assistant calls to look up the user's data.
+
+Instead of pasting the whole financial history into every prompt, the model
+asks for what a question needs: one friend's balance, expenses in a date
+range, spend per group, or a settle-up plan. Each tool is one or two indexed
+queries scoped to the signed-in user, and returns a small JSON-able dict.
+"""
+import json
+from datetime import timedelta
+
+from mongoengine.queryset.visitor import Q
+
+from backend.loaders import BatchLoader
+from expenses import analytics, plans, rollups
+from expenses.models import Expense
+from users import services
+from users.models import User
+
+
+MAX_EXPENSES = 50
+DEFAULT_EXPENSES = 20
+
+DEFINITIONS = [
+    {
+        'name': 'get_friend_balance',
+        'description': "Balance between the user and one friend, split by shared group. Positive amounts mean the friend owes the user.",
+        'input_schema': {
+            'type': 'object',
+            'properties': {
+                'friend': {'type': 'string', 'description': "The friend's name or @username."},
+            },
+            'required': ['friend'],
+        },
+    },
+    {
+        'name': 'list_expenses',
+        'description': "The user's expenses, newest first, optionally limited to a date range, a friend or a group.",
+        'input_schema': {
+            'type': 'object',
+            'properties': {
+                'start': {'type': 'string', 'description': 'First day to include, YYYY-MM-DD.'},
+                'end': {'type': 'string', 'description': 'Last day to include, YYYY-MM-DD.'},
+                'friend': {'type': 'string', 'description': "Only expenses shared with this friend (name or @username)."},
+                'group': {'type': 'string', 'description': 'Only expenses in this group.'},
+                'limit': {'type': 'integer', 'description': f'At most this many expenses (default {DEFAULT_EXPENSES}, max {MAX_EXPENSES}).'},
+            },
+        },
+    },
+    {
+        'name': 'get_group_totals',
+        'description': "The user's own share of spending per group, for whole months between start and end (default: all time).",
+        'input_schema': {
+            'type': 'object',
+            'properties': {
+                'start': {'type': 'string', 'description': 'YYYY-MM-DD; the month containing it is the first included.'},
+                'end': {'type': 'string', 'description': 'YYYY-MM-DD; the month containing it is the last included.'},
+            },
+        },
+    },
+    {
+        'name': 'get_simplification_plan',
+        'description': 'The fewest payments that settle every balance between the user and their friends.',
+        'input_schema': {'type': 'object', 'properties': {}},
+    },
+]
+
+
+class ToolError(ValueError):
+    pass
+
+
+def _find_friend(user, query):
+    query = str(query or '').strip()
+    if not query:
+        raise ToolError("Say which friend to look up.")
+    # Only the user's own friends are searched, so a common name cannot crowd them out.
+    friend_ids = [ledger.friend_id for ledger in services.list_friend_ledgers(user)]
+    handle = query.lstrip('@').lower()
+    found = User.objects(
+        Q(id__in=friend_ids) & (Q(username=handle) | Q(name__iexact=query) | Q(name__istartswith=f"{query} "))
+    ).only(*User.SUMMARY_FIELDS).first()
+    if found:
+        return found
+    raise ToolError(f"No friend called {query} was found.")
+
+
+def get_friend_balance(user, friend=None):
+    found = _find_friend(user, friend)
+    breakdown = services.build_friend_breakdown(user, found)
+    return {'friend': found.name, 'username': found.username or '', **breakdown}
+
+
+def list_expenses(user, start=None, end=None, friend=None, group=None, limit=DEFAULT_EXPENSES):
+    try:
+        start_at = analytics.parse_date(start, 'start')
+        end_at = analytics.parse_date(end, 'end')
+        limit = max(1, min(int(limit or DEFAULT_EXPENSES), MAX_EXPENSES))
+    except analytics.AnalyticsError as exc:
+        raise ToolError(str(exc))
+    except (TypeError, ValueError):
+        raise ToolError("limit must be a whole number.")
+
+    members = [user.id]
+    if friend:
+        members.append(_find_friend(user, friend).id)
+    query = Expense.objects(__raw__={'participants.user': {'$all': members}})
+    if start_at:
+        query = query.filter(created_at__gte=start_at)
+    if end_at:
+        query = query.filter(created_at__lt=end_at + timedelta(days=1))
+    if group:
+        query = query.filter(group_name__iexact=services.normalize_group_label(group))
+    expenses = list(query.no_dereference().order_by('-created_at').limit(limit))
+
+    loader = BatchLoader({User: User.SUMMARY_FIELDS})
+    for expense in expenses:
+        refs = [expense._data.get('payer')] + [part._data.get('user') for part in expense.participants]
+        loader.queue(User, *(ref for ref in refs if not expense.profile_of(ref)))
+
+    def _name(expense, ref):
+        if services._ref_id(ref) == user.id:
+            return 'You'
+        # Expenses written before participant snapshots fall back to the batch loader.
+        profile = expense.profile_of(ref)
+        if profile:
+            return profile['name']
+        found = loader.resolve(User, ref)
+        return found.name if found else 'someone'
+
+    return {
+        'expenses': [
+            {
+                'date': expense.created_at.date().isoformat() if expense.created_at else None,
+                'note': expense.note or '',
+                'group': expense.group_name or '',
+                'total': round(expense.total_amount or 0.0, 2),
+                'paid_by': _name(expense, expense._data.get('payer')),
+                'your_share': round(expense.share_of(user) or 0.0, 2),
+                'with': [_name(expense, part._data.get('user')) for part in expense.participants if services._ref_id(part._data.get('user')) != user.id],
+            }
+            for expense in expenses
+        ],
+        'truncated': len(expenses) == limit,
+    }
+
+
+def get_group_totals(user, start=None, end=None):
+    try:
+        start_at = analytics.parse_date(start, 'start')
+        end_at = analytics.parse_date(end, 'end')
+    except analytics.AnalyticsError as exc:
+        raise ToolError(str(exc))
+    months = rollups.recent(
+        user,
+        start=rollups.month_key(start_at) if start_at else '0000-00',
+        end=rollups.month_key(end_at) if end_at else None,
+    )
+    totals = {}
+    labels = {}
+    for month in months:
+        for slug, amount in (month.groups or {}).items():
+            totals[slug] = totals.get(slug, 0.0) + amount
+        labels.update(month.group_labels or {})
+    groups = [
+        {'group': labels.get(slug, slug), 'your_share': round(amount, 2)}
+        for slug, amount in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        if abs(amount) >= 0.01
+    ]
+    return {
+        'from': months[0].month if months else None,
+        'to': months[-1].month if months else None,
+        'groups': groups,
+    }
+
+
+def get_simplification_plan(user):
+    return plans.circle_plan(user)
+
+
+HANDLERS = {
+    'get_friend_balance': get_friend_balance,
+    'list_expenses': list_expenses,
+    'get_group_totals': get_group_totals,
+    'get_simplification_plan': get_simplification_plan,
+}
+
+
+def run(user, name, arguments) -> dict:
+    handler = HANDLERS.get(name)
+    if handler is None:
+        return {'error': f"Unknown tool {name}."}
+    try:
+        return handler(user, **(arguments if isinstance(arguments, dict) else {}))
+    except TypeError:
+        return {'error': f"Unexpected arguments for {name}."}
+    except ToolError as exc:
+        return {'error': str(exc)}
+
+
+def block_param(block) -> dict:
+    """Turn a response content block (SDK object or fake) back into a request block."""
+    if block.type == 'tool_use':
+        return {'type': 'tool_use', 'id': block.id, 'name': block.name, 'input': block.input}
+    return {'type': 'text', 'text': block.text}
+
+
+def run_tool_calls(user, content) -> list:
+    """Execute every ``tool_use`` block in ``content``; returns the assistant and tool-result turns to append."""
+    results = []
+    for block in content:
+        if block.type != 'tool_use':
+            continue
+        results.append({
+            'type': 'tool_result',
+            'tool_use_id': block.id,
+            'content': json.dumps(run(user, block.name, block.input), default=str),
+        })
+    return [
+        {'role': 'assistant', 'content': [block_param(block) for block in content]},
+        {'role': 'user', 'content': results},
+    ]
+
+
+def tool_names(content) -> list:
+    return [block.name for block in content if block.type == 'tool_use']
+
@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import AIChatView
+from django.views.decorators.csrf import csrf_exempt
+
+from .views import AIChatStreamView, AIChatView, AIMetricsView
 
 urlpatterns = [
     path('chat/', AIChatView.as_view(), name='ai-chat'),
+    # Token-authenticated like the DRF views, which are exempt from CSRF too.
+    path('chat/stream/', csrf_exempt(AIChatStreamView.as_view()), name='ai-chat-stream'),
+    path('metrics/', AIMetricsView.as_view(), name='ai-metrics'),
 ]
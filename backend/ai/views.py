@@ -1,121 +1,127 @@
+import json
 import logging
-from datetime import timezone
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from users.models import Friendship
-from expenses.models import Expense, Activity
-
-logger = logging.getLogger(__name__)
+from users.authentication import MongoEngineJWTAuthentication
 
+from . import gateway, sessions, streaming
+from .context import system_prompt
 
-def _date(value):
-    if not value:
-        return 'unknown date'
-    dt = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
-    return dt.strftime('%b %d, %Y')
-
-
-def _build_context(user):
-    lines = []
-    lines.append(f"User: {user.name} (@{getattr(user, 'username', '')})")
-    lines.append('')
-
-    friendships = list(Friendship.objects(user=user))
-    if friendships:
-        net = sum(float(f.balance or 0) for f in friendships)
-        you_owe = sum(abs(float(f.balance)) for f in friendships if float(f.balance or 0) < -0.01)
-        owed_to_you = sum(float(f.balance) for f in friendships if float(f.balance or 0) > 0.01)
-        lines.append(f"Overall: you are owed ${owed_to_you:.2f}, you owe ${you_owe:.2f}, net ${net:+.2f}")
-        lines.append('')
-        lines.append('Friends & balances:')
-        for f in sorted(friendships, key=lambda x: float(x.balance or 0), reverse=True):
-            b = round(float(f.balance or 0), 2)
-            if b > 0.01:
-                tag = f'owes you ${b:.2f}'
-            elif b < -0.01:
-                tag = f'you owe ${abs(b):.2f}'
-            else:
-                tag = 'settled'
-            lines.append(f'  - {f.friend.name} (@{getattr(f.friend, "username", "")}): {tag}')
-    else:
-        lines.append('No friends added yet.')
-    lines.append('')
-
-    expenses = list(Expense.objects(participants__user=user).order_by('-created_at').limit(25))
-    if expenses:
-        lines.append('Recent expenses (newest first):')
-        for exp in expenses:
-            is_payer = str(exp.payer.id) == str(user.id)
-            others = [p for p in exp.participants if str(p.user.id) != str(exp.payer.id)]
-            other_names = ', '.join(p.user.name for p in others) or 'no one'
-            group = f' [{exp.group_name}]' if exp.group_name else ''
-            note = exp.note or 'expense'
-            payer_label = 'You paid' if is_payer else f'{exp.payer.name} paid'
-            lines.append(f'  - {_date(exp.created_at)}: {payer_label} ${exp.total_amount:.2f} for "{note}"{group} with {other_names}')
-    else:
-        lines.append('No expenses recorded yet.')
-    lines.append('')
-
-    activities = list(Activity.objects(user=user).order_by('-created_at').limit(15))
-    if activities:
-        lines.append('Recent activity:')
-        for act in activities:
-            lines.append(f'  - {_date(act.created_at)}: {act.summary}. {act.detail}')
-
-    return '\n'.join(lines)
-
-
-SYSTEM_PROMPT = """\
-You are a helpful personal finance assistant embedded in Balance Studio, a shared expense tracking app.
-
-You have been given this user's complete financial snapshot below. Answer questions using ONLY this data — do not invent numbers or assume anything not shown. Be concise, friendly, and specific. Format all money as $X.XX.
-
-If the user asks something unrelated to their finances, politely redirect them to ask about their expenses or balances.
-
-USER FINANCIAL SNAPSHOT:
-{context}"""
+logger = logging.getLogger(__name__)
 
 
 class AIChatView(APIView):
     def post(self, request):
         message = (request.data.get('message') or '').strip()
-        history = request.data.get('history') or []
 
         if not message:
             return Response({'error': 'Message is required.'}, status=400)
-        if len(message) > 600:
+        if len(message) > streaming.MAX_MESSAGE_LENGTH:
             return Response({'error': 'Message too long (max 600 characters).'}, status=400)
 
-        api_key = getattr(settings, 'ANTHROPIC_API_KEY', '')
-        if not api_key:
+        if not gateway.configured():
             return Response({'error': 'AI assistant is not configured on the server.'}, status=503)
 
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
-            context = _build_context(request.user)
-
-            # Build message list including prior turns for multi-turn conversation
-            messages = []
-            for turn in history[-6:]:  # keep last 3 exchanges (6 turns) as context
-                role = turn.get('role')
-                content = turn.get('content', '')
-                if role in ('user', 'assistant') and content:
-                    messages.append({'role': role, 'content': content})
-            messages.append({'role': 'user', 'content': message})
-
-            result = client.messages.create(
-                model='claude-haiku-4-5-20251001',
-                max_tokens=600,
-                system=SYSTEM_PROMPT.format(context=context),
-                messages=messages,
-            )
-            reply = result.content[0].text
-            return Response({'reply': reply})
+            session = sessions.open_session(request.user, request.data.get('session_id'))
+            system, messages = sessions.prompt(session, system_prompt(request.user), message)
+            reply = streaming.complete(request.user, system, messages)
 
+        except gateway.GatewayUnavailable as exc:
+            return Response({'error': str(exc)}, status=503, headers={'Retry-After': '5'})
         except Exception as exc:
             logger.exception('AI chat error for user %s: %s', request.user.id, exc)
             return Response({'error': 'AI assistant is unavailable right now. Try again in a moment.'}, status=503)
+
+        # The reply is paid for; failing to store it costs the next prompt one turn, not this answer.
+        try:
+            sessions.record(session, message, reply)
+        except Exception as exc:
+            logger.exception('AI chat turn not saved for session %s: %s', session.id, exc)
+        response = Response({'reply': reply, 'session_id': str(session.id)})
+        # The server closes the response once it is sent, so the summary call never delays the reply.
+        response._resource_closers.append(lambda: sessions.compact(session))
+        return response
+
+
+def _authenticate(request):
+    try:
+        result = MongoEngineJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+class AIChatStreamView(View):
+    """POST /api/ai/chat/stream/ — the chat reply as Server-Sent Events.
+
+    Async so a generation in progress holds no worker thread; the Mongo reads
+    for auth, session and context run in the sync thread pool before streaming
+    starts. The first event names the session to send back with the next message.
+    """
+
+    async def post(self, request):
+        user = await sync_to_async(_authenticate)(request)
+        if user is None:
+            return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+        message = str(payload.get('message') or '').strip()
+        if not message:
+            return JsonResponse({'error': 'Message is required.'}, status=400)
+        if len(message) > streaming.MAX_MESSAGE_LENGTH:
+            return JsonResponse({'error': 'Message too long (max 600 characters).'}, status=400)
+        if not gateway.configured():
+            return JsonResponse({'error': 'AI assistant is not configured on the server.'}, status=503)
+
+        try:
+            session = await sync_to_async(sessions.open_session)(user, payload.get('session_id'))
+            system, messages = sessions.prompt(session, await sync_to_async(system_prompt)(user), message)
+        except Exception as exc:
+            logger.exception('AI chat error for user %s: %s', user.id, exc)
+            return JsonResponse({'error': 'AI assistant is unavailable right now. Try again in a moment.'}, status=503)
+        try:
+            call = gateway.admit('chat_stream')
+        except gateway.GatewayUnavailable as exc:
+            response = JsonResponse({'error': str(exc)}, status=503)
+            response['Retry-After'] = '5'
+            return response
+
+        response = StreamingHttpResponse(
+            sessions.relay(call, system, messages, user, session, message),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop reverse proxies from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        # A client that goes away before the first frame never starts the generator, so its
+        # cleanup never runs; the handler still closes the response, which frees the slot.
+        response._resource_closers.append(call.cancel)
+        return response
+
+
+class AIMetricsView(APIView):
+    """GET /api/ai/metrics/ — this process's gateway metrics in the Prometheus text format."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        token = getattr(settings, 'AI_METRICS_TOKEN', '')
+        if not token:
+            return Response(status=404)
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response({'error': 'Invalid metrics token.'}, status=403)
+        return HttpResponse(gateway.metrics.render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,55 @@
+"""Request-scoped batch loading of referenced documents.
+
+Serializers that follow ``ReferenceField``s one document at a time turn a list
+page into one lookup per row. A list view instead queues every id it is about
+to need, and the first ``resolve`` for a document class fetches all queued ids
+of that class with a single ``$in`` query, restricted to the projected fields.
+"""
+from collections import defaultdict
+
+
+def _ref_id(value):
+    return getattr(value, 'id', value)
+
+
+class BatchLoader:
+    def __init__(self, projections=None):
+        # {Document class: field names}; classes without an entry load every field.
+        self._projections = projections or {}
+        self._pending = defaultdict(set)
+        self._cache = defaultdict(dict)
+
+    def queue(self, document_cls, *refs) -> None:
+        """Remember ids (documents, DBRefs or raw ids) to fetch with the next batch for ``document_cls``."""
+        cache = self._cache[document_cls]
+        for ref in refs:
+            object_id = _ref_id(ref)
+            if object_id is not None and object_id not in cache:
+                self._pending[document_cls].add(object_id)
+
+    def resolve(self, document_cls, ref):
+        """Return the document behind ``ref`` (``None`` if it no longer exists)."""
+        if ref is None:
+            return None
+        if isinstance(ref, document_cls):
+            return ref
+        object_id = _ref_id(ref)
+        cache = self._cache[document_cls]
+        if object_id not in cache:
+            self._pending[document_cls].add(object_id)
+            self._flush(document_cls)
+        return cache.get(object_id)
+
+    def _flush(self, document_cls) -> None:
+        ids = self._pending.pop(document_cls, set())
+        if not ids:
+            return
+        queryset = document_cls.objects(id__in=list(ids)).no_dereference()
+        fields = self._projections.get(document_cls)
+        if fields:
+            queryset = queryset.only(*fields)
+        found = {document.id: document for document in queryset}
+        cache = self._cache[document_cls]
+        for object_id in ids:
+            # Misses are cached too, so a dangling reference is only looked up once.
+            cache[object_id] = found.get(object_id)
@@ -0,0 +1,74 @@
+"""Keyset pagination over ``(created_at, _id)`` for newest-first list endpoints.
+
+A page is read with the compound ``-created_at``/``-_id`` order and the next page
+starts strictly after the last row returned, so page N costs the same as page 1.
+Cursors are opaque to clients.
+"""
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+TRUTHY_PARAMS = {"1", "true", "yes"}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, object_id) -> str:
+    raw = f"{created_at.isoformat()}|{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value: str):
+    """Return ``(created_at, ObjectId)`` for a cursor produced by :func:`encode_cursor`."""
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        created_raw, object_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_raw), ObjectId(object_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as exc:
+        raise InvalidCursor("Invalid pagination cursor.") from exc
+
+
+def parse_limit(params, default: int, maximum: int) -> int:
+    try:
+        limit = int(params.get('limit', default))
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def paginate(queryset, params, *, default_limit: int, max_limit: int, with_total: bool = None) -> dict:
+    """Read one newest-first page of ``queryset`` driven by the ``limit``/``cursor``/``include_total`` params.
+
+    Returns ``{"items", "next", "limit"}`` plus ``"total"`` when a count was asked for,
+    either by the caller (``with_total``) or by the client (``include_total=1``).
+    Raises :class:`InvalidCursor` for a malformed cursor.
+    """
+    limit = parse_limit(params, default_limit, max_limit)
+    if with_total is None:
+        with_total = str(params.get('include_total', '')).lower() in TRUTHY_PARAMS
+    total = queryset.count() if with_total else None
+
+    cursor = params.get('cursor')
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        queryset = queryset.filter(__raw__={'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': object_id}},
+        ]})
+    # One extra row tells us whether another page exists without a count.
+    items = list(queryset.order_by('-created_at', '-id').limit(limit + 1))
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    page = {"items": items, "next": next_cursor, "limit": limit}
+    if with_total:
+        page["total"] = total
+    return page
@@ -124,6 +124,24 @@ RESEND_FROM_EMAIL = os.environ.get('RESEND_FROM_EMAIL', 'Balance Studio <onboard
 BREVO_API_KEY = os.environ.get('BREVO_API_KEY', '')
 BREVO_FROM_EMAIL = os.environ.get('BREVO_FROM_EMAIL', '')
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
+# Point the AI client at another host, e.g. a local fake server in tests.
+ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL', '')
+# AI gateway: provider calls in flight per process (extra requests get a 503),
+# per-call deadline and retries, and the circuit breaker's trip count and cooldown.
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 16))
+AI_TIMEOUT_SECONDS = float(os.environ.get('AI_TIMEOUT_SECONDS', 30))
+AI_SCAN_TIMEOUT_SECONDS = float(os.environ.get('AI_SCAN_TIMEOUT_SECONDS', 45))
+AI_MAX_RETRIES = int(os.environ.get('AI_MAX_RETRIES', 1))
+AI_BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', 5))
+AI_BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', 30))
+# Bearer token for scraping /api/ai/metrics/; the endpoint is off when unset.
+AI_METRICS_TOKEN = os.environ.get('AI_METRICS_TOKEN', '')
+# AI chat sessions: idle lifetime, and the estimated tokens of past turns kept
+# verbatim before older ones are folded into a summary.
+AI_SESSION_TTL_HOURS = int(os.environ.get('AI_SESSION_TTL_HOURS', 24))
+AI_HISTORY_TOKEN_BUDGET = int(os.environ.get('AI_HISTORY_TOKEN_BUDGET', 1000))
+# Answer AI calls with the deterministic fake in ai/fake.py instead of the provider.
+AI_FAKE_MODEL = os.environ.get('AI_FAKE_MODEL', 'False').lower() == 'true'
 
 if (
     EMAIL_BACKEND.endswith('smtp.EmailBackend')
@@ -180,6 +198,35 @@ CHANNEL_LAYERS = {
     )
 }
 
+# Simplification plans and AI contexts are keyed by ledger version, so stale
+# entries are never read; the caches only have to bound memory. Shared through
+# Redis when available.
+def _versioned_cache(name, timeout, max_entries):
+    if os.environ.get('REDIS_URL'):
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': name,
+            'TIMEOUT': timeout,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+        'TIMEOUT': timeout,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+PLAN_CACHE_TIMEOUT = int(os.environ.get('PLAN_CACHE_TIMEOUT', '3600'))
+AI_CONTEXT_CACHE_TIMEOUT = int(os.environ.get('AI_CONTEXT_CACHE_TIMEOUT', '1800'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'plans': _versioned_cache('plans', PLAN_CACHE_TIMEOUT, int(os.environ.get('PLAN_CACHE_MAX_ENTRIES', '2000'))),
+    'ai_context': _versioned_cache('ai-context', AI_CONTEXT_CACHE_TIMEOUT, int(os.environ.get('AI_CONTEXT_CACHE_MAX_ENTRIES', '1000'))),
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
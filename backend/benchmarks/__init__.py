@@ -0,0 +1,10 @@
+"""Microbenchmarks for the backend's hot paths.
+
+Run from ``backend/``::
+
+    python -m benchmarks                 # compare against baselines.json
+    python -m benchmarks --update        # re-record the baselines
+    python -m benchmarks -k min_cash_flow --threshold 0.5
+
+Data-backed cases run against mongomock, never a real database.
+"""
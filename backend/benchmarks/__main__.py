@@ -0,0 +1,139 @@
+"""Run the benchmark cases and compare them with the recorded baselines.
+
+Timings are the best per-call time over several repeats. To keep baselines
+usable across machines, every run also times a fixed pure-Python calibration
+loop; results are compared after scaling by how much faster or slower this
+machine is than the one that recorded the baselines.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Benchmarks seed data, so they only ever run against mongomock.
+os.environ['USE_MONGOMOCK'] = '1'
+os.environ.setdefault('MONGODB_DB_NAME', 'bs_benchdb')
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key-not-for-production')
+os.environ.setdefault('ANTHROPIC_API_KEY', 'benchmark-key')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+BASELINE_PATH = Path(__file__).with_name('baselines.json')
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEAT = 5
+# Each timed sample runs for at least this long; fast calls are looped to get there.
+MIN_SAMPLE_SECONDS = 0.05
+
+
+def _calibration_loop():
+    total = 0
+    for value in range(200000):
+        total += value % 7
+    return total
+
+
+def _measure(func, repeat):
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < MIN_SAMPLE_SECONDS and number < 1_000_000:
+        number *= 4
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _drop_collections():
+    import mongoengine
+
+    for cls in list(mongoengine.base.common._document_registry.values()):
+        try:
+            cls.drop_collection()
+        except Exception:
+            pass
+
+
+def run(cases, repeat):
+    results = {}
+    for name, setup in cases.items():
+        _drop_collections()
+        results[name] = _measure(setup(), repeat)
+        print(f"  {name:<36} {results[name] * 1e3:10.3f} ms")
+    _drop_collections()
+    return results
+
+
+def compare(results, calibration, baseline, threshold):
+    """Return ``[(name, seconds, baseline_seconds, ratio)]`` for cases slower than ``threshold`` allows.
+
+    Every case in ``results`` must have a recorded baseline.
+    """
+    scale = calibration / baseline['calibration'] if baseline.get('calibration') else 1.0
+    regressions = []
+    for name, seconds in results.items():
+        recorded = baseline['cases'][name]
+        ratio = seconds / (recorded * scale)
+        if ratio > 1 + threshold:
+            regressions.append((name, seconds, recorded, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', default='*', help='Only run cases matching this glob.')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown over the baseline as a fraction (default 0.25).')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--update', action='store_true', help='Record these timings as the new baselines.')
+    args = parser.parse_args(argv)
+
+    import django
+
+    django.setup()
+    from .cases import CASES
+
+    selected = {name: setup for name, setup in CASES.items() if fnmatch.fnmatch(name, args.pattern)}
+    if not selected:
+        parser.error(f"No benchmark matches {args.pattern!r}.")
+
+    calibration = _measure(_calibration_loop, args.repeat)
+    print(f"calibration {calibration * 1e3:.3f} ms")
+    results = run(selected, args.repeat)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update:
+        cases = dict(baseline.get('cases', {}))
+        if baseline.get('calibration'):
+            # Keep cases that were not re-run comparable with the new calibration.
+            scale = calibration / baseline['calibration']
+            cases = {name: seconds * scale for name, seconds in cases.items()}
+        cases.update(results)
+        args.baseline.write_text(json.dumps({
+            'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'calibration': calibration,
+            'cases': dict(sorted(cases.items())),
+        }, indent=2) + '\n')
+        print(f"Baselines written to {args.baseline}")
+        return 0
+
+    # A case without a baseline cannot regress, so passing it would prove nothing.
+    missing = sorted(name for name in results if not baseline.get('cases', {}).get(name))
+    if missing:
+        print(f"No baseline recorded in {args.baseline} for: {', '.join(missing)}")
+        print("Record one with `python -m benchmarks --update` and commit it.")
+        return 2
+
+    regressions = compare(results, calibration, baseline, args.threshold)
+    for name, seconds, recorded, ratio in regressions:
+        print(f"REGRESSION {name}: {seconds * 1e3:.3f} ms vs {recorded * 1e3:.3f} ms baseline ({ratio:.2f}x, calibrated)")
+    if regressions:
+        return 1
+    print(f"{len(results)} benchmarks within {args.threshold:.0%} of baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
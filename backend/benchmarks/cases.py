@@ -0,0 +1,180 @@
+"""Benchmark cases.
+
+Each case is a setup function registered under a name; it seeds whatever it
+needs and returns the zero-argument callable that gets timed. Setup is not
+timed. Inputs are generated from a fixed seed so runs are comparable.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+CASES = {}
+MIN_CASH_FLOW_SIZES = (10, 100, 1000, 10000)
+GROUP_LABELS = (
+    'Goa Trip 2024', '  Rent ', 'Groceries & Household', 'Dinner @ Nobu', '', None,
+    'Flat 4B — Utilities', 'Office lunch', 'Ski weekend!!', 'Birthday gift for Sam',
+)
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _people(count, rng):
+    """Synthetic circle whose nets sum to zero in cents."""
+    cents = [rng.randint(-50000, 50000) for _ in range(count - 1)]
+    cents.append(-sum(cents))
+    return [{'id': str(index), 'name': f"Person {index}", 'net': value / 100} for index, value in enumerate(cents)]
+
+
+def _min_cash_flow_case(count):
+    def setup():
+        from expenses.views import _min_cash_flow
+
+        people = _people(count, random.Random(count))
+        return lambda: _min_cash_flow(people)
+    return setup
+
+
+for _size in MIN_CASH_FLOW_SIZES:
+    case(f"min_cash_flow[{_size}]")(_min_cash_flow_case(_size))
+
+
+@case('slugify_group_label[1000]')
+def _slugify():
+    from users.services import slugify_group_label
+
+    labels = [GROUP_LABELS[index % len(GROUP_LABELS)] for index in range(1000)]
+    return lambda: [slugify_group_label(label) for label in labels]
+
+
+@case('normalize_group_label[1000]')
+def _normalize():
+    from users.services import normalize_group_label
+
+    labels = [GROUP_LABELS[index % len(GROUP_LABELS)] for index in range(1000)]
+    return lambda: [normalize_group_label(label) for label in labels]
+
+
+@case('isoformat_utc[1000]')
+def _isoformat():
+    from expenses.views import _isoformat_utc
+
+    start = datetime(2024, 1, 1, 12, 30)
+    values = []
+    for index in range(1000):
+        value = start + timedelta(minutes=17 * index)
+        values.append(value.replace(tzinfo=timezone.utc) if index % 2 else value)
+    return lambda: [_isoformat_utc(value) for value in values]
+
+
+def _seed_users(count):
+    from users.models import User
+
+    users = [
+        User(email=f"bench{index}@example.com", username=f"bench{index}", name=f"Bench User {index}", password='!')
+        for index in range(count)
+    ]
+    return User.objects.insert(users)
+
+
+def _seed_expenses(users, count, rng, snapshot=True):
+    from expenses.models import Expense, ExpenseParticipant
+
+    start = datetime(2024, 1, 1)
+    expenses = []
+    for index in range(count):
+        members = rng.sample(users, 4)
+        total = round(rng.uniform(5, 400), 2)
+        share = round(total / 4, 2)
+        expense = Expense(
+            payer=members[0],
+            note=f"Expense {index}",
+            group_name=GROUP_LABELS[index % len(GROUP_LABELS)],
+            total_amount=total,
+            participants=[
+                ExpenseParticipant(user=member, amount=share, is_payer=(position == 0))
+                for position, member in enumerate(members)
+            ],
+            created_at=start + timedelta(hours=index),
+        )
+        if snapshot:
+            expense.sync_participant_snapshot()
+        expenses.append(expense)
+    return Expense.objects.insert(expenses)
+
+
+def _serialize_expenses_case(snapshot):
+    def setup():
+        from expenses.models import Expense
+        from expenses.views import make_loader, queue_expense_refs, serialize_expense
+
+        users = _seed_users(20)
+        ids = [expense.id for expense in _seed_expenses(users, 200, random.Random(7), snapshot=snapshot)]
+
+        def run():
+            expenses = list(Expense.objects(id__in=ids).no_dereference())
+            loader = make_loader()
+            queue_expense_refs(loader, expenses)
+            return [serialize_expense(expense, loader) for expense in expenses]
+        return run
+    return setup
+
+
+case('serialize_expense[200,snapshot]')(_serialize_expenses_case(snapshot=True))
+case('serialize_expense[200,legacy]')(_serialize_expenses_case(snapshot=False))
+
+
+@case('serialize_activity[200]')
+def _serialize_activity():
+    from expenses.models import Activity, Expense
+    from expenses.views import make_loader, serialize_activity
+
+    users = _seed_users(20)
+    expenses = _seed_expenses(users, 50, random.Random(11))
+    entries = Activity.objects.insert([
+        Activity(
+            user=users[0],
+            actor=users[index % 20],
+            expense=expenses[index % 50],
+            summary=f"Bench User {index % 20} added Expense {index % 50}",
+            detail="You owe $12.50",
+            amount=-12.5,
+        )
+        for index in range(200)
+    ])
+    ids = [entry.id for entry in entries]
+
+    def run():
+        loaded = list(Activity.objects(id__in=ids).no_dereference())
+        loader = make_loader()
+        loader.queue(Expense, *(entry._data.get('expense') for entry in loaded))
+        return [serialize_activity(entry, loader) for entry in loaded]
+    return run
+
+
+@case('compute_group_snapshot[500]')
+def _group_snapshot():
+    from expenses.models import Expense, ExpenseParticipant
+    from users.services import compute_group_snapshot
+
+    alice, bob = _seed_users(2)
+    rng = random.Random(3)
+    expenses = []
+    for index in range(500):
+        payer, other = (alice, bob) if index % 3 else (bob, alice)
+        share = round(rng.uniform(1, 80), 2)
+        expenses.append(Expense(
+            payer=payer,
+            note=f"Expense {index}",
+            group_name=GROUP_LABELS[index % len(GROUP_LABELS)],
+            total_amount=share * 2,
+            participants=[
+                ExpenseParticipant(user=payer, amount=share, is_payer=True),
+                ExpenseParticipant(user=other, amount=share),
+            ],
+        ))
+    Expense.objects.insert(expenses, load_bulk=False)
+    return lambda: compute_group_snapshot(alice, bob)
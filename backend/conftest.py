@@ -13,10 +13,32 @@ import mongoengine
 
 @pytest.fixture(autouse=True)
 def isolate_db():
-    """Drop every registered collection after each test for isolation."""
+    """Drop every registered collection, clear the caches and reset the AI gateway after each test."""
     yield
+    from django.core.cache import caches
+
+    from ai import gateway
+
+    for cache in caches.all():
+        cache.clear()
+    gateway.reset()
     for cls in list(mongoengine.base.common._document_registry.values()):
         try:
             cls.drop_collection()
         except Exception:
             pass
+
+
+@pytest.fixture
+def make_user():
+    """Return a factory for saved users: ``make_user("Bob Stone")`` is bob@example.com with handle ``bob``."""
+    from users.models import User
+
+    def make(name="Alice"):
+        handle = name.split()[0].lower()
+        user = User(email=f"{handle}@example.com", username=handle, name=name)
+        user.set_password("password123")
+        user.save()
+        return user
+
+    return make
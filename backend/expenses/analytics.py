@@ -0,0 +1,263 @@
+"""Server-side spend analytics for one user.
+
+Monthly series are read straight from the user's SpendRollup rows. Daily and
+weekly series are summed inside Mongo with an aggregation over
+``participants.user``, so the cost of a dashboard load depends on the number
+of buckets returned, not on how many expenses were pulled into Python.
+"""
+from datetime import date, datetime, timedelta
+import math
+
+from users import services
+from users.models import LedgerEntry
+
+from .models import Expense, SpendRollup
+from .rollups import month_key
+
+
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_GRANULARITY = 'month'
+# Buckets shown when no date range is given, matching the dashboard's six-month chart.
+DEFAULT_RECENT_BUCKETS = 6
+MAX_BUCKETS = 400
+# Friend/group series: months shown before the current one by default, the longest window
+# in months, and how many points a response may carry.
+SERIES_DEFAULT_MONTHS = 12
+SERIES_MAX_MONTHS = 120
+SERIES_DEFAULT_POINTS = 24
+SERIES_MAX_POINTS = 60
+
+
+class AnalyticsError(ValueError):
+	pass
+
+
+def _bucket_key(granularity):
+	if granularity == 'day':
+		return {'year': {'$year': '$created_at'}, 'month': {'$month': '$created_at'}, 'day': {'$dayOfMonth': '$created_at'}}
+	if granularity == 'week':
+		return {'year': {'$isoWeekYear': '$created_at'}, 'week': {'$isoWeek': '$created_at'}}
+	return {'year': {'$year': '$created_at'}, 'month': {'$month': '$created_at'}}
+
+
+def _bucket_start(key, granularity) -> date:
+	if granularity == 'week':
+		return date.fromisocalendar(key['year'], key['week'], 1)
+	return date(key['year'], key['month'], key.get('day', 1))
+
+
+def _bucket_label(start: date, granularity) -> str:
+	if granularity == 'day':
+		return start.isoformat()
+	if granularity == 'week':
+		year, week, _ = start.isocalendar()
+		return f"{year}-W{week:02d}"
+	return start.strftime('%b %Y')
+
+
+def parse_date(value, field):
+	"""Parse a ``YYYY-MM-DD`` query param; ``None`` when it is missing."""
+	if not value:
+		return None
+	try:
+		return datetime.strptime(str(value), '%Y-%m-%d')
+	except ValueError as exc:
+		raise AnalyticsError(f"{field} must be a date in YYYY-MM-DD format.") from exc
+
+
+def bucket_span(start: datetime, end: datetime, granularity) -> int:
+	"""Upper bound on the number of buckets between two inclusive dates."""
+	days = (end - start).days + 1
+	if granularity == 'day':
+		return days
+	if granularity == 'week':
+		return days // 7 + 2
+	return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def spend_series(user, start=None, end=None, granularity=DEFAULT_GRANULARITY) -> dict:
+	"""Return ``user``'s share per bucket between ``start`` and ``end`` (inclusive dates).
+
+	Without a range the whole history is aggregated and only the latest
+	``DEFAULT_RECENT_BUCKETS`` buckets are returned; ``total_expenses`` always
+	covers the aggregated window. Monthly buckets cover whole calendar months.
+	"""
+	if granularity not in GRANULARITIES:
+		raise AnalyticsError(f"granularity must be one of {', '.join(GRANULARITIES)}.")
+	if start and end and start > end:
+		raise AnalyticsError("start must not be after end.")
+	if start and end and bucket_span(start, end, granularity) > MAX_BUCKETS:
+		raise AnalyticsError(f"Date range is too long for {granularity} granularity.")
+	if granularity == 'month':
+		return _monthly_from_rollups(user, start, end)
+
+	match = {'participants.user': user.id}
+	created = {}
+	if start:
+		created['$gte'] = start
+	if end:
+		created['$lt'] = end + timedelta(days=1)
+	if created:
+		match['created_at'] = created
+
+	pipeline = [
+		{'$match': match},
+		{'$unwind': '$participants'},
+		{'$match': {'participants.user': user.id}},
+		{'$group': {
+			'_id': _bucket_key(granularity),
+			'amount': {'$sum': '$participants.amount'},
+			'count': {'$sum': 1},
+		}},
+	]
+	rows = []
+	total = 0
+	for row in Expense._get_collection().aggregate(pipeline, allowDiskUse=True):
+		total += row['count']
+		rows.append((_bucket_start(row['_id'], granularity), row))
+	rows.sort(key=lambda item: item[0])
+	if not start and not end:
+		rows = rows[-DEFAULT_RECENT_BUCKETS:]
+
+	series = [
+		{
+			'period': _bucket_label(bucket, granularity),
+			'start': bucket.isoformat(),
+			'amount': round(row['amount'], 2),
+			'count': row['count'],
+		}
+		for bucket, row in rows
+	]
+	return {'granularity': granularity, 'series': series, 'total_expenses': total}
+
+
+def _monthly_from_rollups(user, start=None, end=None) -> dict:
+	query = SpendRollup.objects(user=user).only('month', 'share_total', 'count')
+	if start:
+		query = query.filter(month__gte=month_key(start))
+	if end:
+		query = query.filter(month__lte=month_key(end))
+	rollups = [rollup for rollup in query.order_by('month') if rollup.count > 0]
+	total = sum(rollup.count for rollup in rollups)
+	if not start and not end:
+		rollups = rollups[-DEFAULT_RECENT_BUCKETS:]
+	series = []
+	for rollup in rollups:
+		bucket = datetime.strptime(rollup.month, '%Y-%m').date()
+		series.append({
+			'period': _bucket_label(bucket, 'month'),
+			'start': bucket.isoformat(),
+			'amount': round(rollup.share_total or 0.0, 2),
+			'count': rollup.count,
+		})
+	return {'granularity': 'month', 'series': series, 'total_expenses': total}
+
+
+def _month_range(start: date, end: date) -> list:
+	months = []
+	year, month = start.year, start.month
+	while (year, month) <= (end.year, end.month):
+		months.append(f"{year:04d}-{month:02d}")
+		year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+	return months
+
+
+def _series_window(start=None, end=None) -> list:
+	end = (end or datetime.utcnow()).date().replace(day=1)
+	if start:
+		start = start.date().replace(day=1)
+	else:
+		# Months counted from zero, so the window is the current month plus the SERIES_DEFAULT_MONTHS before it.
+		first = end.year * 12 + end.month - 1 - SERIES_DEFAULT_MONTHS
+		start = date(first // 12, first % 12 + 1, 1)
+	if start > end:
+		raise AnalyticsError("start must not be after end.")
+	months = _month_range(start, end)
+	if len(months) > SERIES_MAX_MONTHS:
+		raise AnalyticsError(f"Date range is limited to {SERIES_MAX_MONTHS} months.")
+	return months
+
+
+def _monthly_balance_deltas(user, pairs, group_slug=None) -> dict:
+	"""Sum journal entries per month for ``pairs``, signed from ``user``'s side."""
+	if not pairs:
+		return {}
+	match = {'$or': [{'low': low, 'high': high} for low, high in pairs]}
+	if group_slug:
+		match['group_slug'] = group_slug
+	pipeline = [
+		{'$match': match},
+		{'$group': {
+			'_id': {'year': {'$year': '$created_at'}, 'month': {'$month': '$created_at'}},
+			'amount': {'$sum': {'$cond': [
+				{'$eq': ['$low', user.id]},
+				'$amount',
+				{'$multiply': ['$amount', -1]},
+			]}},
+		}},
+	]
+	return {
+		f"{row['_id']['year']:04d}-{row['_id']['month']:02d}": row['amount']
+		for row in LedgerEntry._get_collection().aggregate(pipeline)
+	}
+
+
+def friend_group_series(user, friend=None, group_slug=None, start=None, end=None, max_points=SERIES_DEFAULT_POINTS) -> dict:
+	"""Return monthly spend and end-of-period balance for ``user``, sliced by one friend or one group.
+
+	Spend comes from the user's SpendRollup rows and balance from the pair journal,
+	anchored on the live ledger so history from before the journal still adds up.
+	Long ranges are downsampled into buckets of several months so at most
+	``max_points`` points come back.
+	"""
+	if friend and group_slug:
+		raise AnalyticsError("Filter by friend or by group, not both.")
+	months = _series_window(start, end)
+
+	ledgers = [services.get_friend_ledger(user, friend)] if friend else services.list_friend_ledgers(user)
+	ledgers = [ledger for ledger in ledgers if ledger]
+	pairs = [(services._ref_id(ledger.pair._data.get('low')), services._ref_id(ledger.pair._data.get('high'))) for ledger in ledgers]
+	if group_slug:
+		live_balance = sum(ledger.group_balances.get(group_slug, 0.0) for ledger in ledgers)
+	else:
+		live_balance = sum(ledger.balance for ledger in ledgers)
+
+	# Walk back from today's balance: the balance at the end of a month is the live
+	# balance minus everything journaled after it.
+	deltas = _monthly_balance_deltas(user, pairs, group_slug)
+	later = sum(amount for month, amount in deltas.items() if month > months[-1])
+	balances = {}
+	for month in reversed(months):
+		balances[month] = live_balance - later
+		later += deltas.get(month, 0.0)
+
+	spend = dict.fromkeys(months, 0.0)
+	rollups = SpendRollup.objects(user=user, month__gte=months[0], month__lte=months[-1]).only(
+		'month', 'share_total', 'friends', 'groups',
+	)
+	for rollup in rollups:
+		if friend:
+			spend[rollup.month] = (rollup.friends or {}).get(str(friend.id), 0.0)
+		elif group_slug:
+			spend[rollup.month] = (rollup.groups or {}).get(group_slug, 0.0)
+		else:
+			spend[rollup.month] = rollup.share_total or 0.0
+
+	max_points = max(1, min(int(max_points), SERIES_MAX_POINTS))
+	bucket_months = math.ceil(len(months) / max_points)
+	points = []
+	for index in range(0, len(months), bucket_months):
+		chunk = months[index:index + bucket_months]
+		bucket = datetime.strptime(chunk[0], '%Y-%m').date()
+		points.append({
+			'period': _bucket_label(bucket, 'month'),
+			'start': bucket.isoformat(),
+			'spend': round(sum(spend[month] for month in chunk), 2),
+			'balance': round(balances[chunk[-1]], 2),
+		})
+	return {
+		'start': months[0],
+		'end': months[-1],
+		'bucket_months': bucket_months,
+		'points': points,
+	}
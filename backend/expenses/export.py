@@ -0,0 +1,215 @@
+"""Streaming export of one user's history as CSV or NDJSON.
+
+Expenses, settlements and activity are read with server-side cursors in
+batches, referenced users are resolved once per batch through a BatchLoader,
+and output is produced chunk by chunk, so memory stays flat however long the
+history is. Under ASGI, Django drains a sync iterator into a list before
+sending anything, so ``astream`` hands each chunk over from the thread pool.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import timezone
+
+from asgiref.sync import sync_to_async
+
+from backend.loaders import BatchLoader
+from users.models import FriendSettlement, User
+
+from .models import Activity, Expense
+
+
+FORMATS = ('csv', 'ndjson')
+KINDS = ('expenses', 'settlements', 'activity')
+DEFAULT_BATCH_SIZE = 500
+CSV_FIELDS = (
+	'type',
+	'id',
+	'created_at',
+	'description',
+	'group',
+	'amount',
+	'your_share',
+	'payer',
+	'participants',
+	'counterparty',
+	'direction',
+	'status',
+	'detail',
+)
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _isoformat_utc(value):
+	if not value:
+		return None
+	dt = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+	return dt.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def _batches(cursor, batch_size):
+	batch = []
+	for row in cursor.batch_size(batch_size):
+		batch.append(row)
+		if len(batch) >= batch_size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+
+def _name(loader, profiles, user_id):
+	profile = profiles.get(str(user_id))
+	if profile:
+		return profile.get('name') or ''
+	user = loader.resolve(User, user_id)
+	return user.name if user else ''
+
+
+def _expense_rows(user, loader, batch_size):
+	cursor = Expense._get_collection().find(
+		{'participants.user': user.id},
+		{'payer': 1, 'note': 1, 'group_name': 1, 'total_amount': 1, 'participants': 1, 'participant_profiles': 1, 'created_at': 1},
+	).sort('_id', 1)
+	for batch in _batches(cursor, batch_size):
+		for doc in batch:
+			profiles = doc.get('participant_profiles') or {}
+			refs = [doc.get('payer')] + [part.get('user') for part in doc.get('participants') or []]
+			loader.queue(User, *(ref for ref in refs if str(ref) not in profiles))
+		for doc in batch:
+			profiles = doc.get('participant_profiles') or {}
+			parts = doc.get('participants') or []
+			yield {
+				'type': 'expense',
+				'id': str(doc['_id']),
+				'created_at': _isoformat_utc(doc.get('created_at')),
+				'description': doc.get('note') or '',
+				'group': doc.get('group_name') or '',
+				'amount': round(doc.get('total_amount') or 0.0, 2),
+				'your_share': round(sum(part.get('amount') or 0.0 for part in parts if part.get('user') == user.id), 2),
+				'payer': _name(loader, profiles, doc.get('payer')),
+				'participants': [
+					{'name': _name(loader, profiles, part.get('user')), 'amount': round(part.get('amount') or 0.0, 2)}
+					for part in parts
+				],
+			}
+
+
+def _settlement_rows(user, loader, batch_size):
+	cursor = FriendSettlement._get_collection().find(
+		{'$or': [{'initiator': user.id}, {'counterparty': user.id}]},
+	).sort('_id', 1)
+	flipped = {'owes_you': 'you_owe', 'you_owe': 'owes_you'}
+	for batch in _batches(cursor, batch_size):
+		for doc in batch:
+			loader.queue(User, doc['counterparty'] if doc['initiator'] == user.id else doc['initiator'])
+		for doc in batch:
+			initiated = doc['initiator'] == user.id
+			other_id = doc['counterparty'] if initiated else doc['initiator']
+			yield {
+				'type': 'settlement',
+				'id': str(doc['_id']),
+				'created_at': _isoformat_utc(doc.get('created_at')),
+				'group': doc.get('group_label') or '',
+				'amount': round(doc.get('amount') or 0.0, 2),
+				'counterparty': _name(loader, {}, other_id),
+				# Direction is stored from the initiator's side.
+				'direction': doc.get('direction') if initiated else flipped.get(doc.get('direction'), ''),
+			}
+
+
+def _activity_rows(user, batch_size):
+	cursor = Activity._get_collection().find(
+		{'user': user.id},
+		{'summary': 1, 'detail': 1, 'amount': 1, 'status': 1, 'created_at': 1},
+	).sort('_id', 1)
+	for batch in _batches(cursor, batch_size):
+		for doc in batch:
+			yield {
+				'type': 'activity',
+				'id': str(doc['_id']),
+				'created_at': _isoformat_utc(doc.get('created_at')),
+				'description': doc.get('summary') or '',
+				'amount': round(doc.get('amount') or 0.0, 2),
+				'status': doc.get('status') or '',
+				'detail': doc.get('detail') or '',
+			}
+
+
+def iter_records(user, kinds=KINDS, batch_size=DEFAULT_BATCH_SIZE):
+	"""Yield one dict per expense, settlement and activity entry of ``user``, oldest first per kind."""
+	loader = BatchLoader({User: User.SUMMARY_FIELDS})
+	if 'expenses' in kinds:
+		yield from _expense_rows(user, loader, batch_size)
+	if 'settlements' in kinds:
+		yield from _settlement_rows(user, loader, batch_size)
+	if 'activity' in kinds:
+		yield from _activity_rows(user, batch_size)
+
+
+def _csv_value(value):
+	if isinstance(value, list):
+		return '; '.join(f"{entry['name']} ({entry['amount']:.2f})" for entry in value)
+	return '' if value is None else value
+
+
+def render(records, fmt, chunk_rows=DEFAULT_BATCH_SIZE):
+	"""Yield encoded output chunks of ``chunk_rows`` records each."""
+	if fmt not in FORMATS:
+		raise ValueError(f"Unsupported export format: {fmt}")
+	buffer = io.StringIO()
+	writer = None
+	if fmt == 'csv':
+		writer = csv.writer(buffer)
+		writer.writerow(CSV_FIELDS)
+	pending = 0
+	for record in records:
+		if writer:
+			writer.writerow([_csv_value(record.get(field)) for field in CSV_FIELDS])
+		else:
+			buffer.write(json.dumps(record, separators=(',', ':')))
+			buffer.write('\n')
+		pending += 1
+		if pending >= chunk_rows:
+			yield buffer.getvalue().encode()
+			buffer.seek(0)
+			buffer.truncate()
+			pending = 0
+	if buffer.tell():
+		yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks):
+	"""Gzip a stream of byte chunks on the fly."""
+	compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+	for chunk in chunks:
+		compressed = compressor.compress(chunk)
+		if compressed:
+			yield compressed
+	yield compressor.flush()
+
+
+def stream(user, fmt='csv', kinds=KINDS, compress=False, batch_size=DEFAULT_BATCH_SIZE):
+	chunks = render(iter_records(user, kinds, batch_size), fmt, chunk_rows=batch_size)
+	return gzip_chunks(chunks) if compress else chunks
+
+
+async def astream(user, fmt='csv', kinds=KINDS, compress=False, batch_size=DEFAULT_BATCH_SIZE):
+	"""``stream`` as an async iterator: each chunk is produced in the sync thread pool, one at a time."""
+	chunks = stream(user, fmt, kinds, compress, batch_size)
+	produce = sync_to_async(next)
+	try:
+		while True:
+			chunk = await produce(chunks, None)
+			if chunk is None:
+				return
+			yield chunk
+	finally:
+		# Release the Mongo cursors when the client goes away mid-download.
+		await sync_to_async(chunks.close)()
+
+
+def filename(user, fmt, compress=False) -> str:
+	name = f"balance-studio-{getattr(user, 'username', '') or user.id}.{fmt}"
+	return f"{name}.gz" if compress else name
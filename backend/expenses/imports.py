@@ -0,0 +1,282 @@
+"""Bulk import of expense history from an NDJSON or CSV stream.
+
+Rows are parsed and validated one at a time and written in batches: each batch
+resolves its participants with one query, inserts its expenses with one
+``insert_many``, and applies ledger and rollup changes summed per pair/slug and
+per user/month. Per-row activity, notifications, emails and pushes are skipped;
+every user touched gets one summary Activity when the import finishes.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from mongoengine.queryset.visitor import Q
+
+from users import services
+from users.models import LedgerEntry, User
+
+from . import rollups
+from .models import Activity, Expense, ExpenseParticipant
+
+
+FORMATS = ('ndjson', 'csv')
+BATCH_SIZE = 500
+MAX_ROWS = 20000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRowError(ValueError):
+	pass
+
+
+def _parse_amount(value, label):
+	try:
+		amount = round(float(value), 2)
+	except (TypeError, ValueError):
+		raise ImportRowError(f"{label} must be a valid number.")
+	if amount < 0:
+		raise ImportRowError(f"{label} cannot be negative.")
+	return amount
+
+
+def _parse_created_at(value):
+	if not value:
+		return None
+	try:
+		created_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+	except ValueError:
+		raise ImportRowError("created_at must be an ISO 8601 date or timestamp.")
+	if created_at.tzinfo:
+		created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+	return created_at
+
+
+def _csv_participants(raw):
+	"""Parse ``alice@example.com:10; bob:20`` into participant dicts."""
+	participants = []
+	for item in (raw or '').split(';'):
+		item = item.strip()
+		if not item:
+			continue
+		identifier, _, amount = item.rpartition(':')
+		if not identifier:
+			raise ImportRowError("participants must be written as identifier:amount pairs separated by ';'.")
+		participants.append({'user': identifier.strip(), 'amount': amount.strip()})
+	return participants
+
+
+def iter_rows(lines, fmt):
+	"""Yield ``(line_number, raw_row_or_error)`` from decoded text lines."""
+	if fmt == 'csv':
+		reader = csv.DictReader(lines)
+		for row in reader:
+			try:
+				row['participants'] = _csv_participants(row.get('participants'))
+			except ImportRowError as exc:
+				yield reader.line_num, exc
+				continue
+			yield reader.line_num, row
+		return
+	for line_number, line in enumerate(lines, start=1):
+		if not line.strip():
+			continue
+		try:
+			row = json.loads(line)
+		except ValueError:
+			yield line_number, ImportRowError("Line is not valid JSON.")
+			continue
+		if not isinstance(row, dict):
+			yield line_number, ImportRowError("Each line must be a JSON object.")
+			continue
+		yield line_number, row
+
+
+def validate_row(row):
+	"""Return a normalised row: note, group label, total, created_at and ``[(identifier, share)]``."""
+	total = _parse_amount(row.get('total_amount'), 'total_amount')
+	if total <= 0:
+		raise ImportRowError("total_amount must be greater than zero.")
+	participants = row.get('participants')
+	if not isinstance(participants, list) or not participants:
+		raise ImportRowError("Add at least one participant.")
+	shares = []
+	for entry in participants:
+		if not isinstance(entry, dict) or not str(entry.get('user') or '').strip():
+			raise ImportRowError("Each participant needs a user email or username.")
+		identifier = str(entry['user']).strip()
+		if '@' in identifier:
+			identifier = identifier.lower()
+		shares.append((identifier, _parse_amount(entry.get('amount'), 'Participant amounts')))
+	if abs(round(sum(share for _, share in shares), 2) - total) > 0.05:
+		raise ImportRowError("Assigned shares must match the total amount.")
+	return {
+		'note': str(row.get('note') or '').strip(),
+		'group_label': services.normalize_group_label(row.get('group_name')),
+		'total_amount': total,
+		'created_at': _parse_created_at(row.get('created_at')),
+		'shares': shares,
+	}
+
+
+def _resolve(identifiers) -> dict:
+	"""Look up users by email or username with one query, keyed by both."""
+	emails = [value for value in identifiers if '@' in value]
+	usernames = [value for value in identifiers if '@' not in value]
+	found = {}
+	for user in User.objects(Q(email__in=emails) | Q(username__in=usernames)).only(*User.SUMMARY_FIELDS):
+		found[(user.email or '').lower()] = user
+		if user.username:
+			found[user.username] = user
+	return found
+
+
+class ExpenseImporter:
+	def __init__(self, user, batch_size=None, dry_run=False):
+		self.user = user
+		self.batch_size = batch_size or BATCH_SIZE
+		self.dry_run = dry_run
+		self.run_id = str(ObjectId())
+		self.imported = 0
+		self.failed = 0
+		self.errors = []
+		self._pending = []
+		self._touched = {}
+		self._net = defaultdict(float)
+		self._counts = defaultdict(int)
+
+	def _error(self, line_number, message):
+		self.failed += 1
+		if len(self.errors) < MAX_REPORTED_ERRORS:
+			self.errors.append({'line': line_number, 'error': message})
+
+	def feed(self, rows) -> None:
+		for line_number, row in rows:
+			if self.imported + self.failed + len(self._pending) >= MAX_ROWS:
+				self._error(line_number, f"Imports are limited to {MAX_ROWS} rows.")
+				break
+			if isinstance(row, Exception):
+				self._error(line_number, str(row))
+				continue
+			try:
+				self._pending.append((line_number, validate_row(row)))
+			except ImportRowError as exc:
+				self._error(line_number, str(exc))
+				continue
+			if len(self._pending) >= self.batch_size:
+				self._flush()
+		self._flush()
+
+	def _build(self, row, users_by_identifier):
+		payer = self.user
+		payer_key = str(payer.id)
+		participant_map = {}
+		for identifier, share in row['shares']:
+			participant = users_by_identifier.get(identifier)
+			if participant is None:
+				raise ImportRowError(f"User {identifier} not found.")
+			key = str(participant.id)
+			if key in participant_map:
+				participant_map[key].amount = round(participant_map[key].amount + share, 2)
+			else:
+				participant_map[key] = ExpenseParticipant(user=participant, amount=share, is_payer=(key == payer_key))
+		if payer_key not in participant_map:
+			participant_map = {payer_key: ExpenseParticipant(user=payer, amount=0, is_payer=True), **participant_map}
+		if len(participant_map) < 2:
+			raise ImportRowError("Add at least one friend to split with.")
+		expense = Expense(
+			id=ObjectId(),
+			payer=payer,
+			note=row['note'],
+			group_name=row['group_label'],
+			total_amount=row['total_amount'],
+			participants=list(participant_map.values()),
+		)
+		if row['created_at']:
+			expense.created_at = row['created_at']
+		expense.sync_participant_snapshot()
+		return expense
+
+	def _flush(self) -> None:
+		pending, self._pending = self._pending, []
+		if not pending:
+			return
+		identifiers = {identifier for _, row in pending for identifier, _ in row['shares']}
+		users_by_identifier = _resolve(identifiers)
+		expenses = []
+		for line_number, row in pending:
+			try:
+				expenses.append(self._build(row, users_by_identifier))
+			except ImportRowError as exc:
+				self._error(line_number, str(exc))
+		if not expenses:
+			return
+		self.imported += len(expenses)
+		if self.dry_run:
+			return
+
+		Expense.objects.insert(expenses, load_bulk=False)
+		# Sum the batch per pair, group and month so each bucket gets one journal entry and one $inc,
+		# dated in the month its expenses happened rather than on the day of the import.
+		deltas = defaultdict(float)
+		friends = {}
+		for expense in expenses:
+			for part in expense.participants:
+				key = str(part.user.id)
+				self._touched[key] = part.user
+				self._counts[key] += 1
+				if part.is_payer or part.amount <= 0:
+					continue
+				friends[key] = part.user
+				month = datetime(expense.created_at.year, expense.created_at.month, 1)
+				deltas[(month, key, expense.group_name)] += part.amount
+				self._net[key] -= part.amount
+				self._net[str(self.user.id)] += part.amount
+		by_month = defaultdict(list)
+		for (month, key, label), amount in deltas.items():
+			by_month[month].append((self.user, friends[key], round(amount, 2), label))
+		for month, changes in sorted(by_month.items()):
+			services.apply_balance_changes(
+				changes,
+				source=LedgerEntry.SOURCE_IMPORT,
+				source_id=self.run_id,
+				created_at=month,
+			)
+		rollups.write(rollups.expenses_operations(expenses))
+
+	def finish(self) -> None:
+		"""Write one summary Activity per user the import touched."""
+		if self.dry_run or not self.imported:
+			return
+		user_key = str(self.user.id)
+		activities = []
+		for key, target in self._touched.items():
+			count = self._counts[key]
+			net = round(self._net[key], 2)
+			if key == user_key:
+				summary = f"You imported {count} expenses"
+				detail = f"Friends owe you ${net:.2f} in total across the imported history."
+			else:
+				summary = f"{self.user.name} imported {count} shared expenses"
+				detail = f"You owe ${abs(net):.2f} to {self.user.name} from the imported history."
+			activities.append(Activity(
+				user=target,
+				actor=self.user,
+				summary=summary,
+				detail=detail,
+				amount=net,
+				status='imported',
+			))
+		Activity.objects.insert(activities, load_bulk=False)
+
+	def touched_users(self) -> list:
+		return list(self._touched.values())
+
+	def result(self) -> dict:
+		return {
+			'imported': self.imported,
+			'failed': self.failed,
+			'errors': sorted(self.errors, key=lambda error: error['line']),
+			'dry_run': self.dry_run,
+		}
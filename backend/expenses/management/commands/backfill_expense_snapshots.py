@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from expenses.models import Expense, profile_snapshot
+from users import services
+
+
+class Command(BaseCommand):
+    help = "Fill in participant ids, shares and cached profiles on expenses written before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Expenses updated per bulk write.',
+        )
+        parser.add_argument(
+            '--refresh-profiles',
+            action='store_true',
+            help='Rewrite cached profiles on every expense, not just the ones missing a snapshot.',
+        )
+
+    def handle(self, *args, **options):
+        query = {} if options['refresh_profiles'] else {
+            '$or': [{'participant_ids': {'$exists': False}}, {'participant_ids': []}],
+        }
+        collection = Expense._get_collection()
+        count = collection.count_documents(query)
+        if not count:
+            self.stdout.write(self.style.SUCCESS('All expenses already carry participant snapshots.'))
+            return
+
+        batch_size = max(1, options['batch_size'])
+        projection = {'participants.user': 1, 'participants.amount': 1}
+        updated = 0
+        batch = []
+        # Ordered by _id so an interrupted run simply picks up the remaining unsnapshotted rows.
+        for row in collection.find(query, projection).sort('_id', 1).batch_size(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                updated += self._write(collection, batch)
+                batch = []
+                self.stdout.write(f"Processed {updated}/{count} expenses...")
+        if batch:
+            updated += self._write(collection, batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted participants on {updated} expenses."))
+
+    def _write(self, collection, rows) -> int:
+        users = services.load_users_by_id(
+            part.get('user') for row in rows for part in row.get('participants') or []
+        )
+        operations = []
+        for row in rows:
+            parts = [part for part in row.get('participants') or [] if part.get('user')]
+            operations.append(UpdateOne({'_id': row['_id']}, {'$set': {
+                'participant_ids': [part['user'] for part in parts],
+                'shares': {str(part['user']): round(part.get('amount') or 0.0, 2) for part in parts},
+                'participant_profiles': {
+                    str(part['user']): profile_snapshot(users[str(part['user'])])
+                    for part in parts
+                    if str(part['user']) in users
+                },
+            }}))
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        return len(operations)
@@ -0,0 +1,59 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses import export
+from users.models import User
+from users import services
+
+
+class Command(BaseCommand):
+    help = "Stream one user's expenses, settlements and activity to a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='User id, email or username.')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv')
+        parser.add_argument(
+            '--include',
+            default=','.join(export.KINDS),
+            help=f"Comma-separated subset of {', '.join(export.KINDS)}.",
+        )
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output as it is written.')
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=export.DEFAULT_BATCH_SIZE,
+            help='Documents read per cursor batch.',
+        )
+
+    def handle(self, *args, **options):
+        identifier = options['user'].strip()
+        user = services.load_users_by_id([identifier]).get(identifier)
+        if user is None:
+            user = User.objects(email=identifier.lower()).first() or User.objects(username=identifier).first()
+        if user is None:
+            raise CommandError(f"No user matches {identifier!r}.")
+        kinds = [kind.strip() for kind in options['include'].split(',') if kind.strip()]
+        unknown = [kind for kind in kinds if kind not in export.KINDS]
+        if unknown or not kinds:
+            raise CommandError(f"--include must list any of {', '.join(export.KINDS)}.")
+
+        chunks = export.stream(
+            user,
+            options['format'],
+            kinds,
+            compress=options['gzip'],
+            batch_size=max(1, options['batch_size']),
+        )
+        written = 0
+        target = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                target.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}."))
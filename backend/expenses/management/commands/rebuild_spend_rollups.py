@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from expenses import rollups
+
+
+class Command(BaseCommand):
+    help = "Regenerate the monthly spend rollups from every expense and settlement."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='users',
+            help='Only rebuild this user id (repeatable).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Documents read per cursor batch and rollups written per bulk write.',
+        )
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(options['users'], batch_size=max(1, options['batch_size']))
+        scope = f"{len(options['users'])} users" if options['users'] else 'all users'
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} monthly rollups for {scope}."))
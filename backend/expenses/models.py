@@ -5,11 +5,14 @@ from mongoengine import (
 	CASCADE,
 	NULLIFY,
 	DateTimeField,
+	DictField,
 	Document,
 	EmbeddedDocument,
 	EmbeddedDocumentField,
 	FloatField,
+	IntField,
 	ListField,
+	ObjectIdField,
 	ReferenceField,
 	StringField,
 )
@@ -22,16 +25,60 @@ class ExpenseParticipant(EmbeddedDocument):
 
 
 class Expense(Document):
+	# Fields the activity feed shows for a linked expense; the batch-loading projection.
+	SUMMARY_FIELDS = ('note', 'total_amount')
+
 	payer = ReferenceField('User', required=True)
 	note = StringField()
 	group_name = StringField()
 	total_amount = FloatField(required=True, min_value=0)
 	participants = ListField(EmbeddedDocumentField(ExpenseParticipant))
+	# Denormalized from ``participants`` so reads never dereference users; keyed by str(user id).
+	participant_ids = ListField(ObjectIdField())
+	shares = DictField(field=FloatField())
+	participant_profiles = DictField()
 	created_at = DateTimeField(default=datetime.utcnow)
 
 	meta = {
 		'collection': 'expenses',
-		'indexes': ['payer', '-created_at', 'participants.user'],
+		'indexes': [
+			'payer',
+			'-created_at',
+			'participants.user',
+			{'fields': ['participants.user', '-created_at', '-id']},
+			'participant_ids',
+		],
+	}
+
+	def sync_participant_snapshot(self):
+		"""Rebuild the denormalized ids, shares and profiles from ``participants``."""
+		self.participant_ids = [part.user.id for part in self.participants]
+		self.shares = {str(part.user.id): round(part.amount, 2) for part in self.participants}
+		self.participant_profiles = {
+			str(part.user.id): profile_snapshot(part.user) for part in self.participants
+		}
+
+	def share_of(self, user):
+		"""Return ``user``'s share of this expense, or ``None`` if they are not part of it."""
+		key = str(getattr(user, 'id', user))
+		if self.shares:
+			return self.shares.get(key)
+		for part in self.participants:
+			ref = part._data.get('user')
+			if str(getattr(ref, 'id', ref)) == key:
+				return part.amount
+		return None
+
+	def profile_of(self, user):
+		"""Return the cached ``{name, username, email}`` for ``user``, or ``None`` for legacy expenses."""
+		return (self.participant_profiles or {}).get(str(getattr(user, 'id', user)))
+
+
+def profile_snapshot(user) -> dict:
+	return {
+		'name': user.name,
+		'username': getattr(user, 'username', '') or '',
+		'email': user.email,
 	}
 
 
@@ -47,5 +94,30 @@ class Activity(Document):
 
 	meta = {
 		'collection': 'activity_entries',
-		'indexes': ['user', '-created_at'],
+		'indexes': ['user', '-created_at', {'fields': ['user', '-created_at', '-id']}],
+	}
+
+
+class SpendRollup(Document):
+	"""One user's spending for one calendar month, kept current with ``$inc`` on every write.
+
+	``groups`` is keyed by group slug and ``friends`` by the other participant's id;
+	both hold the user's own share. Settlements are tracked apart from spending.
+	"""
+
+	user = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+	month = StringField(required=True)  # YYYY-MM
+	share_total = FloatField(default=0)
+	count = IntField(default=0)
+	groups = DictField(field=FloatField(), default=dict)
+	group_labels = DictField(field=StringField(), default=dict)
+	friends = DictField(field=FloatField(), default=dict)
+	settled_total = FloatField(default=0)
+	settled_friends = DictField(field=FloatField(), default=dict)
+
+	meta = {
+		'collection': 'spend_rollups',
+		'indexes': [
+			{'fields': ['user', 'month'], 'unique': True},
+		],
 	}
@@ -0,0 +1,94 @@
+"""Cached debt simplification plans.
+
+Plans are stored in the ``plans`` cache (a bounded in-process LRU, or Redis
+when ``REDIS_URL`` is set) under a key built from the ledger version counters
+of everyone involved. A ledger write bumps those counters, so a changed circle
+simply misses the cache and old plans age out; nothing is ever invalidated by
+hand. The same key, hashed, is the endpoint's ETag.
+"""
+import hashlib
+
+from django.core.cache import caches
+
+from backend.loaders import BatchLoader
+from users import services
+from users.models import User
+
+from . import solver
+
+
+CACHE_ALIAS = 'plans'
+
+
+def circle_key(user, version, mode, time_budget) -> str:
+	return f"circle:{user.id}:{version}:{mode}:{time_budget}"
+
+
+def group_key(user, scope, versions, mode, time_budget) -> str:
+	members = ','.join(f"{member_id}={version}" for member_id, version in sorted(versions.items(), key=lambda item: str(item[0])))
+	digest = hashlib.sha1(members.encode()).hexdigest()
+	return f"group:{user.id}:{scope}:{digest}:{mode}:{time_budget}"
+
+
+def etag(key) -> str:
+	return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+
+def not_modified(request, tag) -> bool:
+	header = request.headers.get('If-None-Match') or ''
+	return tag in [value.strip() for value in header.split(',')] or header.strip() == '*'
+
+
+def get(key):
+	return caches[CACHE_ALIAS].get(key)
+
+
+def store(key, plan) -> None:
+	caches[CACHE_ALIAS].set(key, plan)
+
+
+def build_circle_plan(user, mode=solver.SOLVER_GREEDY, time_budget=solver.DEFAULT_TIME_BUDGET) -> dict:
+	"""Simplify the debts between ``user`` and their friends, from ``user``'s point of view."""
+	friendships = services.list_friend_ledgers(user)
+
+	if not friendships:
+		return {'transactions': [], 'original_count': 0, 'simplified_count': 0, 'solver': mode}
+
+	# Build net positions for every person in this user's circle
+	# user's net = sum of all friendship balances
+	# each friend's net = negation of their friendship balance with user
+	user_net = sum(float(f.balance or 0) for f in friendships)
+	people = [{'id': str(user.id), 'name': 'You', 'net': round(user_net, 2)}]
+
+	loader = BatchLoader({User: User.SUMMARY_FIELDS})
+	loader.queue(User, *(f.friend_id for f in friendships))
+	for f in friendships:
+		friend = loader.resolve(User, f.friend_id)
+		if not friend:
+			continue
+		people.append({
+			'id': str(friend.id),
+			'name': friend.name,
+			'net': round(-float(f.balance or 0), 2),
+		})
+
+	# Count non-zero bilateral relationships as "original" transactions
+	original_count = sum(1 for f in friendships if abs(float(f.balance or 0)) > 0.01)
+	transactions, used = solver.solve(people, mode, time_budget)
+
+	return {
+		'transactions': transactions,
+		'original_count': original_count,
+		'simplified_count': len(transactions),
+		'solver': used,
+	}
+
+
+def circle_plan(user, mode=solver.SOLVER_GREEDY, time_budget=solver.DEFAULT_TIME_BUDGET) -> dict:
+	"""``build_circle_plan`` through the cache, keyed by ``user``'s ledger version."""
+	key = circle_key(user, services.ledger_version(user), mode, time_budget)
+	plan = get(key)
+	if plan is None:
+		plan = build_circle_plan(user, mode, time_budget)
+		store(key, plan)
+	return plan
@@ -0,0 +1,185 @@
+"""Per-user monthly spend rollups.
+
+Expense and settlement writes ``$inc`` the SpendRollup row of every user they
+touch, so analytics reads a handful of monthly documents instead of scanning
+expenses. ``rebuild`` regenerates the rows from history when they drift.
+"""
+from collections import defaultdict
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+
+from users import services
+from users.models import FriendSettlement
+
+from .models import Expense, SpendRollup
+
+
+def month_key(value) -> str:
+	return value.strftime('%Y-%m')
+
+
+def _ref(value):
+	return getattr(value, 'id', value)
+
+
+def _participant_shares(participants):
+	"""Return ``[(user_id, share)]`` from embedded participants or their raw SON."""
+	shares = []
+	for part in participants:
+		raw = part if isinstance(part, dict) else part._data
+		user_id = _ref(raw.get('user'))
+		if user_id is not None:
+			shares.append((user_id, round(raw.get('amount') or 0.0, 2)))
+	return shares
+
+
+def _expense_increments(shares, group_name, sign: int):
+	"""Yield ``(user_id, $inc, $set)`` for one expense applied ``sign`` times."""
+	label = services.normalize_group_label(group_name)
+	slug = services.slugify_group_label(label)
+	for user_id, share in shares:
+		amount = sign * share
+		increments = {'share_total': amount, 'count': sign}
+		if share:
+			increments[f"groups.{slug}"] = amount
+			for other_id, _ in shares:
+				if other_id != user_id:
+					increments[f"friends.{other_id}"] = amount
+		yield user_id, increments, {f"group_labels.{slug}": label}
+
+
+def expense_operations(expense: Expense, sign: int = 1) -> list:
+	"""Build the rollup updates for adding (``sign=1``) or removing (``sign=-1``) an expense."""
+	return expenses_operations([expense], sign)
+
+
+def expenses_operations(expenses, sign: int = 1) -> list:
+	"""Build one merged update per (user, month) for a batch of expenses."""
+	merged = {}
+	for expense in expenses:
+		month = month_key(expense.created_at)
+		shares = _participant_shares(expense.participants)
+		for user_id, increments, labels in _expense_increments(shares, expense.group_name, sign):
+			totals, label_sets = merged.setdefault((user_id, month), ({}, {}))
+			for path, amount in increments.items():
+				totals[path] = totals.get(path, 0) + amount
+			label_sets.update(labels)
+	return [
+		UpdateOne({'user': user_id, 'month': month}, {'$inc': totals, '$set': label_sets}, upsert=True)
+		for (user_id, month), (totals, label_sets) in merged.items()
+	]
+
+
+def settlement_operations(records) -> list:
+	operations = []
+	for record in records:
+		month = month_key(record.created_at)
+		initiator_id = _ref(record._data.get('initiator'))
+		counterparty_id = _ref(record._data.get('counterparty'))
+		amount = round(record.amount or 0.0, 2)
+		for user_id, other_id in ((initiator_id, counterparty_id), (counterparty_id, initiator_id)):
+			operations.append(UpdateOne(
+				{'user': user_id, 'month': month},
+				{'$inc': {'settled_total': amount, f"settled_friends.{other_id}": amount}},
+				upsert=True,
+			))
+	return operations
+
+
+def write(operations) -> None:
+	if operations:
+		SpendRollup._get_collection().bulk_write(operations, ordered=False)
+
+
+def apply_expense(expense: Expense, sign: int = 1) -> None:
+	write(expense_operations(expense, sign))
+
+
+def apply_settlements(records) -> None:
+	write(settlement_operations(records))
+
+
+def recent(user, months: int = 6, start: str = None, end: str = None) -> list:
+	"""Return ``user``'s rollups oldest first: the ``start``..``end`` months, or the latest ``months``."""
+	query = SpendRollup.objects(user=user)
+	if start:
+		query = query.filter(month__gte=start)
+	if end:
+		query = query.filter(month__lte=end)
+	if start or end:
+		return list(query.order_by('month'))
+	return list(query.order_by('-month').limit(months))[::-1]
+
+
+def rebuild(user_ids=None, batch_size: int = 1000) -> int:
+	"""Regenerate rollups from every expense and settlement, for all users or just ``user_ids``.
+
+	Rows are accumulated in memory per (user, month), which stays small next to the
+	history it summarises. Returns how many rollup documents were written.
+	"""
+	targets = {ObjectId(str(_ref(user_id))) for user_id in user_ids} if user_ids else None
+	rows = defaultdict(lambda: {
+		'share_total': 0.0,
+		'count': 0,
+		'groups': defaultdict(float),
+		'group_labels': {},
+		'friends': defaultdict(float),
+		'settled_total': 0.0,
+		'settled_friends': defaultdict(float),
+	})
+
+	def _add(user_id, month, increments, labels=None):
+		if targets is not None and user_id not in targets:
+			return
+		row = rows[(user_id, month)]
+		for path, amount in increments.items():
+			if '.' in path:
+				field, key = path.split('.', 1)
+				row[field][key] += amount
+			else:
+				row[path] += amount
+		for path, label in (labels or {}).items():
+			row['group_labels'][path.split('.', 1)[1]] = label
+
+	expense_query = {'participants.user': {'$in': list(targets)}} if targets is not None else {}
+	projection = {'participants.user': 1, 'participants.amount': 1, 'group_name': 1, 'created_at': 1}
+	for doc in Expense._get_collection().find(expense_query, projection).batch_size(batch_size):
+		if not doc.get('created_at'):
+			continue
+		month = month_key(doc['created_at'])
+		shares = _participant_shares(doc.get('participants') or [])
+		for user_id, increments, labels in _expense_increments(shares, doc.get('group_name'), 1):
+			_add(user_id, month, increments, labels)
+
+	settlement_query = {}
+	if targets is not None:
+		settlement_query = {'$or': [{'initiator': {'$in': list(targets)}}, {'counterparty': {'$in': list(targets)}}]}
+	projection = {'initiator': 1, 'counterparty': 1, 'amount': 1, 'created_at': 1}
+	for doc in FriendSettlement._get_collection().find(settlement_query, projection).batch_size(batch_size):
+		month = month_key(doc['created_at'])
+		amount = round(doc.get('amount') or 0.0, 2)
+		for user_id, other_id in ((doc['initiator'], doc['counterparty']), (doc['counterparty'], doc['initiator'])):
+			_add(user_id, month, {'settled_total': amount, f"settled_friends.{other_id}": amount})
+
+	collection = SpendRollup._get_collection()
+	collection.delete_many({'user': {'$in': list(targets)}} if targets is not None else {})
+	batch = []
+	for (user_id, month), row in rows.items():
+		document = {
+			'user': user_id,
+			'month': month,
+			'share_total': round(row['share_total'], 2),
+			'count': row['count'],
+			'group_labels': row['group_labels'],
+			'settled_total': round(row['settled_total'], 2),
+		}
+		for field in ('groups', 'friends', 'settled_friends'):
+			document[field] = {key: round(amount, 2) for key, amount in row[field].items()}
+		batch.append(InsertOne(document))
+		if len(batch) >= batch_size:
+			collection.bulk_write(batch, ordered=False)
+			batch = []
+	if batch:
+		collection.bulk_write(batch, ordered=False)
+	return len(rows)
@@ -0,0 +1,136 @@
+"""Debt simplification solvers over integer cents.
+
+``greedy`` repeatedly matches the largest creditor with the largest debtor.
+``exact`` finds the true minimum number of transfers by splitting the circle
+into as many zero-sum groups as possible (each group of k people settles in
+k - 1 transfers), using a DP over subsets. It is exponential in the number of
+people with a non-zero balance, so it only runs for small circles and within a
+time budget, falling back to the greedy plan otherwise.
+"""
+import heapq
+import time
+
+
+SOLVER_GREEDY = 'greedy'
+SOLVER_EXACT = 'exact'
+SOLVERS = (SOLVER_GREEDY, SOLVER_EXACT)
+EXACT_MAX_PEOPLE = 20
+DEFAULT_TIME_BUDGET = 0.25
+MAX_TIME_BUDGET = 2.0
+
+
+class _OutOfTime(Exception):
+	pass
+
+
+def _to_cents(value) -> int:
+	return int(round(float(value) * 100))
+
+
+def _balances(people):
+	"""Return ``[(cents, name, id)]`` for everyone owed or owing more than one cent."""
+	entries = []
+	for person in people:
+		cents = _to_cents(person['net'])
+		if abs(cents) > 1:
+			entries.append((cents, person['name'], person['id']))
+	return entries
+
+
+def _settle(entries):
+	"""Greedy heap settlement of ``[(cents, name, id)]``; returns transfers in cents."""
+	creditors = []  # max-heap: (-cents, name, id)
+	debtors = []    # min-heap: (cents, name, id)  -- cents is negative
+	for cents, name, person_id in entries:
+		if cents > 0:
+			heapq.heappush(creditors, (-cents, name, person_id))
+		elif cents < 0:
+			heapq.heappush(debtors, (cents, name, person_id))
+
+	transfers = []
+	while creditors and debtors:
+		neg_credit, cred_name, cred_id = heapq.heappop(creditors)
+		debt, debt_name, debt_id = heapq.heappop(debtors)
+		amount = min(-neg_credit, -debt)
+		transfers.append((debt_name, cred_name, amount))
+		if -neg_credit - amount > 0:
+			heapq.heappush(creditors, (neg_credit + amount, cred_name, cred_id))
+		if debt + amount < 0:
+			heapq.heappush(debtors, (debt + amount, debt_name, debt_id))
+	return transfers
+
+
+def _format(transfers):
+	return [
+		{'from_name': debtor, 'to_name': creditor, 'amount': cents / 100}
+		for debtor, creditor, cents in transfers
+	]
+
+
+def greedy(people):
+	"""people: list of ``{'id', 'name', 'net'}``; returns ``[{'from_name', 'to_name', 'amount'}]``."""
+	return _format(_settle(_balances(people)))
+
+
+def _zero_sum_groups(amounts, deadline):
+	"""Partition indexes of ``amounts`` (summing to zero) into the most zero-sum groups."""
+	count = len(amounts)
+	full = (1 << count) - 1
+	sums = [0] * (full + 1)
+	best = [0] * (full + 1)
+	for mask in range(1, full + 1):
+		if not mask & 0xFFF and time.monotonic() > deadline:
+			raise _OutOfTime()
+		low_bit = mask & -mask
+		sums[mask] = sums[mask ^ low_bit] + amounts[low_bit.bit_length() - 1]
+		top = 0
+		rest = mask
+		while rest:
+			bit = rest & -rest
+			rest ^= bit
+			if best[mask ^ bit] > top:
+				top = best[mask ^ bit]
+		best[mask] = top + (1 if sums[mask] == 0 else 0)
+
+	# Walk back down from the full set; every zero-sum mask on the way closes a group.
+	groups = []
+	mask = full
+	group_start = full
+	while mask:
+		target = best[mask] - (1 if sums[mask] == 0 else 0)
+		rest = mask
+		while rest:
+			bit = rest & -rest
+			rest ^= bit
+			if best[mask ^ bit] == target:
+				mask ^= bit
+				break
+		if sums[mask] == 0:
+			groups.append(group_start ^ mask)
+			group_start = mask
+	return [[index for index in range(count) if group >> index & 1] for group in groups]
+
+
+def exact(people, time_budget=DEFAULT_TIME_BUDGET):
+	"""Return ``(transactions, solver)``: the minimum plan, or the greedy one when it cannot be proven in time."""
+	entries = _balances(people)
+	if not entries:
+		return [], SOLVER_EXACT
+	if len(entries) > EXACT_MAX_PEOPLE or sum(cents for cents, _, _ in entries) != 0:
+		return _format(_settle(entries)), SOLVER_GREEDY
+	deadline = time.monotonic() + max(0.0, min(float(time_budget), MAX_TIME_BUDGET))
+	try:
+		groups = _zero_sum_groups([cents for cents, _, _ in entries], deadline)
+	except _OutOfTime:
+		return _format(_settle(entries)), SOLVER_GREEDY
+	transfers = []
+	for group in groups:
+		transfers.extend(_settle([entries[index] for index in group]))
+	return _format(transfers), SOLVER_EXACT
+
+
+def solve(people, solver=SOLVER_GREEDY, time_budget=DEFAULT_TIME_BUDGET):
+	"""Run the requested solver; returns ``(transactions, solver_used)``."""
+	if solver == SOLVER_EXACT:
+		return exact(people, time_budget)
+	return greedy(people), SOLVER_GREEDY
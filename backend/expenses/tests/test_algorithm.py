@@ -3,6 +3,7 @@ Tests for the _min_cash_flow debt-simplification algorithm.
 Pure Python — no database or authentication needed.
 """
 import pytest
+from expenses import solver
 from expenses.views import _min_cash_flow
 
 
@@ -122,3 +123,46 @@ class TestMinCashFlowSettlement:
         ]
         txns = _min_cash_flow(people)
         assert all(t["amount"] > 0 for t in txns)
+
+
+class TestExactSolver:
+    def test_exact_beats_greedy_on_disjoint_groups(self):
+        """Two independent zero-sum groups need n - 2 transfers; greedy crosses them."""
+        people = [
+            {"id": str(i), "name": f"P{i}", "net": net}
+            for i, net in enumerate([5.0, 5.0, -3.0, -7.0, 4.0, -4.0])
+        ]
+        txns, used = solver.solve(people, solver.SOLVER_EXACT)
+        assert used == solver.SOLVER_EXACT
+        assert _all_settled(people, txns)
+        assert len(txns) == 4
+        assert len(_min_cash_flow(people)) == 5
+
+    def test_exact_uses_integer_cents(self):
+        people = [
+            {"id": "1", "name": "Alice", "net": 0.1},
+            {"id": "2", "name": "Bob", "net": 0.2},
+            {"id": "3", "name": "Carol", "net": -0.3},
+        ]
+        txns, used = solver.solve(people, solver.SOLVER_EXACT)
+        assert used == solver.SOLVER_EXACT
+        assert _all_settled(people, txns)
+        assert sorted(t["amount"] for t in txns) == [0.1, 0.2]
+
+    def test_falls_back_to_greedy_when_out_of_time(self):
+        people = [
+            {"id": str(i), "name": f"P{i}", "net": float(net)}
+            for i, net in enumerate([7, -3, 11, -5, 2, -9, 13, -6, 4, -8, 1, -12, 6, -1, 3, -3])
+        ]
+        txns, used = solver.solve(people, solver.SOLVER_EXACT, time_budget=0)
+        assert used == solver.SOLVER_GREEDY
+        assert txns == _min_cash_flow(people)
+
+    def test_falls_back_to_greedy_for_large_circles(self):
+        people = [
+            {"id": str(i), "name": f"P{i}", "net": 1.0 if i % 2 else -1.0}
+            for i in range(solver.EXACT_MAX_PEOPLE + 2)
+        ]
+        txns, used = solver.solve(people, solver.SOLVER_EXACT)
+        assert used == solver.SOLVER_GREEDY
+        assert _all_settled(people, txns)
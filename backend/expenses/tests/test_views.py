@@ -8,7 +8,7 @@ import pytest
 from unittest.mock import MagicMock, patch
 from rest_framework.test import APIRequestFactory
 
-from expenses.views import ExpenseListCreateView, ScanReceiptView
+from expenses.views import ActivityFeedView, AnalyticsView, ExpenseImportView, ExpenseListCreateView, ExportView, GroupSimplifyDebtsView, ScanReceiptView, SimplifyDebtsView, SpendSeriesView
 
 FAKE_OID = "507f1f77bcf86cd799439011"  # valid 24-char hex ObjectId (does not exist in DB)
 
@@ -31,6 +31,14 @@ def _post(view_class, data, user=None):
     return view(raw)
 
 
+def _get(view_class, params=None, user=None):
+    factory = APIRequestFactory()
+    raw = factory.get("/", data=params or {})
+    raw._force_auth_user = user or _make_user()
+    view = view_class.as_view()
+    return view(raw)
+
+
 def _mock_anthropic_module(response_text):
     """Return a sys.modules patch so `import anthropic` inside the view returns a mock."""
     mock_module = MagicMock()
@@ -151,3 +159,578 @@ class TestScanReceiptValidation:
                 {"image": "dGVzdA==", "mime_type": "image/jpeg"},
             )
         assert response.status_code == 422
+
+
+class TestExpenseCreatePipeline:
+    def test_post_writes_ledger_activity_and_notifications(self, make_user):
+        from expenses.models import Activity
+        from users import services
+        from users.models import Notification, PairLedger
+
+        payer, bob, carol = make_user("Alice"), make_user("Bob"), make_user("Carol")
+        response = _post(
+            ExpenseListCreateView,
+            {
+                "note": "Cabin",
+                "group_name": "Ski Trip",
+                "total_amount": 90.0,
+                "participants": [
+                    {"user_id": str(payer.id), "amount": 30.0},
+                    {"user_id": str(bob.id), "amount": 30.0},
+                    {"user_id": str(carol.id), "amount": 30.0},
+                ],
+            },
+            user=payer,
+        )
+        assert response.status_code == 201
+        assert [p["user"]["name"] for p in response.data["participants"]] == ["Alice", "Bob", "Carol"]
+
+        owed = services.get_friend_ledger(payer, bob)
+        owes = services.get_friend_ledger(bob, payer)
+        assert owed.balance == 30.0 and owed.group_balances == {"ski-trip": 30.0}
+        assert owes.balance == -30.0 and owes.group_labels == {"ski-trip": "Ski Trip"}
+        assert PairLedger.objects.count() == 2
+        assert Activity.objects.count() == 3
+        assert Notification.objects(actor=payer).count() == 2
+
+    def test_unknown_participant_returns_404(self, make_user):
+        payer = make_user("Alice")
+        response = _post(
+            ExpenseListCreateView,
+            {"total_amount": 10.0, "participants": [{"user_id": FAKE_OID, "amount": 10.0}]},
+            user=payer,
+        )
+        assert response.status_code == 404
+
+
+class TestActivityFeedPagination:
+    def _feed(self, make_user, count):
+        from datetime import datetime, timedelta
+        from expenses.models import Activity
+
+        user = make_user("Feed")
+        stamp = datetime(2024, 1, 1)
+        # Pairs of rows share a timestamp so the _id tie-breaker is exercised.
+        Activity.objects.insert([
+            Activity(user=user, actor=user, summary=f"entry {index}", created_at=stamp + timedelta(minutes=index // 2))
+            for index in range(count)
+        ], load_bulk=False)
+        return user
+
+    def test_cursor_walks_every_entry_once(self, make_user):
+        user = self._feed(make_user, 7)
+        first = _get(ActivityFeedView, {"limit": 3, "include_total": 1}, user=user)
+        assert first.data["total"] == 7
+        seen = [entry["summary"] for entry in first.data["results"]]
+        cursor = first.data["next"]
+        while cursor:
+            page = _get(ActivityFeedView, {"limit": 3, "cursor": cursor}, user=user)
+            assert "total" not in page.data
+            seen.extend(entry["summary"] for entry in page.data["results"])
+            cursor = page.data["next"]
+        assert seen == [f"entry {index}" for index in range(6, -1, -1)]
+
+    def test_malformed_cursor_returns_400(self, make_user):
+        user = self._feed(make_user, 1)
+        assert _get(ActivityFeedView, {"cursor": "not-a-cursor"}, user=user).status_code == 400
+
+
+class TestListSerializationBatching:
+    def test_expense_and_activity_pages_resolve_references(self, make_user):
+        payer, bob, carol = make_user("Alice"), make_user("Bob"), make_user("Carol")
+        for note in ("Cabin", "Lift passes"):
+            response = _post(
+                ExpenseListCreateView,
+                {
+                    "note": note,
+                    "total_amount": 30.0,
+                    "participants": [
+                        {"user_id": str(bob.id), "amount": 15.0},
+                        {"user_id": str(carol.id), "amount": 15.0},
+                    ],
+                },
+                user=payer,
+            )
+            assert response.status_code == 201
+
+        expenses = _get(ExpenseListCreateView, user=bob).data["results"]
+        assert [expense["note"] for expense in expenses] == ["Lift passes", "Cabin"]
+        assert all(expense["payer"]["name"] == "Alice" for expense in expenses)
+        assert [p["user"]["username"] for p in expenses[0]["participants"]] == ["alice", "bob", "carol"]
+
+        feed = _get(ActivityFeedView, user=carol).data["results"]
+        assert [entry["expense"]["note"] for entry in feed] == ["Lift passes", "Cabin"]
+
+    def test_loader_fetches_each_class_once_and_caches_misses(self, make_user):
+        from bson import ObjectId
+        from backend.loaders import BatchLoader
+        from users.models import User
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        missing = ObjectId(FAKE_OID)
+        loader = BatchLoader({User: User.SUMMARY_FIELDS})
+        loader.queue(User, alice.id, bob.id, missing)
+        with patch.object(BatchLoader, "_flush", wraps=loader._flush) as flush:
+            assert loader.resolve(User, alice.id).name == "Alice"
+            assert loader.resolve(User, bob).name == "Bob"
+            assert loader.resolve(User, bob.id).password is None
+            assert loader.resolve(User, missing) is None
+        assert flush.call_count == 1
+
+
+class TestParticipantSnapshot:
+    def _post_expense(self, payer, *friends):
+        response = _post(
+            ExpenseListCreateView,
+            {
+                "note": "Cabin",
+                "total_amount": 10.0 * len(friends),
+                "participants": [{"user_id": str(friend.id), "amount": 10.0} for friend in friends],
+            },
+            user=payer,
+        )
+        assert response.status_code == 201
+        return response.data["id"]
+
+    def test_new_expense_carries_ids_shares_and_profiles(self, make_user):
+        from expenses.models import Expense
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        expense = Expense.objects.get(id=self._post_expense(alice, bob))
+        assert expense.participant_ids == [alice.id, bob.id]
+        assert expense.share_of(bob) == 10.0 and expense.share_of(alice) == 0.0
+        assert expense.profile_of(bob.id) == {"name": "Bob", "username": "bob", "email": "bob@example.com"}
+
+    def test_list_renders_from_snapshot_and_follows_renames(self, make_user):
+        from backend.loaders import BatchLoader
+        from users import services
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        self._post_expense(alice, bob)
+        bob.name = "Robert"
+        bob.save()
+        assert services.propagate_profile_snapshot(bob) == 1
+
+        with patch.object(BatchLoader, "_flush") as flush:
+            results = _get(ExpenseListCreateView, user=alice).data["results"]
+        flush.assert_not_called()
+        assert [p["user"]["name"] for p in results[0]["participants"]] == ["Alice", "Robert"]
+
+    def test_profile_update_refreshes_snapshots_before_responding(self, make_user):
+        from expenses.models import Expense
+        from users.views import ProfileUpdateView
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        expense_id = self._post_expense(alice, bob)
+        raw = APIRequestFactory().patch("/", data=json.dumps({"name": "Robert"}), content_type="application/json")
+        raw._force_auth_user = bob
+        assert ProfileUpdateView.as_view()(raw).status_code == 200
+        assert Expense.objects.get(id=expense_id).profile_of(bob.id)["name"] == "Robert"
+
+    def test_backfill_command_snapshots_legacy_expenses(self, make_user):
+        from io import StringIO
+        from django.core.management import call_command
+        from expenses.models import Expense, ExpenseParticipant
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        Expense(
+            payer=alice,
+            total_amount=8.0,
+            participants=[ExpenseParticipant(user=alice, amount=0, is_payer=True), ExpenseParticipant(user=bob, amount=8.0)],
+        ).save()
+        call_command("backfill_expense_snapshots", stdout=StringIO())
+        expense = Expense.objects.get()
+        assert expense.shares == {str(alice.id): 0.0, str(bob.id): 8.0}
+        assert expense.profile_of(alice)["name"] == "Alice"
+
+
+class TestAnalyticsAggregation:
+    def _history(self, make_user):
+        from datetime import datetime
+        from io import StringIO
+        from django.core.management import call_command
+        from expenses.models import Expense, ExpenseParticipant
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        # Eight months of history: more buckets than the default window shows.
+        for month in range(1, 9):
+            for day in (3, 17):
+                Expense(
+                    payer=alice,
+                    total_amount=30.0,
+                    participants=[
+                        ExpenseParticipant(user=alice, amount=10.0, is_payer=True),
+                        ExpenseParticipant(user=bob, amount=20.0),
+                    ],
+                    created_at=datetime(2024, month, day, 12),
+                ).save()
+        call_command("rebuild_spend_rollups", stdout=StringIO())
+        return alice, bob
+
+    def test_default_is_last_six_months_with_all_time_total(self, make_user):
+        alice, bob = self._history(make_user)
+        data = _get(AnalyticsView, user=bob).data
+        assert [entry["month"] for entry in data["monthly"]] == [
+            "Mar 2024", "Apr 2024", "May 2024", "Jun 2024", "Jul 2024", "Aug 2024",
+        ]
+        assert all(entry["amount"] == 40.0 and entry["count"] == 2 for entry in data["monthly"])
+        assert data["summary"]["total_expenses"] == 16
+
+    def test_custom_range_by_day(self, make_user):
+        alice, _ = self._history(make_user)
+        data = _get(AnalyticsView, {"start": "2024-02-01", "end": "2024-03-10", "granularity": "day"}, user=alice).data
+        assert "monthly" not in data
+        assert [(entry["period"], entry["amount"]) for entry in data["series"]] == [
+            ("2024-02-03", 10.0), ("2024-02-17", 10.0), ("2024-03-03", 10.0),
+        ]
+        assert data["summary"]["total_expenses"] == 3
+
+    def test_invalid_params_return_400(self, make_user):
+        alice, _ = self._history(make_user)
+        assert _get(AnalyticsView, {"granularity": "year"}, user=alice).status_code == 400
+        assert _get(AnalyticsView, {"start": "03/01/2024"}, user=alice).status_code == 400
+        assert _get(AnalyticsView, {"start": "2020-01-01", "end": "2024-01-01", "granularity": "day"}, user=alice).status_code == 400
+
+
+class TestSpendRollups:
+    def _rollups(self):
+        from expenses.models import SpendRollup
+        return {
+            (str(rollup.user.id), rollup.month): rollup
+            for rollup in SpendRollup.objects
+        }
+
+    def test_create_edit_delete_and_rebuild_agree(self, make_user):
+        from io import StringIO
+        from django.core.management import call_command
+        from expenses.rollups import month_key
+        from expenses.views import ExpenseDeleteView
+        from datetime import datetime
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        created = _post(
+            ExpenseListCreateView,
+            {
+                "group_name": "Ski Trip",
+                "total_amount": 30.0,
+                "participants": [{"user_id": str(alice.id), "amount": 10.0}, {"user_id": str(bob.id), "amount": 20.0}],
+            },
+            user=alice,
+        )
+        kept = _post(
+            ExpenseListCreateView,
+            {"total_amount": 8.0, "participants": [{"user_id": str(bob.id), "amount": 8.0}]},
+            user=alice,
+        )
+        month = month_key(datetime.utcnow())
+        bob_rollup = self._rollups()[(str(bob.id), month)]
+        assert bob_rollup.share_total == 28.0 and bob_rollup.count == 2
+        assert bob_rollup.groups == {"ski-trip": 20.0, "personal-split": 8.0}
+        assert bob_rollup.friends == {str(alice.id): 28.0}
+
+        factory = APIRequestFactory()
+        edit = factory.put("/", data=json.dumps({"total_amount": 15.0}), content_type="application/json")
+        edit._force_auth_user = alice
+        assert ExpenseDeleteView.as_view()(edit, expense_id=created.data["id"]).status_code == 200
+        delete = factory.delete("/")
+        delete._force_auth_user = alice
+        assert ExpenseDeleteView.as_view()(delete, expense_id=kept.data["id"]).status_code == 200
+
+        live = self._rollups()
+        assert live[(str(bob.id), month)].share_total == 15.0
+        assert live[(str(bob.id), month)].count == 1
+
+        call_command("rebuild_spend_rollups", stdout=StringIO())
+        rebuilt = self._rollups()
+        for key, rollup in rebuilt.items():
+            assert rollup.share_total == live[key].share_total
+            assert rollup.count == live[key].count
+            assert {k: v for k, v in live[key].groups.items() if v} == rollup.groups
+
+
+class TestSpendSeries:
+    def _setup(self, make_user):
+        alice, bob, carol = make_user("Alice"), make_user("Bob"), make_user("Carol")
+        for group, friend, share in (("Ski Trip", bob, 20.0), ("Dinner", carol, 6.0)):
+            response = _post(
+                ExpenseListCreateView,
+                {
+                    "group_name": group,
+                    "total_amount": share + 10.0,
+                    "participants": [{"user_id": str(alice.id), "amount": 10.0}, {"user_id": str(friend.id), "amount": share}],
+                },
+                user=alice,
+            )
+            assert response.status_code == 201
+        return alice, bob, carol
+
+    def test_friend_and_group_slices(self, make_user):
+        alice, bob, _ = self._setup(make_user)
+        by_friend = _get(SpendSeriesView, {"friend": str(bob.id)}, user=alice).data
+        assert by_friend["friend"]["name"] == "Bob"
+        assert len(by_friend["points"]) == 13
+        assert by_friend["points"][-1]["spend"] == 10.0 and by_friend["points"][-1]["balance"] == 20.0
+        assert by_friend["points"][0]["balance"] == 0.0
+
+        by_group = _get(SpendSeriesView, {"group": "Dinner"}, user=alice).data
+        assert by_group["group"] == "dinner"
+        assert by_group["points"][-1]["spend"] == 10.0 and by_group["points"][-1]["balance"] == 6.0
+
+        overall = _get(SpendSeriesView, user=bob).data
+        assert overall["points"][-1]["spend"] == 20.0 and overall["points"][-1]["balance"] == -20.0
+
+    def test_long_ranges_are_downsampled(self, make_user):
+        from datetime import datetime
+        alice, _, _ = self._setup(make_user)
+        start = f"{datetime.utcnow().year - 9}-01-01"
+        data = _get(SpendSeriesView, {"start": start, "max_points": 12}, user=alice).data
+        assert len(data["points"]) <= 12 and data["bucket_months"] > 1
+        assert data["points"][-1]["balance"] == 26.0
+        assert sum(point["spend"] for point in data["points"]) == 20.0
+
+    def test_invalid_filters(self, make_user):
+        alice, bob, _ = self._setup(make_user)
+        stranger = make_user("Dave")
+        assert _get(SpendSeriesView, {"friend": str(stranger.id)}, user=alice).status_code == 404
+        assert _get(SpendSeriesView, {"friend": str(bob.id), "group": "Dinner"}, user=alice).status_code == 400
+        assert _get(SpendSeriesView, {"start": "2000-01-01"}, user=alice).status_code == 400
+
+
+class TestExport:
+    def _setup(self, make_user):
+        from users import services
+        alice, bob = make_user("Alice"), make_user("Bob")
+        for note in ("Cabin", "Fuel"):
+            _post(
+                ExpenseListCreateView,
+                {
+                    "note": note,
+                    "group_name": "Ski Trip",
+                    "total_amount": 30.0,
+                    "participants": [{"user_id": str(alice.id), "amount": 10.0}, {"user_id": str(bob.id), "amount": 20.0}],
+                },
+                user=alice,
+            )
+        services.apply_group_settlement(bob, alice, "ski-trip", 15.0)
+        return alice, bob
+
+    def test_ndjson_streams_every_kind(self, make_user):
+        alice, bob = self._setup(make_user)
+        response = _get(ExportView, {"fmt": "ndjson"}, user=bob)
+        assert response.status_code == 200 and response.streaming
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        assert [row["type"] for row in rows] == ["expense", "expense", "settlement", "activity", "activity", "activity"]
+        assert rows[0]["payer"] == "Alice" and rows[0]["your_share"] == 20.0
+        assert rows[2]["counterparty"] == "Alice" and rows[2]["direction"] == "you_owe"
+
+    def test_gzipped_csv(self, make_user):
+        import csv
+        import gzip
+        import io
+
+        alice, _ = self._setup(make_user)
+        response = _get(ExportView, {"fmt": "csv", "gzip": 1, "include": "expenses,settlements"}, user=alice)
+        assert response["Content-Disposition"].endswith('.csv.gz"')
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())))
+        assert [row["description"] for row in rows if row["type"] == "expense"] == ["Cabin", "Fuel"]
+        assert rows[0]["participants"] == "Alice (10.00); Bob (20.00)"
+        assert rows[-1]["direction"] == "owes_you"
+
+    def test_asgi_requests_stream_chunk_by_chunk(self, make_user):
+        import asyncio
+        from django.test import AsyncRequestFactory
+
+        from expenses import export
+
+        alice, _ = self._setup(make_user)
+        raw = AsyncRequestFactory().get("/", {"fmt": "ndjson", "include": "expenses"})
+        raw._force_auth_user = alice
+        response = ExportView.as_view()(raw)
+        assert response.is_async
+
+        async def drain():
+            return [chunk async for chunk in response.streaming_content]
+
+        def one_row_chunks(user, fmt, kinds, compress, batch_size):
+            return export.render(export.iter_records(user, kinds, 1), fmt, chunk_rows=1)
+
+        with patch.object(export, "stream", side_effect=one_row_chunks):
+            chunks = asyncio.run(drain())
+        # Each chunk is sent as it is produced, not collected into one list first.
+        assert [json.loads(chunk)["description"] for chunk in chunks] == ["Cabin", "Fuel"]
+
+    def test_bad_params_and_command(self, tmp_path, make_user):
+        from django.core.management import call_command
+        from io import StringIO
+
+        alice, _ = self._setup(make_user)
+        assert _get(ExportView, {"fmt": "xml"}, user=alice).status_code == 400
+        assert _get(ExportView, {"include": "friends"}, user=alice).status_code == 400
+        target = tmp_path / "alice.ndjson"
+        call_command("export_user_data", "alice@example.com", format="ndjson", output=str(target), batch_size=1, stdout=StringIO())
+        assert len(target.read_text().splitlines()) == 6
+
+
+class TestExpenseImport:
+    def _import(self, body, content_type, user, params=""):
+        factory = APIRequestFactory()
+        raw = factory.post(f"/{params}", data=body, content_type=content_type)
+        raw._force_auth_user = user
+        return ExpenseImportView.as_view()(raw)
+
+    def test_ndjson_rows_are_batched_and_bad_rows_reported(self, make_user):
+        from expenses.models import Activity, Expense
+        from users import services
+        from users.models import LedgerEntry, Notification
+
+        alice, bob, carol = make_user("Alice"), make_user("Bob"), make_user("Carol")
+        rows = [
+            {"note": f"Dinner {index}", "group_name": "Trip", "total_amount": 30, "created_at": "2023-05-0%dT19:00:00Z" % (index + 1),
+             "participants": [{"user": "alice", "amount": 10}, {"user": "BOB@example.com", "amount": 10}, {"user": "carol", "amount": 10}]}
+            for index in range(4)
+        ]
+        rows.append({"total_amount": 5, "participants": [{"user": "nobody", "amount": 5}]})
+        body = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+        with patch("expenses.imports.BATCH_SIZE", 2):
+            response = self._import(body, "application/x-ndjson", alice)
+
+        assert response.status_code == 201
+        assert response.data["imported"] == 4 and response.data["failed"] == 2
+        assert [error["line"] for error in response.data["errors"]] == [5, 6]
+        assert Expense.objects.count() == 4
+        assert Expense.objects.order_by("created_at").first().created_at.day == 1
+        assert services.get_friend_ledger(alice, bob).balance == 40.0
+        assert services.get_friend_ledger(carol, alice).group_balances == {"trip": -40.0}
+        # One journal entry per pair and group in each batch of two, not one per row and friend.
+        assert LedgerEntry.objects(source=LedgerEntry.SOURCE_IMPORT).count() == 4
+        assert Activity.objects.count() == 3
+        assert Notification.objects.count() == 0
+
+    def test_journal_entries_are_dated_in_the_month_of_their_expenses(self, make_user):
+        from users.models import LedgerEntry
+
+        alice, _ = make_user("Alice"), make_user("Bob")
+        rows = [
+            {"note": note, "group_name": "Trip", "total_amount": 20, "created_at": when,
+             "participants": [{"user": "alice", "amount": 10}, {"user": "bob", "amount": 10}]}
+            for note, when in [("Dinner", "2023-05-20T19:00:00Z"), ("Taxi", "2023-05-21T01:00:00Z"), ("Hotel", "2023-06-02T12:00:00Z")]
+        ]
+        response = self._import("\n".join(json.dumps(row) for row in rows), "application/x-ndjson", alice)
+
+        assert response.status_code == 201
+        entries = LedgerEntry.objects(source=LedgerEntry.SOURCE_IMPORT).order_by("created_at")
+        assert [(entry.created_at.year, entry.created_at.month, abs(entry.amount)) for entry in entries] == [(2023, 5, 20.0), (2023, 6, 10.0)]
+
+    def test_csv_import_and_dry_run(self, make_user):
+        from expenses.models import Expense
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        body = "note,group_name,total_amount,participants\nFuel,Road trip,12,bob@example.com:12\nBad,,x,bob:1\n"
+        dry = self._import(body, "text/csv", alice, "?dry_run=1")
+        assert dry.status_code == 200 and dry.data["imported"] == 1 and Expense.objects.count() == 0
+
+        response = self._import(body, "text/csv", alice)
+        assert response.status_code == 201
+        assert response.data["errors"] == [{"line": 3, "error": "total_amount must be a valid number."}]
+        assert Expense.objects.get().profile_of(bob)["name"] == "Bob"
+
+    def test_format_param_overrides_the_content_type(self, make_user):
+        alice, _ = make_user("Alice"), make_user("Bob")
+        body = "note,group_name,total_amount,participants\nFuel,Road trip,12,bob:12\n"
+        response = self._import(body, "text/plain", alice, "?fmt=csv")
+        assert response.status_code == 201 and response.data["imported"] == 1
+        assert self._import(body, "text/plain", alice, "?fmt=xml").status_code == 400
+
+
+class TestGroupSimplify:
+    def _setup(self, make_user):
+        from users import services
+        from users.models import LedgerEntry
+
+        alice, bob, carol = make_user("Alice"), make_user("Bob"), make_user("Carol")
+        services.apply_balance_changes(
+            [(alice, bob, 10.0, "Trip"), (alice, carol, 10.0, "Trip"), (bob, carol, 10.0, "Trip"), (alice, bob, 5.0, "Rent")],
+            source=LedgerEntry.SOURCE_EXPENSE,
+        )
+        return alice, bob, carol
+
+    def test_group_scope_nets_balances_between_friends(self, make_user):
+        alice, bob, carol = self._setup(make_user)
+        data = _get(GroupSimplifyDebtsView, {"group": "Trip"}, user=alice).data
+        assert data["original_count"] == 3
+        assert data["transactions"] == [{"from_name": "Carol", "to_name": "You", "amount": 20.0}]
+        assert {member["name"]: member["net"] for member in data["members"]} == {"You": 20.0, "Bob": 0.0, "Carol": -20.0}
+
+    def test_member_scope_uses_total_balances(self, make_user):
+        alice, bob, carol = self._setup(make_user)
+        data = _get(GroupSimplifyDebtsView, {"members": f"{bob.id},{carol.id}"}, user=alice).data
+        assert data["transactions"] == [
+            {"from_name": "Carol", "to_name": "You", "amount": 20.0},
+            {"from_name": "Bob", "to_name": "You", "amount": 5.0},
+        ]
+
+    def test_requires_scope_and_known_members(self, make_user):
+        alice, _, _ = self._setup(make_user)
+        stranger = make_user("Dave")
+        assert _get(GroupSimplifyDebtsView, user=alice).status_code == 400
+        assert _get(GroupSimplifyDebtsView, {"members": str(stranger.id)}, user=alice).status_code == 400
+
+    def test_reports_solver_and_rejects_unknown_modes(self, make_user):
+        alice, _, _ = self._setup(make_user)
+        data = _get(GroupSimplifyDebtsView, {"group": "Trip", "solver": "exact"}, user=alice).data
+        assert data["solver"] == "exact"
+        assert data["transactions"] == [{"from_name": "Carol", "to_name": "You", "amount": 20.0}]
+        assert _get(GroupSimplifyDebtsView, {"group": "Trip"}, user=alice).data["solver"] == "greedy"
+        assert _get(GroupSimplifyDebtsView, {"group": "Trip", "solver": "magic"}, user=alice).status_code == 400
+        assert _get(GroupSimplifyDebtsView, {"group": "Trip", "time_budget_ms": "soon"}, user=alice).status_code == 400
+
+
+class TestSimplifyPlanCache:
+    def test_plan_is_cached_until_the_ledger_changes(self, make_user):
+        from users import services
+        from users.models import LedgerEntry
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        first = _get(SimplifyDebtsView, user=alice)
+        with patch("expenses.views.solver.solve") as solve:
+            again = _get(SimplifyDebtsView, user=alice)
+        solve.assert_not_called()
+        assert again.data == first.data
+        assert again["ETag"] == first["ETag"]
+
+        services.apply_balance_change(alice, bob, 5.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        changed = _get(SimplifyDebtsView, user=alice)
+        assert changed["ETag"] != first["ETag"]
+        assert changed.data["transactions"] == [{"from_name": "Bob", "to_name": "You", "amount": 15.0}]
+
+    def test_matching_etag_returns_not_modified(self, make_user):
+        from users import services
+        from users.models import LedgerEntry
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        tag = _get(SimplifyDebtsView, user=alice)["ETag"]
+        raw = APIRequestFactory().get("/", HTTP_IF_NONE_MATCH=tag)
+        raw._force_auth_user = alice
+        assert SimplifyDebtsView.as_view()(raw).status_code == 304
+
+    def test_reconcile_fixes_invalidate_the_plan(self, make_user):
+        from expenses.models import Expense, ExpenseParticipant
+        from users import reconcile, services
+        from users.models import LedgerEntry
+
+        alice, bob = make_user("Alice"), make_user("Bob")
+        Expense(
+            payer=alice,
+            group_name="Trip",
+            total_amount=12.0,
+            participants=[ExpenseParticipant(user=bob, amount=12.0)],
+        ).save()
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=LedgerEntry.SOURCE_EXPENSE)
+        before = _get(SimplifyDebtsView, user=alice)
+
+        assert reconcile.reconcile_range(*reconcile.user_ranges(10)[0], fix=True)["fixed"] == 1
+        after = _get(SimplifyDebtsView, user=alice)
+        assert after["ETag"] != before["ETag"]
+        assert after.data["transactions"] == [{"from_name": "Bob", "to_name": "You", "amount": 12.0}]
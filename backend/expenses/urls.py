@@ -4,16 +4,24 @@ from .views import (
     ActivityFeedView,
     AnalyticsView,
     ExpenseDeleteView,
+    ExpenseImportView,
     ExpenseListCreateView,
+    ExportView,
+    GroupSimplifyDebtsView,
     ScanReceiptView,
     SimplifyDebtsView,
+    SpendSeriesView,
 )
 
 urlpatterns = [
     path('expenses/', ExpenseListCreateView.as_view()),
     path('expenses/scan-receipt/', ScanReceiptView.as_view()),
+    path('expenses/import/', ExpenseImportView.as_view()),
     path('expenses/<str:expense_id>/', ExpenseDeleteView.as_view()),
     path('activity/', ActivityFeedView.as_view()),
+    path('export/', ExportView.as_view()),
     path('analytics/', AnalyticsView.as_view()),
     path('analytics/simplify/', SimplifyDebtsView.as_view()),
+    path('analytics/simplify/group/', GroupSimplifyDebtsView.as_view()),
+    path('analytics/series/', SpendSeriesView.as_view()),
 ]
@@ -1,18 +1,22 @@
-import heapq
 import json as _json
 import logging
-from collections import defaultdict
 from datetime import datetime, timezone
 
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from ai import gateway
+from backend.loaders import BatchLoader
+from backend.pagination import TRUTHY_PARAMS, InvalidCursor, paginate
 from realtime import pubsub as realtime_pubsub
-from users.models import Friendship, User, Notification
+from users.models import LedgerEntry, User, Notification
 from users import services
 
+from . import analytics, export, imports, plans, rollups, solver
 from .models import Activity, Expense, ExpenseParticipant
 
 
@@ -35,17 +39,36 @@ def _serialize_user_min(user):
 	}
 
 
-def serialize_expense(expense):
+def make_loader() -> BatchLoader:
+	return BatchLoader({User: User.SUMMARY_FIELDS, Expense: Expense.SUMMARY_FIELDS})
+
+
+def queue_expense_refs(loader, expenses) -> None:
+	"""Queue the payer and participant ids that have no cached profile so one query loads them all."""
+	for expense in expenses:
+		refs = [expense._data.get('payer')] + [part._data.get('user') for part in expense.participants]
+		loader.queue(User, *(ref for ref in refs if not expense.profile_of(ref)))
+
+
+def serialize_expense(expense, loader=None):
+	def _user(doc, field):
+		ref = doc._data.get(field)
+		profile = expense.profile_of(ref)
+		if profile:
+			return {"id": str(getattr(ref, 'id', ref)), **profile}
+		user = loader.resolve(User, ref) if loader else getattr(doc, field)
+		return _serialize_user_min(user)
+
 	return {
 		"id": str(expense.id),
 		"note": expense.note or '',
 		"group_name": expense.group_name or '',
 		"total_amount": round(expense.total_amount, 2),
 		"created_at": _isoformat_utc(expense.created_at),
-		"payer": _serialize_user_min(expense.payer),
+		"payer": _user(expense, 'payer'),
 		"participants": [
 			{
-				"user": _serialize_user_min(part.user),
+				"user": _user(part, 'user'),
 				"amount": round(part.amount, 2),
 				"is_payer": bool(part.is_payer),
 			}
@@ -54,17 +77,18 @@ def serialize_expense(expense):
 	}
 
 
-def serialize_activity(entry):
+def serialize_activity(entry, loader=None):
 	expense_data = None
-	if entry.expense:
-		try:
+	try:
+		expense = loader.resolve(Expense, entry._data.get('expense')) if loader else entry.expense
+		if expense:
 			expense_data = {
-				"id": str(entry.expense.id),
-				"note": entry.expense.note or '',
-				"total_amount": round(entry.expense.total_amount, 2),
+				"id": str(expense.id),
+				"note": expense.note or '',
+				"total_amount": round(expense.total_amount, 2),
 			}
-		except Exception:
-			expense_data = None
+	except Exception:
+		expense_data = None
 	return {
 		"id": str(entry.id),
 		"summary": entry.summary,
@@ -116,13 +140,24 @@ def _notify_expense_participants(expense, payer, friend_parts, group_label, expe
 
 class ExpenseListCreateView(APIView):
 	def get(self, request):
-		user = request.user
-		expenses = (
-			Expense.objects(participants__user=user)
-			.order_by('-created_at')
-			.limit(25)
-		)
-		return Response({"results": [serialize_expense(expense) for expense in expenses]})
+		try:
+			page = paginate(
+				Expense.objects(participants__user=request.user).no_dereference(),
+				request.query_params,
+				default_limit=25,
+				max_limit=100,
+			)
+		except InvalidCursor as exc:
+			return Response({"error": str(exc)}, status=400)
+		loader = make_loader()
+		queue_expense_refs(loader, page["items"])
+		payload = {
+			"results": [serialize_expense(expense, loader) for expense in page["items"]],
+			"next": page["next"],
+		}
+		if "total" in page:
+			payload["total"] = page["total"]
+		return Response(payload)
 
 	def post(self, request):
 		user = request.user
@@ -144,9 +179,7 @@ class ExpenseListCreateView(APIView):
 		if len(participants_payload) < 1:
 			return Response({"error": "Add at least one other participant."}, status=400)
 
-		participant_docs = []
-		participant_map = {}
-
+		parsed_entries = []
 		for entry in participants_payload:
 			user_id = entry.get('user_id')
 			amount_value = entry.get('amount')
@@ -160,8 +193,19 @@ class ExpenseListCreateView(APIView):
 
 			if share < 0:
 				return Response({"error": "Shares cannot be negative."}, status=400)
+			parsed_entries.append((str(user_id), share))
+
+		# Resolve every participant with one $in query instead of a lookup per entry.
+		users_by_id = services.load_users_by_id(
+			user_id for user_id, _ in parsed_entries if user_id != str(user.id)
+		)
+		users_by_id[str(user.id)] = user
+
+		participant_docs = []
+		participant_map = {}
 
-			participant_user = User.objects(id=str(user_id)).first()
+		for user_id, share in parsed_entries:
+			participant_user = users_by_id.get(user_id)
 			if not participant_user:
 				return Response({"error": f"User {user_id} not found."}, status=404)
 
@@ -199,34 +243,41 @@ class ExpenseListCreateView(APIView):
 			total_amount=total_amount,
 			participants=participant_docs,
 		)
+		expense.sync_participant_snapshot()
 		expense.save()
 
-		for part in participant_docs:
-			if str(part.user.id) == payer_key:
-				continue
+		friend_parts = [part for part in participant_docs if str(part.user.id) != payer_key]
+
+		ledger_changes = []
+		for part in friend_parts:
 			delta = round(part.amount, 2)
 			if delta <= 0:
 				continue
-			services.ensure_friendship(user, part.user)
-			services.apply_balance_change(user, part.user, delta, group_label)
-			services.apply_balance_change(part.user, user, -delta, group_label)
+			ledger_changes.append((user, part.user, delta, group_label))
+		services.apply_balance_changes(
+			ledger_changes,
+			source=LedgerEntry.SOURCE_EXPENSE,
+			source_id=expense.id,
+		)
+		rollups.apply_expense(expense)
 
-		friend_parts = [part for part in participant_docs if str(part.user.id) != payer_key]
 		owed_total = round(sum(part.amount for part in friend_parts), 2)
 		friend_names = _list_names(friend_parts) or 'friends'
 
-		Activity(
-			user=user,
-			actor=user,
-			expense=expense,
-			summary=f"You logged {expense_title}",
-			detail=f"{friend_names} owe you ${owed_total:.2f} total in {group_label}.",
-			amount=owed_total,
-			status='credited' if owed_total > 0 else 'posted',
-		).save()
-
-		for part in friend_parts:
+		activities = [
 			Activity(
+				user=user,
+				actor=user,
+				expense=expense,
+				summary=f"You logged {expense_title}",
+				detail=f"{friend_names} owe you ${owed_total:.2f} total in {group_label}.",
+				amount=owed_total,
+				status='credited' if owed_total > 0 else 'posted',
+			)
+		]
+		notifications = []
+		for part in friend_parts:
+			activities.append(Activity(
 				user=part.user,
 				actor=user,
 				expense=expense,
@@ -234,19 +285,21 @@ class ExpenseListCreateView(APIView):
 				detail=f"You owe ${part.amount:.2f} to {user.name} for {group_label}.",
 				amount=round(-part.amount, 2),
 				status='due',
-			).save()
-			services.record_notification(
-				part.user,
-				user,
-				Notification.KIND_EXPENSE,
-				f"{user.name} added {expense_title}",
-				f"You owe ${part.amount:.2f} for {group_label or services.GROUP_FALLBACK_LABEL}.",
-				{
+			))
+			notifications.append(Notification(
+				user=part.user,
+				actor=user,
+				kind=Notification.KIND_EXPENSE,
+				title=f"{user.name} added {expense_title}",
+				body=f"You owe ${part.amount:.2f} for {group_label or services.GROUP_FALLBACK_LABEL}.",
+				data={
 					"expense_id": str(expense.id),
 					"group": group_label or services.GROUP_FALLBACK_LABEL,
 					"amount": round(float(part.amount or 0), 2),
 				},
-			)
+			))
+		Activity.objects.insert(activities, load_bulk=False)
+		services.record_notifications(notifications)
 
 		_notify_expense_participants(expense, user, friend_parts, group_label, expense_title)
 
@@ -260,6 +313,38 @@ class ExpenseListCreateView(APIView):
 		return Response(serialize_expense(expense), status=status.HTTP_201_CREATED)
 
 
+class ExpenseImportView(APIView):
+	"""POST /api/expenses/import/?fmt=ndjson|csv — bulk-load expense history from the body.
+
+	The caller is the payer of every row. Rows that fail validation are skipped and
+	reported; the rest are written in batches without per-row fan-out.
+	"""
+
+	def post(self, request):
+		# ``fmt`` like the export view: DRF claims ``format`` for renderer selection.
+		fmt = (request.query_params.get('fmt') or '').lower()
+		if not fmt:
+			fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+		if fmt not in imports.FORMATS:
+			return Response({"error": f"fmt must be one of {', '.join(imports.FORMATS)}."}, status=400)
+		dry_run = str(request.query_params.get('dry_run', '')).lower() in TRUTHY_PARAMS
+
+		# Read the raw body line by line instead of letting a parser buffer it whole.
+		lines = (line.decode('utf-8', errors='replace') for line in request._request)
+		importer = imports.ExpenseImporter(request.user, dry_run=dry_run)
+		importer.feed(imports.iter_rows(lines, fmt))
+		importer.finish()
+
+		if importer.imported and not dry_run:
+			for target in importer.touched_users():
+				realtime_pubsub.notify_friends_refresh(target, event='import')
+				realtime_pubsub.notify_activity_refresh(target, event='import')
+		result = importer.result()
+		if not importer.imported and importer.failed:
+			return Response(result, status=400)
+		return Response(result, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+
 class ExpenseDeleteView(APIView):
 	def put(self, request, expense_id):
 		expense = Expense.objects(id=expense_id).first()
@@ -320,21 +405,27 @@ class ExpenseDeleteView(APIView):
 				for part in old_friend_parts:
 					new_shares[str(part.user.id)] = per_person
 
-		# Reverse old balance changes
+		# Reverse old balance changes and apply the new ones in a single bulk write
+		ledger_changes = []
 		for part in old_friend_parts:
 			delta = round(part.amount, 2)
 			if delta <= 0:
 				continue
-			services.apply_balance_change(payer, part.user, -delta, old_group_label)
-			services.apply_balance_change(part.user, payer, delta, old_group_label)
+			ledger_changes.append((payer, part.user, -delta, old_group_label))
 
-		# Apply new balance changes
 		for part in old_friend_parts:
 			new_amount = new_shares.get(str(part.user.id), 0)
 			if new_amount <= 0:
 				continue
-			services.apply_balance_change(payer, part.user, new_amount, new_group_label)
-			services.apply_balance_change(part.user, payer, -new_amount, new_group_label)
+			ledger_changes.append((payer, part.user, new_amount, new_group_label))
+		services.apply_balance_changes(
+			ledger_changes,
+			source=LedgerEntry.SOURCE_EXPENSE_EDIT,
+			source_id=expense.id,
+		)
+
+		# Take the old shares out of the spend rollups before the participants change
+		rollup_operations = rollups.expense_operations(expense, sign=-1)
 
 		# Rebuild participants list with updated amounts
 		new_participants = []
@@ -349,7 +440,9 @@ class ExpenseDeleteView(APIView):
 		expense.group_name = new_group_label
 		expense.total_amount = new_total
 		expense.participants = new_participants
+		expense.sync_participant_snapshot()
 		expense.save()
+		rollups.write(rollup_operations + rollups.expense_operations(expense))
 
 		# Update activity records in-place
 		expense_title = f'"{new_note}"' if new_note else 'an expense'
@@ -393,14 +486,20 @@ class ExpenseDeleteView(APIView):
 		payer = expense.payer
 		group_label = expense.group_name or services.GROUP_FALLBACK_LABEL
 
+		ledger_changes = []
 		for part in expense.participants:
 			if str(part.user.id) == str(payer.id):
 				continue
 			delta = round(part.amount, 2)
 			if delta <= 0:
 				continue
-			services.apply_balance_change(payer, part.user, -delta, group_label)
-			services.apply_balance_change(part.user, payer, delta, group_label)
+			ledger_changes.append((payer, part.user, -delta, group_label))
+		services.apply_balance_changes(
+			ledger_changes,
+			source=LedgerEntry.SOURCE_EXPENSE_DELETE,
+			source_id=expense.id,
+		)
+		rollups.apply_expense(expense, sign=-1)
 
 		Activity.objects(expense=expense).delete()
 		expense.delete()
@@ -420,23 +519,24 @@ class ExpenseDeleteView(APIView):
 class ActivityFeedView(APIView):
 	def get(self, request):
 		try:
-			limit = int(request.query_params.get('limit', 40))
-		except (TypeError, ValueError):
-			limit = 40
-		limit = max(1, min(limit, 200))
-		offset = 0
-		try:
-			offset = int(request.query_params.get('offset', 0))
-		except (TypeError, ValueError):
-			offset = 0
-		entries = Activity.objects(user=request.user).order_by('-created_at').skip(offset).limit(limit)
-		total = Activity.objects(user=request.user).count()
-		return Response({
-			"results": [serialize_activity(entry) for entry in entries],
-			"total": total,
-			"offset": offset,
-			"limit": limit,
-		})
+			page = paginate(
+				Activity.objects(user=request.user).no_dereference(),
+				request.query_params,
+				default_limit=40,
+				max_limit=200,
+			)
+		except InvalidCursor as exc:
+			return Response({"error": str(exc)}, status=400)
+		loader = make_loader()
+		loader.queue(Expense, *(entry._data.get('expense') for entry in page["items"]))
+		payload = {
+			"results": [serialize_activity(entry, loader) for entry in page["items"]],
+			"next": page["next"],
+			"limit": page["limit"],
+		}
+		if "total" in page:
+			payload["total"] = page["total"]
+		return Response(payload)
 
 
 # ── Debt Simplification helper ────────────────────────────────────────
@@ -446,106 +546,147 @@ def _min_cash_flow(people):
 	people: list of {'id', 'name', 'net'}
 	Returns minimal list of {'from_name', 'to_name', 'amount'} transactions.
 	"""
-	creditors = []  # max-heap: (-net, name, id)
-	debtors = []    # min-heap: (net, name, id)  -- net is negative
-
-	for p in people:
-		net = round(p['net'], 2)
-		if net > 0.01:
-			heapq.heappush(creditors, (-net, p['name'], p['id']))
-		elif net < -0.01:
-			heapq.heappush(debtors, (net, p['name'], p['id']))
-
-	transactions = []
-	while creditors and debtors:
-		neg_credit, cred_name, cred_id = heapq.heappop(creditors)
-		credit = -neg_credit
-		debt_val, debt_name, debt_id = heapq.heappop(debtors)
-
-		amount = min(credit, -debt_val)
-		transactions.append({
-			'from_name': debt_name,
-			'to_name': cred_name,
-			'amount': round(amount, 2),
-		})
-
-		rem_credit = credit - amount
-		rem_debt = debt_val + amount
-		if rem_credit > 0.01:
-			heapq.heappush(creditors, (-rem_credit, cred_name, cred_id))
-		if rem_debt < -0.01:
-			heapq.heappush(debtors, (rem_debt, debt_name, debt_id))
-
-	return transactions
+	return solver.greedy(people)
+
+
+def _solver_params(params):
+	"""Read ``solver`` and ``time_budget_ms`` query params; raises ValueError on bad input."""
+	mode = params.get('solver') or solver.SOLVER_GREEDY
+	if mode not in solver.SOLVERS:
+		raise ValueError(f"solver must be one of {', '.join(solver.SOLVERS)}.")
+	raw_budget = params.get('time_budget_ms')
+	if not raw_budget:
+		return mode, solver.DEFAULT_TIME_BUDGET
+	try:
+		budget_ms = int(raw_budget)
+	except (TypeError, ValueError):
+		raise ValueError("time_budget_ms must be a whole number of milliseconds.")
+	if budget_ms <= 0:
+		raise ValueError("time_budget_ms must be positive.")
+	return mode, min(budget_ms / 1000, solver.MAX_TIME_BUDGET)
+
+
+def _plan_response(request, key, compute):
+	"""Serve a simplification plan from the cache, or compute and store it; tagged with an ETag."""
+	tag = plans.etag(key)
+	if plans.not_modified(request, tag):
+		return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': tag})
+	payload = plans.get(key)
+	if payload is None:
+		payload = compute()
+		plans.store(key, payload)
+	return Response(payload, headers={'ETag': tag})
 
 
 class SimplifyDebtsView(APIView):
 	def get(self, request):
 		user = request.user
-		friendships = list(Friendship.objects(user=user))
+		try:
+			mode, time_budget = _solver_params(request.query_params)
+		except ValueError as exc:
+			return Response({'error': str(exc)}, status=400)
+		# Read the version before the balances so a cached plan is never older than its key.
+		key = plans.circle_key(user, services.ledger_version(user), mode, time_budget)
+		return _plan_response(request, key, lambda: plans.build_circle_plan(user, mode, time_budget))
+
 
-		if not friendships:
-			return Response({'transactions': [], 'original_count': 0, 'simplified_count': 0})
+# Upper bound on people in one group-wide simplification.
+MAX_GROUP_MEMBERS = 200
 
-		# Build net positions for every person in this user's circle
-		# user's net = sum of all friendship balances
-		# each friend's net = negation of their friendship balance with user
-		user_net = sum(float(f.balance or 0) for f in friendships)
-		people = [{'id': str(user.id), 'name': 'You', 'net': round(user_net, 2)}]
 
-		for f in friendships:
+class GroupSimplifyDebtsView(APIView):
+	"""GET /api/analytics/simplify/group/?group=<slug> or ?members=<id>,<id>
+
+	Nets every pairwise balance among the members, not just the caller's own, so
+	chains between friends collapse into the fewest transfers.
+	"""
+
+	def get(self, request):
+		user = request.user
+		group = request.query_params.get('group')
+		raw_members = request.query_params.get('members')
+		group_slug = services.slugify_group_label(group) if group else None
+		if not group_slug and not raw_members:
+			return Response({'error': 'Pass a group slug or a list of members.'}, status=400)
+		try:
+			mode, time_budget = _solver_params(request.query_params)
+		except ValueError as exc:
+			return Response({'error': str(exc)}, status=400)
+
+		if raw_members:
+			requested = services.load_users_by_id(part.strip() for part in raw_members.split(','))
+			requested.pop(str(user.id), None)
+			connected = {str(ledger.friend_id) for ledger in services.list_friend_ledgers(user)}
+			if not requested or any(member_id not in connected for member_id in requested):
+				return Response({'error': 'Every member must be one of your friends.'}, status=400)
+			member_ids = [user.id] + [member.id for member in requested.values()]
+		else:
+			member_ids = services.group_member_ids(user, group_slug)
+		if len(member_ids) > MAX_GROUP_MEMBERS:
+			return Response({'error': f'Groups are limited to {MAX_GROUP_MEMBERS} members.'}, status=400)
+
+		versions = services.ledger_versions(member_ids, group_slug)
+		key = plans.group_key(user, group_slug or 'members', versions, mode, time_budget)
+		return _plan_response(request, key, lambda: self._plan(user, member_ids, group_slug, mode, time_budget))
+
+	def _plan(self, user, member_ids, group_slug, mode, time_budget):
+		# One pass over the pairs gives everyone's net position: low is owed the balance, high owes it.
+		nets = dict.fromkeys(member_ids, 0.0)
+		original_count = 0
+		for low_id, high_id, amount in services.pairwise_balances(member_ids, group_slug):
+			nets[low_id] += amount
+			nets[high_id] -= amount
+			if abs(amount) > 0.01:
+				original_count += 1
+
+		loader = make_loader()
+		loader.queue(User, *member_ids)
+		people = []
+		for member_id, net in nets.items():
+			member = user if member_id == user.id else loader.resolve(User, member_id)
+			if not member:
+				continue
 			people.append({
-				'id': str(f.friend.id),
-				'name': f.friend.name,
-				'net': round(-float(f.balance or 0), 2),
+				'id': str(member_id),
+				'name': 'You' if member_id == user.id else member.name,
+				'net': round(net, 2),
 			})
+		transactions, used = solver.solve(people, mode, time_budget)
 
-		# Count non-zero bilateral relationships as "original" transactions
-		original_count = sum(1 for f in friendships if abs(float(f.balance or 0)) > 0.01)
-		transactions = _min_cash_flow(people)
-
-		return Response({
+		return {
+			'group': group_slug,
+			'members': people,
 			'transactions': transactions,
 			'original_count': original_count,
 			'simplified_count': len(transactions),
-		})
+			'solver': used,
+		}
 
 
 class AnalyticsView(APIView):
 	def get(self, request):
 		user = request.user
+		params = request.query_params
 
-		# ── Monthly spending (last 6 months) ──────────────────────────
-		expenses = list(
-			Expense.objects(participants__user=user).order_by('-created_at').limit(300)
-		)
-
-		monthly = defaultdict(lambda: {'your_share': 0.0, 'count': 0, 'sort_key': 0})
-
-		for exp in expenses:
-			if not exp.created_at:
-				continue
-			dt = exp.created_at if exp.created_at.tzinfo else exp.created_at.replace(tzinfo=timezone.utc)
-			key = dt.strftime('%b %Y')
-			sort_key = dt.year * 100 + dt.month
-
-			user_part = next((p for p in exp.participants if str(p.user.id) == str(user.id)), None)
-			if user_part:
-				monthly[key]['your_share'] += float(user_part.amount or 0)
-				monthly[key]['count'] += 1
-				monthly[key]['sort_key'] = max(monthly[key]['sort_key'], sort_key)
-
-		monthly_list = sorted(
-			[{'month': k, 'amount': round(v['your_share'], 2), 'count': v['count']} for k, v in monthly.items()],
-			key=lambda x: next((v['sort_key'] for k, v in monthly.items() if k == x['month']), 0),
-		)[-6:]
+		# ── Spending series (last 6 months unless a range is given) ───
+		try:
+			spend = analytics.spend_series(
+				user,
+				start=analytics.parse_date(params.get('start'), 'start'),
+				end=analytics.parse_date(params.get('end'), 'end'),
+				granularity=params.get('granularity') or analytics.DEFAULT_GRANULARITY,
+			)
+		except analytics.AnalyticsError as exc:
+			return Response({'error': str(exc)}, status=400)
 
 		# ── Friend balance breakdown ───────────────────────────────────
-		friendships = list(Friendship.objects(user=user))
+		friendships = services.list_friend_ledgers(user)
+		loader = make_loader()
+		loader.queue(User, *(f.friend_id for f in friendships if abs(float(f.balance or 0)) > 0.01))
 		friends_data = sorted(
 			[
 				{
-					'name': f.friend.name,
+					'name': (loader.resolve(User, f.friend_id) or User()).name,
 					'balance': round(float(f.balance or 0), 2),
 				}
 				for f in friendships
@@ -558,20 +699,86 @@ class AnalyticsView(APIView):
 		# ── Summary stats ──────────────────────────────────────────────
 		you_owe = round(sum(abs(float(f.balance)) for f in friendships if float(f.balance or 0) < -0.01), 2)
 		owed_to_you = round(sum(float(f.balance) for f in friendships if float(f.balance or 0) > 0.01), 2)
-		total_expenses = Expense.objects(participants__user=user).count()
 
-		return Response({
-			'monthly': monthly_list,
+		payload = {
+			'granularity': spend['granularity'],
+			'series': spend['series'],
 			'friends': friends_data,
 			'summary': {
-				'total_expenses': total_expenses,
+				'total_expenses': spend['total_expenses'],
 				'you_owe': you_owe,
 				'owed_to_you': owed_to_you,
 				'net': round(owed_to_you - you_owe, 2),
 			},
+		}
+		if spend['granularity'] == 'month':
+			payload['monthly'] = [
+				{'month': entry['period'], 'amount': entry['amount'], 'count': entry['count']}
+				for entry in spend['series']
+			]
+		return Response(payload)
+
+
+class SpendSeriesView(APIView):
+	"""GET /api/analytics/series/ — monthly spend and balance with one friend or in one group."""
+
+	def get(self, request):
+		user = request.user
+		params = request.query_params
+		friend = None
+		friend_id = params.get('friend')
+		if friend_id:
+			friend = services.load_users_by_id([friend_id]).get(str(friend_id))
+			if not friend or not services.get_friend_ledger(user, friend):
+				return Response({'error': 'You are not connected to this person.'}, status=404)
+		group = params.get('group')
+		group_slug = services.slugify_group_label(group) if group else None
+		try:
+			max_points = int(params.get('max_points', analytics.SERIES_DEFAULT_POINTS))
+		except (TypeError, ValueError):
+			return Response({'error': 'max_points must be a whole number.'}, status=400)
+		try:
+			series = analytics.friend_group_series(
+				user,
+				friend=friend,
+				group_slug=group_slug,
+				start=analytics.parse_date(params.get('start'), 'start'),
+				end=analytics.parse_date(params.get('end'), 'end'),
+				max_points=max_points,
+			)
+		except analytics.AnalyticsError as exc:
+			return Response({'error': str(exc)}, status=400)
+		return Response({
+			'friend': _serialize_user_min(friend) if friend else None,
+			'group': group_slug,
+			**series,
 		})
 
 
+class ExportView(APIView):
+	"""GET /api/export/?fmt=csv|ndjson — stream the caller's expenses, settlements and activity."""
+
+	def get(self, request):
+		params = request.query_params
+		# Not ``format``: DRF reads that query param to pick a renderer and 404s on unknown values.
+		fmt = (params.get('fmt') or 'csv').lower()
+		if fmt not in export.FORMATS:
+			return Response({'error': f"fmt must be one of {', '.join(export.FORMATS)}."}, status=400)
+		kinds = [kind.strip() for kind in (params.get('include') or ','.join(export.KINDS)).split(',') if kind.strip()]
+		if not kinds or any(kind not in export.KINDS for kind in kinds):
+			return Response({'error': f"include must list any of {', '.join(export.KINDS)}."}, status=400)
+		compress = str(params.get('gzip', '')).lower() in TRUTHY_PARAMS
+
+		# Under ASGI a sync iterator would be read to the end before the first byte goes out.
+		produce = export.astream if isinstance(request._request, ASGIRequest) else export.stream
+		response = StreamingHttpResponse(
+			produce(request.user, fmt, kinds, compress),
+			content_type='application/gzip' if compress else export.CONTENT_TYPES[fmt],
+		)
+		response['Content-Disposition'] = f'attachment; filename="{export.filename(request.user, fmt, compress)}"'
+		return response
+
+
 class ScanReceiptView(APIView):
 	"""POST /api/expenses/scan-receipt/  — Claude Vision extracts note + total."""
 
@@ -594,10 +801,9 @@ class ScanReceiptView(APIView):
 			mime_type = 'image/jpeg'
 
 		try:
-			import anthropic
-			client = anthropic.Anthropic(api_key=api_key)
-
-			result = client.messages.create(
+			result = gateway.create_message(
+				'receipt_scan',
+				timeout=settings.AI_SCAN_TIMEOUT_SECONDS,
 				model='claude-haiku-4-5-20251001',
 				max_tokens=150,
 				messages=[{
@@ -641,6 +847,8 @@ class ScanReceiptView(APIView):
 
 		except _json.JSONDecodeError:
 			return Response({'error': 'Could not read the receipt. Try a clearer photo.'}, status=422)
+		except gateway.GatewayUnavailable:
+			return Response({'error': 'Receipt scanning is unavailable right now.'}, status=503, headers={'Retry-After': '5'})
 		except Exception as exc:
 			logger.exception('Receipt scan error: %s', exc)
 			return Response({'error': 'Receipt scanning is unavailable right now.'}, status=503)
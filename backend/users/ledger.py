@@ -0,0 +1,207 @@
+"""Journal replay and checkpointing for PairLedger rows.
+
+Every ledger write appends a LedgerEntry before it increments the pair. The
+snapshotter folds settled entries into each pair's checkpoint, so rebuilding a
+pair only replays the entries written since its last checkpoint.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from .models import LedgerEntry, PairLedger
+from .services import (
+    PAIR_VERSION_JOURNALED,
+    PAIR_VERSION_SEEDED,
+    _ref_id,
+    _round_currency,
+    bump_ledger_versions,
+)
+
+
+# Entries younger than this may still be racing their ledger update, so they are left for the next pass.
+SNAPSHOT_SETTLE_SECONDS = 60
+
+
+def _journal(pair: PairLedger, after=None, until=None):
+    query = {
+        'low': _ref_id(pair._data.get('low')),
+        'high': _ref_id(pair._data.get('high')),
+    }
+    id_range = {}
+    if after:
+        id_range['$gt'] = after
+    if until:
+        id_range['$lte'] = until
+    if id_range:
+        query['_id'] = id_range
+    projection = {'group_slug': 1, 'group_label': 1, 'amount': 1}
+    return LedgerEntry._get_collection().find(query, projection).sort('_id', 1)
+
+
+def _fold(balances: dict, labels: dict, rows):
+    """Add journal rows into ``balances``/``labels``; returns ``(last_entry_id, count)``."""
+    last_id = None
+    count = 0
+    for row in rows:
+        slug = row['group_slug']
+        balances[slug] = _round_currency(balances.get(slug, 0.0) + row['amount'])
+        labels[slug] = row.get('group_label') or labels.get(slug, slug)
+        last_id = row['_id']
+        count += 1
+    return last_id, count
+
+
+def _compact(balances: dict, labels: dict):
+    kept = {slug: amount for slug, amount in balances.items() if abs(amount) >= 0.01}
+    return kept, {slug: labels.get(slug, slug) for slug in kept}
+
+
+def replay_pair(pair: PairLedger):
+    """Rebuild a pair's group buckets from its checkpoint plus the journal entries after it."""
+    balances = dict(pair.checkpoint_balances or {})
+    labels = dict(pair.checkpoint_labels or {})
+    _fold(balances, labels, _journal(pair, after=pair.checkpoint_entry))
+    return _compact(balances, labels)
+
+
+def snapshot_pair(pair: PairLedger, settle_seconds: int = SNAPSHOT_SETTLE_SECONDS) -> int:
+    """Fold settled journal entries into the pair's checkpoint. Returns how many entries were folded."""
+    if pair.snapshot_version != PAIR_VERSION_JOURNALED:
+        return 0
+    cutoff = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=settle_seconds))
+    balances = dict(pair.checkpoint_balances or {})
+    labels = dict(pair.checkpoint_labels or {})
+    last_id, folded = _fold(balances, labels, _journal(pair, after=pair.checkpoint_entry, until=cutoff))
+    if not folded:
+        return 0
+    balances, labels = _compact(balances, labels)
+    result = PairLedger._get_collection().update_one(
+        # Another snapshotter may have moved the checkpoint meanwhile; its fold wins.
+        {'_id': pair.id, 'checkpoint_entry': pair.checkpoint_entry},
+        {
+            '$set': {
+                'checkpoint_entry': last_id,
+                'checkpoint_balances': balances,
+                'checkpoint_labels': labels,
+                'checkpoint_at': datetime.utcnow(),
+            },
+            '$inc': {'journal_pending': -folded},
+        },
+    )
+    return folded if result.modified_count else 0
+
+
+def baseline_pair(pair: PairLedger) -> bool:
+    """Give a pair seeded before the journal existed an opening checkpoint.
+
+    The opening is the live balance minus whatever was already journaled for it,
+    so replaying the journal afterwards reproduces the live buckets.
+    """
+    if pair.snapshot_version != PAIR_VERSION_SEEDED:
+        return False
+    journaled, journaled_labels = {}, {}
+    _fold(journaled, journaled_labels, _journal(pair))
+    opening = {}
+    for slug, amount in (pair.group_balances or {}).items():
+        carried = _round_currency(amount - journaled.get(slug, 0.0))
+        if abs(carried) >= 0.01:
+            opening[slug] = carried
+    labels = {slug: (pair.group_labels or {}).get(slug, slug) for slug in opening}
+    result = PairLedger._get_collection().update_one(
+        {'_id': pair.id, 'snapshot_version': PAIR_VERSION_SEEDED},
+        {'$set': {
+            'snapshot_version': PAIR_VERSION_JOURNALED,
+            'checkpoint_entry': None,
+            'checkpoint_balances': opening,
+            'checkpoint_labels': labels,
+            'checkpoint_at': datetime.utcnow(),
+        }},
+    )
+    return bool(result.modified_count)
+
+
+def _settled(pair: PairLedger, settle_seconds: int) -> bool:
+    """Whether every journal entry of ``pair`` is older than ``settle_seconds``, so its ``$inc`` has landed."""
+    cutoff = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=settle_seconds))
+    return next(iter(_journal(pair, after=cutoff).limit(1)), None) is None
+
+
+def _observed(pair: PairLedger) -> dict:
+    """Filter matching ``pair`` only while its balances are still the ones this process read."""
+    query = {'_id': pair.id, 'balance': pair.balance or 0.0}
+    for slug, amount in (pair.group_balances or {}).items():
+        query[f"group_balances.{slug}"] = amount
+    return query
+
+
+def _repair_update(pair: PairLedger, settle_seconds: int = SNAPSHOT_SETTLE_SECONDS):
+    """Return the ``(filter, update)`` that moves the live buckets back to what the journal says, or ``None``.
+
+    Pairs with entries younger than ``settle_seconds`` are skipped: their live
+    ``$inc`` may still be in flight, and adding the difference would count it
+    twice. The filter pins the balances this repair was computed from, so a
+    write landing in between turns the repair into a no-op.
+    """
+    if pair.snapshot_version != PAIR_VERSION_JOURNALED or not _settled(pair, settle_seconds):
+        return None
+    expected, labels = replay_pair(pair)
+    live = pair.group_balances or {}
+    increments = {}
+    query = _observed(pair)
+    for slug in set(expected) | set(live):
+        difference = _round_currency(expected.get(slug, 0.0) - live.get(slug, 0.0))
+        if difference:
+            increments[f"group_balances.{slug}"] = difference
+            query.setdefault(f"group_balances.{slug}", {'$exists': False})
+    total_difference = _round_currency(sum(expected.values()) - (pair.balance or 0.0))
+    if total_difference:
+        increments['balance'] = total_difference
+    if not increments:
+        return None
+    update = {'$inc': increments}
+    missing_labels = {
+        f"group_labels.{slug}": label
+        for slug, label in labels.items()
+        if slug not in (pair.group_labels or {})
+    }
+    if missing_labels:
+        update['$set'] = missing_labels
+    return query, update
+
+
+def _touched(pair: PairLedger, update) -> list:
+    """Return ``(low_id, high_id, group_slug)`` for every bucket a repair update moves."""
+    low_id, high_id = _ref_id(pair._data.get('low')), _ref_id(pair._data.get('high'))
+    slugs = [path.split('.', 1)[1] for path in update['$inc'] if path.startswith('group_balances.')]
+    return [(low_id, high_id, slug) for slug in slugs] or [(low_id, high_id, None)]
+
+
+def repair_pair(pair: PairLedger, settle_seconds: int = SNAPSHOT_SETTLE_SECONDS) -> bool:
+    """Move the live buckets back to what the journal says. Returns ``True`` when anything changed."""
+    repair = _repair_update(pair, settle_seconds)
+    if not repair:
+        return False
+    query, update = repair
+    if not PairLedger._get_collection().update_one(query, update).modified_count:
+        return False
+    bump_ledger_versions(_touched(pair, update))
+    return True
+
+
+def repair_pairs(pairs, settle_seconds: int = SNAPSHOT_SETTLE_SECONDS) -> int:
+    """Repair a batch of pairs with one bulk write. Returns how many pairs were repaired."""
+    operations = []
+    touched = []
+    for pair in pairs:
+        repair = _repair_update(pair, settle_seconds)
+        if repair:
+            query, update = repair
+            operations.append(UpdateOne(query, update))
+            touched.extend(_touched(pair, update))
+    if not operations:
+        return 0
+    result = PairLedger._get_collection().bulk_write(operations, ordered=False)
+    # Some of the batch may have lost to a concurrent write; bumping their counters anyway is harmless.
+    bump_ledger_versions(touched)
+    return result.modified_count
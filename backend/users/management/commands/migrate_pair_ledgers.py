@@ -0,0 +1,185 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from expenses.models import Expense
+from users.models import Friendship, FriendSettlement, LedgerMigrationRange, PairLedger
+from users import reconcile, services
+
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _collect_expenses(start, end, balances, labels) -> None:
+    bounds = reconcile.id_bounds(start, end)
+    pipeline = [
+        {'$match': {'$or': [{'payer': bounds}, {'participants.user': bounds}]}},
+        {'$unwind': '$participants'},
+        {'$group': {
+            '_id': {
+                'payer': '$payer',
+                'user': '$participants.user',
+                'group': '$group_name',
+                # Expenses without a group name are bucketed by their note, as compute_group_snapshot does.
+                'note': {'$cond': [{'$in': [{'$ifNull': ['$group_name', '']}, ['']]}, '$note', None]},
+            },
+            'amount': {'$sum': '$participants.amount'},
+        }},
+    ]
+    for row in Expense._get_collection().aggregate(pipeline, allowDiskUse=True):
+        key = row['_id']
+        payer_id, participant_id = key.get('payer'), key.get('user')
+        if not payer_id or not participant_id or payer_id == participant_id:
+            continue
+        low_id, high_id, sign = services._pair_key(payer_id, participant_id)
+        if not reconcile.owns(low_id, start, end):
+            continue
+        label = services.normalize_group_label(key.get('group') or key.get('note'))
+        slug = services.slugify_group_label(label)
+        # The payer is owed each participant's share.
+        balances[(low_id, high_id)][slug] += services._signed(row['amount'], sign)
+        labels[(low_id, high_id)][slug] = label
+
+
+def _collect_settlements(start, end, balances, labels) -> None:
+    bounds = reconcile.id_bounds(start, end)
+    pipeline = [
+        {'$match': {'$or': [{'initiator': bounds}, {'counterparty': bounds}]}},
+        {'$group': {
+            '_id': {
+                'initiator': '$initiator',
+                'counterparty': '$counterparty',
+                'slug': '$group_slug',
+                'label': '$group_label',
+                'direction': '$direction',
+            },
+            'amount': {'$sum': '$amount'},
+        }},
+    ]
+    for row in FriendSettlement._get_collection().aggregate(pipeline, allowDiskUse=True):
+        key = row['_id']
+        low_id, high_id, sign = services._pair_key(key['initiator'], key['counterparty'])
+        if not reconcile.owns(low_id, start, end):
+            continue
+        slug = key.get('slug') or services.slugify_group_label(key.get('label'))
+        signed_amount = row['amount'] if key.get('direction') == 'owes_you' else -row['amount']
+        # Same offset as _settlement_delta_for_user: the initiator's side moves by -signed_amount.
+        balances[(low_id, high_id)][slug] -= services._signed(signed_amount, sign)
+        if key.get('label'):
+            labels[(low_id, high_id)].setdefault(slug, services.normalize_group_label(key['label']))
+
+
+def _collect_memberships(start, end, balances, created) -> None:
+    # Friends with no history yet still need a pair row.
+    rows = Friendship._get_collection().find(
+        {'user': reconcile.id_bounds(start, end)},
+        {'user': 1, 'friend': 1, 'created_at': 1},
+    )
+    for row in rows:
+        low_id, high_id, _ = services._pair_key(row['user'], row['friend'])
+        if not reconcile.owns(low_id, start, end):
+            continue
+        balances.setdefault((low_id, high_id), defaultdict(float))
+        created_at = row.get('created_at')
+        if created_at:
+            created[(low_id, high_id)] = min(created.get((low_id, high_id), created_at), created_at)
+
+
+def migrate_range(start, end) -> int:
+    """Create the PairLedger rows whose low side falls in ``[start, end)``, then reconcile the range.
+
+    Pairs the live ledger upserted before this range was migrated start from
+    zero and miss their pre-ledger history; the reconcile pass journals that
+    difference onto them. Returns how many pairs were inserted or corrected.
+    """
+    balances = defaultdict(lambda: defaultdict(float))
+    labels = defaultdict(dict)
+    created = {}
+    _collect_expenses(start, end, balances, labels)
+    _collect_settlements(start, end, balances, labels)
+    _collect_memberships(start, end, balances, created)
+
+    now = datetime.utcnow()
+    operations = []
+    for (low_id, high_id), buckets in balances.items():
+        group_balances = {}
+        for slug, amount in buckets.items():
+            amount = services._round_currency(amount)
+            if abs(amount) >= 0.01:
+                group_balances[slug] = amount
+        group_labels = {slug: labels[(low_id, high_id)].get(slug, slug) for slug in group_balances}
+        operations.append(UpdateOne(
+            {'low': low_id, 'high': high_id},
+            # Pairs the live ledger already wrote are corrected by the reconcile pass below.
+            {'$setOnInsert': {
+                'balance': services._round_currency(sum(group_balances.values())),
+                'group_balances': group_balances,
+                'group_labels': group_labels,
+                'checkpoint_entry': None,
+                'checkpoint_balances': group_balances,
+                'checkpoint_labels': group_labels,
+                'checkpoint_at': now,
+                'snapshot_version': services.PAIR_VERSION_JOURNALED,
+                'journal_pending': 0,
+                'created_at': created.get((low_id, high_id)) or now,
+            }},
+            upsert=True,
+        ))
+
+    inserted = 0
+    collection = PairLedger._get_collection()
+    for offset in range(0, len(operations), WRITE_BATCH_SIZE):
+        result = collection.bulk_write(operations[offset:offset + WRITE_BATCH_SIZE], ordered=False)
+        inserted += result.upserted_count
+    return inserted + reconcile.reconcile_range(start, end, fix=True, sample_size=0)['fixed']
+
+
+class Command(BaseCommand):
+    help = (
+        "Build PairLedger rows for every friend pair from expense and settlement history, and correct "
+        "pairs the live ledger wrote before their range was migrated. Interrupted runs resume where they "
+        "stopped. If traffic was served during the run, follow it with `reconcile_ledgers --fix`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', default='pair-ledger', help='Name used to track completed ranges.')
+        parser.add_argument('--range-size', type=int, default=500, help='Users per work range.')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes; 1 runs in-process.')
+        parser.add_argument('--restart', action='store_true', help='Forget completed ranges for this run.')
+
+    def handle(self, *args, **options):
+        run = options['run']
+        if options['restart']:
+            LedgerMigrationRange.objects(run=run).delete()
+
+        done = set(LedgerMigrationRange.objects(run=run).scalar('range_start'))
+        ranges = [(start, end) for start, end in reconcile.user_ranges(max(1, options['range_size'])) if start not in done]
+        if not ranges:
+            self.stdout.write(self.style.SUCCESS('Every user range has already been migrated.'))
+            return
+
+        self.stdout.write(f"Migrating {len(ranges)} user ranges ({len(done)} already done)...")
+        written = 0
+        for completed, (start, end, inserted) in enumerate(self._run(ranges, options['workers']), start=1):
+            LedgerMigrationRange(run=run, range_start=start, range_end=end, pairs_written=inserted).save()
+            written += inserted
+            if completed % 20 == 0:
+                self.stdout.write(f"Processed {completed}/{len(ranges)} ranges...")
+
+        self.stdout.write(self.style.SUCCESS(f"Created or corrected {written} pair ledgers across {len(ranges)} ranges."))
+
+    def _run(self, ranges, workers: int):
+        if workers <= 1:
+            for start, end in ranges:
+                yield start, end, migrate_range(start, end)
+            return
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=reconcile.connect_worker) as pool:
+            futures = {pool.submit(migrate_range, start, end): (start, end) for start, end in ranges}
+            for future in as_completed(futures):
+                start, end = futures[future]
+                yield start, end, future.result()
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every pair's balances from expenses and settlements and report where the "
+        "stored ledger disagrees. With --fix the corrections are journaled and applied in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Journal and apply corrections for drifted pairs.')
+        parser.add_argument('--range-size', type=int, default=500, help='Users per work range.')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes; 1 runs in-process.')
+        parser.add_argument('--samples', type=int, default=20, help='Drifted pairs to print per range.')
+
+    def handle(self, *args, **options):
+        ranges = reconcile.user_ranges(max(1, options['range_size']))
+        if not ranges:
+            self.stdout.write(self.style.SUCCESS('No users to reconcile.'))
+            return
+
+        started = time.monotonic()
+        totals = {'scanned': 0, 'pairs': 0, 'drifted': 0, 'fixed': 0}
+        for completed, report in enumerate(self._run(ranges, options), start=1):
+            for key in totals:
+                totals[key] += report[key]
+            for sample in report['samples']:
+                self.stdout.write(json.dumps(sample, sort_keys=True))
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"Range {completed}/{len(ranges)}: {totals['scanned']} documents, "
+                f"{totals['pairs']} pairs, {totals['drifted']} drifted "
+                f"({totals['scanned'] / elapsed:.0f} docs/s)"
+            )
+
+        summary = f"Checked {totals['pairs']} pairs from {totals['scanned']} documents; {totals['drifted']} drifted"
+        if options['fix']:
+            summary += f", {totals['fixed']} fixed"
+        style = self.style.SUCCESS if not totals['drifted'] or options['fix'] else self.style.WARNING
+        self.stdout.write(style(summary + '.'))
+
+    def _run(self, ranges, options):
+        arguments = {'fix': options['fix'], 'sample_size': options['samples']}
+        if options['workers'] <= 1:
+            for start, end in ranges:
+                yield reconcile.reconcile_range(start, end, **arguments)
+            return
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=context,
+            initializer=reconcile.connect_worker,
+        ) as pool:
+            futures = [pool.submit(reconcile.reconcile_range, start, end, **arguments) for start, end in ranges]
+            for future in as_completed(futures):
+                yield future.result()
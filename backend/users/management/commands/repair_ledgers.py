@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from users.models import PairLedger
+from users import ledger, services
+
+
+class Command(BaseCommand):
+    help = "Compare every pair ledger with its journal and bulk-repair the ones that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Pairs compared and repaired per bulk write.',
+        )
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=ledger.SNAPSHOT_SETTLE_SECONDS,
+            help='Skip pairs with journal entries younger than this; their writes may still be in flight.',
+        )
+
+    def handle(self, *args, **options):
+        pairs_query = PairLedger.objects(snapshot_version=services.PAIR_VERSION_JOURNALED).order_by('id')
+        count = pairs_query.count()
+        if not count:
+            self.stdout.write(self.style.SUCCESS('No pair ledgers to check.'))
+            return
+
+        batch_size = max(1, options['batch_size'])
+        scanned = 0
+        fixed = 0
+        batch = []
+        for pair in pairs_query.batch_size(batch_size):
+            batch.append(pair)
+            if len(batch) >= batch_size:
+                fixed += ledger.repair_pairs(batch, options['settle_seconds'])
+                scanned += len(batch)
+                batch = []
+                self.stdout.write(f"Checked {scanned}/{count} pairs, {fixed} repaired...")
+        if batch:
+            fixed += ledger.repair_pairs(batch, options['settle_seconds'])
+            scanned += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {scanned} pairs and repaired {fixed}."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from users.models import PairLedger
+from users import ledger, services
+
+
+class Command(BaseCommand):
+    help = "Fold new ledger journal entries into each pair's checkpoint so rebuilds only replay recent history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-pending',
+            type=int,
+            default=1,
+            help='Only checkpoint pairs with at least this many unfolded journal entries.',
+        )
+        parser.add_argument(
+            '--settle-seconds',
+            type=int,
+            default=ledger.SNAPSHOT_SETTLE_SECONDS,
+            help='Leave entries younger than this for the next run.',
+        )
+
+    def handle(self, *args, **options):
+        baselined = 0
+        for pair in PairLedger.objects(snapshot_version=services.PAIR_VERSION_SEEDED):
+            if ledger.baseline_pair(pair):
+                baselined += 1
+        if baselined:
+            self.stdout.write(f"Baselined {baselined} pairs created before the journal.")
+
+        pending_query = PairLedger.objects(
+            snapshot_version=services.PAIR_VERSION_JOURNALED,
+            journal_pending__gte=max(1, options['min_pending']),
+        )
+        count = pending_query.count()
+        if not count:
+            self.stdout.write(self.style.SUCCESS('No pairs have journal entries waiting to be folded.'))
+            return
+
+        pairs = 0
+        folded = 0
+        for pair in pending_query:
+            folded += ledger.snapshot_pair(pair, settle_seconds=options['settle_seconds'])
+            pairs += 1
+            if pairs % 200 == 0:
+                self.stdout.write(f"Processed {pairs}/{count} pairs...")
+
+        self.stdout.write(self.style.SUCCESS(f"Folded {folded} journal entries across {pairs} pairs."))
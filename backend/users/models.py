@@ -9,12 +9,16 @@ from mongoengine import (
     EmailField,
     FloatField,
     IntField,
+    ObjectIdField,
     ReferenceField,
     StringField,
     CASCADE,
 )
 
 class User(Document):
+    # Fields the public user payloads need; used as the projection when batch-loading users.
+    SUMMARY_FIELDS = ('email', 'name', 'username')
+
     email = EmailField(required=True, unique=True)
     username = StringField(required=True, unique=True, sparse=True)
     name = StringField(required=True)
@@ -45,6 +49,8 @@ class User(Document):
 
 
 class Friendship(Document):
+    """Legacy per-direction ledger row, kept only until every pair has moved to PairLedger."""
+
     user = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
     friend = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
     balance = FloatField(default=0)
@@ -64,6 +70,114 @@ class Friendship(Document):
         return f"Friendship({self.user_id}->{self.friend_id})"
 
 
+class PairLedger(Document):
+    """Balances for one pair of friends, stored once from ``low``'s point of view.
+
+    ``low``/``high`` are the pair's user ids in sorted order. A positive balance
+    means ``high`` owes ``low``; the other side reads the same row with the sign flipped.
+    """
+
+    low = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+    high = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+    balance = FloatField(default=0)
+    created_at = DateTimeField(default=datetime.utcnow)
+    group_balances = DictField(field=FloatField(), default=dict)
+    group_labels = DictField(field=StringField(), default=dict)
+    snapshot_version = IntField(default=0)
+    journal_pending = IntField(default=0)
+    checkpoint_entry = ObjectIdField()
+    checkpoint_balances = DictField(field=FloatField(), default=dict)
+    checkpoint_labels = DictField(field=StringField(), default=dict)
+    checkpoint_at = DateTimeField()
+
+    meta = {
+        'collection': 'pair_ledgers',
+        'indexes': [
+            {'fields': ['low', 'high'], 'unique': True},
+            'high',
+            'journal_pending',
+        ],
+    }
+
+    def __str__(self):
+        return f"PairLedger({self.low_id}<->{self.high_id})"
+
+
+class LedgerEntry(Document):
+    """Append-only record of one change to a PairLedger group bucket, signed from ``low``'s side."""
+
+    SOURCE_OPENING = 'opening'
+    SOURCE_EXPENSE = 'expense'
+    SOURCE_EXPENSE_EDIT = 'expense_edit'
+    SOURCE_EXPENSE_DELETE = 'expense_delete'
+    SOURCE_SETTLEMENT = 'settlement'
+    SOURCE_RECONCILE = 'reconcile'
+    SOURCE_IMPORT = 'import'
+
+    low = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+    high = ReferenceField('User', required=True, reverse_delete_rule=CASCADE)
+    group_slug = StringField(required=True)
+    group_label = StringField(required=True)
+    amount = FloatField(required=True)
+    source = StringField(
+        required=True,
+        choices=[
+            SOURCE_OPENING,
+            SOURCE_EXPENSE,
+            SOURCE_EXPENSE_EDIT,
+            SOURCE_EXPENSE_DELETE,
+            SOURCE_SETTLEMENT,
+            SOURCE_RECONCILE,
+            SOURCE_IMPORT,
+        ],
+    )
+    source_id = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'ledger_entries',
+        'indexes': [
+            {'fields': ['low', 'high', 'id']},
+        ],
+    }
+
+    def __str__(self):
+        return f"LedgerEntry({self.source}:{self.group_slug}:{self.amount})"
+
+
+class LedgerVersion(Document):
+    """Per-user counters bumped by every write to a pair the user belongs to.
+
+    ``version`` moves on any balance change (or a friend's rename), ``groups``
+    per group slug, and ``profile`` when the user's own name changes. Results
+    cached under these counters go stale on the next write.
+    """
+
+    id = ObjectIdField(primary_key=True)
+    version = IntField(default=0)
+    groups = DictField(field=IntField(), default=dict)
+    profile = IntField(default=0)
+
+    meta = {'collection': 'ledger_versions'}
+
+
+class LedgerMigrationRange(Document):
+    """Completed user-id range of a resumable ledger migration run."""
+
+    run = StringField(required=True)
+    range_start = ObjectIdField(required=True)
+    range_end = ObjectIdField()
+    pairs_written = IntField(default=0)
+    completed_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'ledger_migration_ranges',
+        'indexes': [
+            {'fields': ['run', 'range_start'], 'unique': True},
+        ],
+    }
+
+
 class FriendInvite(Document):
     STATUS_PENDING = 'pending'
     STATUS_ACCEPTED = 'accepted'
@@ -82,6 +196,7 @@ class FriendInvite(Document):
         'indexes': [
             {'fields': ['invitee_email', 'status', '-created_at']},
             {'fields': ['inviter', 'invitee_email', 'status']},
+            {'fields': ['invitee_user', 'status', '-created_at', '-id']},
         ],
     }
 
@@ -173,7 +288,7 @@ class Notification(Document):
     meta = {
         'collection': 'notifications',
         'indexes': [
-            {'fields': ['user', '-created_at']},
+            {'fields': ['user', '-created_at', '-id']},
             {'fields': ['user', 'is_read']},
         ],
     }
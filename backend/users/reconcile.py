@@ -0,0 +1,212 @@
+"""Recompute pair balances from expense and settlement history and diff them against the ledger.
+
+Work is split into user-id ranges. A pair belongs to the range that holds its
+low side, so each range can be checked (and fixed) independently, in parallel,
+with memory bounded by the number of pairs in that range.
+"""
+from collections import defaultdict
+from datetime import datetime
+import time
+
+from django.conf import settings
+from mongoengine import connect, disconnect
+from pymongo import UpdateOne
+
+from expenses.models import Expense
+
+from .models import FriendSettlement, LedgerEntry, PairLedger, User
+from .services import (
+    PAIR_VERSION_JOURNALED,
+    _pair_key,
+    _round_currency,
+    _signed,
+    bump_ledger_versions,
+    normalize_group_label,
+    slugify_group_label,
+)
+
+
+CURSOR_BATCH_SIZE = 1000
+WRITE_BATCH_SIZE = 1000
+
+
+def id_bounds(start, end) -> dict:
+    bounds = {'$gte': start}
+    if end is not None:
+        bounds['$lt'] = end
+    return bounds
+
+
+def owns(low_id, start, end) -> bool:
+    return low_id >= start and (end is None or low_id < end)
+
+
+def user_ranges(range_size: int):
+    """Split the user ids into ``[start, end)`` ranges of ``range_size`` users; the last range is open."""
+    starts = []
+    cursor = User._get_collection().find({}, {'_id': 1}, batch_size=CURSOR_BATCH_SIZE).sort('_id', 1)
+    for index, row in enumerate(cursor):
+        if index % range_size == 0:
+            starts.append(row['_id'])
+    return [
+        (start, starts[index + 1] if index + 1 < len(starts) else None)
+        for index, start in enumerate(starts)
+    ]
+
+
+def connect_worker() -> None:
+    """Process-pool initializer: a forked worker must not share the parent's MongoDB sockets."""
+    disconnect(alias='default')
+    connect(db=settings.MONGODB_DB_NAME, host=settings.MONGODB_URI, alias='default', connect=False)
+
+
+def expected_balances(start, end):
+    """Stream the history touching ``[start, end)`` and fold it into per-pair, per-slug balances.
+
+    Returns ``(balances, labels, scanned)`` where balances are signed from each pair's low side.
+    """
+    balances = defaultdict(lambda: defaultdict(float))
+    labels = defaultdict(dict)
+    scanned = 0
+    bounds = id_bounds(start, end)
+
+    expenses = Expense._get_collection().find(
+        {'$or': [{'payer': bounds}, {'participants.user': bounds}]},
+        {'payer': 1, 'participants.user': 1, 'participants.amount': 1, 'group_name': 1, 'note': 1},
+        batch_size=CURSOR_BATCH_SIZE,
+    )
+    for row in expenses:
+        scanned += 1
+        payer_id = row.get('payer')
+        label = normalize_group_label(row.get('group_name') or row.get('note'))
+        slug = slugify_group_label(label)
+        for part in row.get('participants') or []:
+            participant_id = part.get('user')
+            if not participant_id or participant_id == payer_id:
+                continue
+            low_id, high_id, sign = _pair_key(payer_id, participant_id)
+            if not owns(low_id, start, end):
+                continue
+            balances[(low_id, high_id)][slug] += _signed(_round_currency(part.get('amount')), sign)
+            labels[(low_id, high_id)][slug] = label
+
+    settlements = FriendSettlement._get_collection().find(
+        {'$or': [{'initiator': bounds}, {'counterparty': bounds}]},
+        {'initiator': 1, 'counterparty': 1, 'amount': 1, 'direction': 1, 'group_slug': 1, 'group_label': 1},
+        batch_size=CURSOR_BATCH_SIZE,
+    )
+    for row in settlements:
+        scanned += 1
+        low_id, high_id, sign = _pair_key(row['initiator'], row['counterparty'])
+        if not owns(low_id, start, end):
+            continue
+        slug = row.get('group_slug') or slugify_group_label(row.get('group_label'))
+        amount = _round_currency(row.get('amount'))
+        signed_amount = amount if row.get('direction') == 'owes_you' else -amount
+        # The initiator's side moves by -signed_amount, as in _settlement_delta_for_user.
+        balances[(low_id, high_id)][slug] -= _signed(signed_amount, sign)
+        if row.get('group_label'):
+            labels[(low_id, high_id)].setdefault(slug, normalize_group_label(row['group_label']))
+    return balances, labels, scanned
+
+
+def _diff_pair(expected: dict, stored: dict) -> dict:
+    differences = {}
+    for slug in set(expected) | set(stored):
+        difference = _round_currency(expected.get(slug, 0.0) - stored.get(slug, 0.0))
+        if abs(difference) >= 0.01:
+            differences[slug] = difference
+    return differences
+
+
+def _fix_operations(low_id, high_id, differences: dict, balance_delta: float, labels: dict):
+    entries = []
+    increments = {'balance': balance_delta}
+    if differences:
+        increments['journal_pending'] = len(differences)
+    label_updates = {}
+    for slug, difference in differences.items():
+        label = labels.get(slug) or slug
+        entries.append(LedgerEntry(
+            low=low_id,
+            high=high_id,
+            group_slug=slug,
+            group_label=label,
+            amount=difference,
+            source=LedgerEntry.SOURCE_RECONCILE,
+        ))
+        increments[f"group_balances.{slug}"] = difference
+        label_updates[f"group_labels.{slug}"] = label
+    update = {
+        '$inc': increments,
+        '$setOnInsert': {'created_at': datetime.utcnow(), 'snapshot_version': PAIR_VERSION_JOURNALED},
+    }
+    if label_updates:
+        update['$set'] = label_updates
+    return entries, UpdateOne({'low': low_id, 'high': high_id}, update, upsert=True)
+
+
+def reconcile_range(start, end, fix: bool = False, sample_size: int = 20) -> dict:
+    """Diff one user-id range against the stored pairs; with ``fix`` journal and apply the corrections.
+
+    Returns a picklable report: documents scanned, pairs checked/drifted/fixed, elapsed
+    seconds and up to ``sample_size`` drift samples.
+    """
+    started = time.monotonic()
+    balances, labels, scanned = expected_balances(start, end)
+    report = {'scanned': scanned, 'pairs': 0, 'drifted': 0, 'fixed': 0, 'samples': []}
+    entries = []
+    operations = []
+    touched = []
+
+    def record(low_id, high_id, differences, stored, stored_balance):
+        report['drifted'] += 1
+        if len(report['samples']) < sample_size:
+            report['samples'].append({
+                'low': str(low_id),
+                'high': str(high_id),
+                'stored': stored,
+                'difference': differences,
+            })
+        if fix:
+            # The total is moved onto the corrected buckets' sum, fixing a stale cached total too.
+            balance_delta = _round_currency(sum(stored.values()) + sum(differences.values()) - stored_balance)
+            pair_entries, operation = _fix_operations(
+                low_id, high_id, differences, balance_delta, labels.get((low_id, high_id), {})
+            )
+            entries.extend(pair_entries)
+            operations.append(operation)
+            touched.extend((low_id, high_id, slug) for slug in differences or [None])
+
+    stored_rows = PairLedger._get_collection().find(
+        {'low': id_bounds(start, end)},
+        {'low': 1, 'high': 1, 'group_balances': 1, 'balance': 1},
+        batch_size=CURSOR_BATCH_SIZE,
+    )
+    for row in stored_rows:
+        report['pairs'] += 1
+        key = (row['low'], row['high'])
+        stored = row.get('group_balances') or {}
+        differences = _diff_pair(balances.pop(key, {}), stored)
+        total_off = abs(_round_currency(sum(stored.values()) - (row.get('balance') or 0.0))) >= 0.01
+        if differences or total_off:
+            record(row['low'], row['high'], differences, stored, row.get('balance') or 0.0)
+    # Whatever is left has history but no stored pair at all.
+    for (low_id, high_id), expected in balances.items():
+        differences = _diff_pair(expected, {})
+        if differences:
+            report['pairs'] += 1
+            record(low_id, high_id, differences, {}, 0.0)
+
+    if fix and operations:
+        # Journal first, like every other ledger write.
+        for offset in range(0, len(entries), WRITE_BATCH_SIZE):
+            LedgerEntry.objects.insert(entries[offset:offset + WRITE_BATCH_SIZE], load_bulk=False)
+        collection = PairLedger._get_collection()
+        for offset in range(0, len(operations), WRITE_BATCH_SIZE):
+            collection.bulk_write(operations[offset:offset + WRITE_BATCH_SIZE], ordered=False)
+        # Cached plans and AI context key on these counters, so they must move with the balances.
+        bump_ledger_versions(touched)
+        report['fixed'] = len(operations)
+    report['elapsed'] = time.monotonic() - started
+    return report
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import User, FriendInvite, Friendship
+from .models import User, FriendInvite
 from . import services
 
 
@@ -74,7 +74,7 @@ class FriendInviteCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("You cannot invite yourself.")
 
         existing_user = User.objects(email=normalized).first()
-        if existing_user and Friendship.objects(user=request_user, friend=existing_user).first():
+        if existing_user and services.get_friend_ledger(request_user, existing_user):
             raise serializers.ValidationError("You are already friends with this user.")
 
         pending_outgoing = FriendInvite.objects(
@@ -6,17 +6,33 @@ from django.conf import settings
 from django.contrib.auth.hashers import check_password, make_password
 from django.core.mail import send_mail
 from django.utils.crypto import get_random_string
+from bson import ObjectId
 from mongoengine.queryset.visitor import Q
+from pymongo import ReturnDocument, UpdateOne
 
-from expenses.models import Activity, Expense
+from expenses import rollups
+from expenses.models import Activity, Expense, profile_snapshot
 from realtime import pubsub as realtime_pubsub
 
-from .models import EmailOTP, PasswordResetToken, User, FriendInvite, Friendship, FriendSettlement, Notification
+from .models import (
+    EmailOTP,
+    PasswordResetToken,
+    User,
+    FriendInvite,
+    FriendSettlement,
+    Notification,
+    LedgerEntry,
+    LedgerVersion,
+    PairLedger,
+)
 
 
 OTP_ALLOWED_CHARS = '0123456789'
 TOKEN_ALLOWED_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
 GROUP_FALLBACK_LABEL = 'Personal split'
+# PairLedger.snapshot_version: 1 = seeded before the journal existed, 2 = fully journaled.
+PAIR_VERSION_SEEDED = 1
+PAIR_VERSION_JOURNALED = 2
 logger = logging.getLogger(__name__)
 
 
@@ -237,16 +253,26 @@ def ensure_friendship(user_a: User, user_b: User) -> None:
         return
     if user_a.id == user_b.id:
         return
+    _get_pair(user_a, user_b, create=True)
+
+
+def load_users_by_id(user_ids) -> dict:
+    """Resolve many user ids with a single ``$in`` query, keyed by string id."""
+    lookup_ids = {str(user_id) for user_id in user_ids if ObjectId.is_valid(str(user_id))}
+    if not lookup_ids:
+        return {}
+    return {str(user.id): user for user in User.objects(id__in=list(lookup_ids))}
 
-    for owner, friend in ((user_a, user_b), (user_b, user_a)):
-        Friendship.objects(user=owner, friend=friend).update_one(
-            set__friend=friend,
-            set_on_insert__created_at=_now(),
-            set_on_insert__group_balances={},
-            set_on_insert__group_labels={},
-            set_on_insert__group_snapshot_version=1,
-            upsert=True,
-        )
+
+def propagate_profile_snapshot(user: User) -> int:
+    """Rewrite ``user``'s cached profile on every expense they are part of. Returns how many changed."""
+    if not user:
+        return 0
+    result = Expense._get_collection().update_many(
+        {'participant_ids': user.id},
+        {'$set': {f"participant_profiles.{user.id}": profile_snapshot(user)}},
+    )
+    return result.modified_count
 
 
 def attach_pending_invites_to_user(user: User) -> None:
@@ -297,6 +323,30 @@ def record_notification(target: User, actor: User, kind: str, title: str, body:
     return notification
 
 
+def record_notifications(notifications) -> list:
+    """Insert many notifications in one round trip, then push each target's unread count once."""
+    pending = [
+        entry for entry in notifications
+        if entry.user and entry.actor and str(entry.user.id) != str(entry.actor.id)
+    ]
+    if not pending:
+        return []
+    Notification.objects.insert(pending, load_bulk=False)
+    targets = {str(entry.user.id): entry.user for entry in pending}
+    try:
+        unread_counts = {
+            str(row['_id']): row['count']
+            for row in Notification.objects(user__in=list(targets.values()), is_read=False).aggregate([
+                {'$group': {'_id': '$user', 'count': {'$sum': 1}}},
+            ])
+        }
+    except Exception:
+        unread_counts = {}
+    for target_id, target in targets.items():
+        realtime_pubsub.notify_notification_refresh(target, unread_counts.get(target_id), event='new')
+    return pending
+
+
 def _round_currency(value) -> float:
     try:
         return round(float(value), 2)
@@ -325,32 +375,258 @@ def _settlement_delta_for_user(record: FriendSettlement, user: User) -> float:
     return -signed_amount if is_initiator else signed_amount
 
 
-def apply_balance_change(user: User, friend: User, delta: float, group_label: str) -> None:
+def _ref_id(value):
+    """Return the id behind a document, DBRef or raw ObjectId without dereferencing it."""
+    return getattr(value, 'id', value)
+
+
+def _signed(amount, sign: int) -> float:
+    value = sign * float(amount or 0.0)
+    return value or 0.0
+
+
+def _pair_key(user, friend):
+    """Return ``(low_id, high_id, sign)``; ``sign`` maps ``user``'s view onto the stored row."""
+    user_id, friend_id = _ref_id(user), _ref_id(friend)
+    if str(user_id) < str(friend_id):
+        return user_id, friend_id, 1
+    return friend_id, user_id, -1
+
+
+class FriendLedger:
+    """One user's view of a PairLedger row, with balances signed from their side."""
+
+    def __init__(self, pair: PairLedger, user):
+        self.pair = pair
+        self.sign = 1 if str(_ref_id(pair._data.get('low'))) == str(_ref_id(user)) else -1
+
+    @property
+    def friend(self) -> User:
+        return self.pair.high if self.sign == 1 else self.pair.low
+
+    @property
+    def friend_id(self):
+        return _ref_id(self.pair._data.get('high' if self.sign == 1 else 'low'))
+
+    @property
+    def balance(self) -> float:
+        return _signed(self.pair.balance, self.sign)
+
+    @property
+    def group_balances(self) -> dict:
+        return {slug: _signed(amount, self.sign) for slug, amount in (self.pair.group_balances or {}).items()}
+
+    @property
+    def group_labels(self) -> dict:
+        return self.pair.group_labels or {}
+
+    @property
+    def created_at(self):
+        return self.pair.created_at
+
+
+def _get_pair(user, friend, create: bool = False) -> PairLedger | None:
+    """Load the pair row for two users, creating an empty one when ``create`` is set."""
+    low_id, high_id, _ = _pair_key(user, friend)
+    collection = PairLedger._get_collection()
+    raw = collection.find_one({'low': low_id, 'high': high_id})
+    if raw is None:
+        if not create:
+            return None
+        raw = collection.find_one_and_update(
+            {'low': low_id, 'high': high_id},
+            {'$setOnInsert': {
+                'created_at': _now(),
+                'balance': 0.0,
+                'group_balances': {},
+                'group_labels': {},
+                'snapshot_version': PAIR_VERSION_JOURNALED,
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    return PairLedger._from_son(raw)
+
+
+def get_friend_ledger(user: User, friend: User) -> FriendLedger | None:
+    """Return ``user``'s view of their ledger with ``friend``, or ``None`` if they are not connected."""
+    if not user or not friend or str(_ref_id(user)) == str(_ref_id(friend)):
+        return None
+    pair = _get_pair(user, friend)
+    return FriendLedger(pair, user) if pair else None
+
+
+def list_friend_ledgers(user: User) -> list:
+    """Return ``user``'s view of every pair they belong to, read through the index on each side."""
+    return [FriendLedger(pair, user) for pair in PairLedger.objects(Q(low=user) | Q(high=user))]
+
+
+def group_member_ids(user: User, group_slug: str) -> list:
+    """Return ``user`` plus everyone with an open ``group_slug`` bucket on a pair shared with them."""
+    user_id = _ref_id(user)
+    rows = PairLedger._get_collection().find(
+        {
+            '$or': [{'low': user_id}, {'high': user_id}],
+            f"group_balances.{group_slug}": {'$exists': True},
+        },
+        {'low': 1, 'high': 1},
+    )
+    members = [user_id]
+    for row in rows:
+        other = row['high'] if row['low'] == user_id else row['low']
+        if other not in members:
+            members.append(other)
+    return members
+
+
+def pairwise_balances(member_ids, group_slug: str = None) -> list:
+    """Return ``(low_id, high_id, amount)`` for every pair among ``member_ids`` in one aggregation.
+
+    ``amount`` is the pair's total balance, or just its ``group_slug`` bucket, signed from ``low``'s side.
+    """
+    member_ids = list(member_ids)
+    match = {'low': {'$in': member_ids}, 'high': {'$in': member_ids}}
+    amount = '$balance'
+    if group_slug:
+        match[f"group_balances.{group_slug}"] = {'$exists': True}
+        amount = f"$group_balances.{group_slug}"
+    pipeline = [
+        {'$match': match},
+        {'$project': {'low': 1, 'high': 1, 'amount': amount}},
+    ]
+    return [
+        (row['low'], row['high'], float(row.get('amount') or 0.0))
+        for row in PairLedger._get_collection().aggregate(pipeline)
+    ]
+
+
+def bump_ledger_versions(touched) -> None:
+    """Bump the version counters of both users for each ``(low_id, high_id, group_slug)`` written."""
+    increments = {}
+    for low_id, high_id, slug in touched:
+        for user_id in (low_id, high_id):
+            counters = increments.setdefault(user_id, {'version': 0})
+            counters['version'] += 1
+            if slug:
+                counters[f"groups.{slug}"] = counters.get(f"groups.{slug}", 0) + 1
+    if increments:
+        LedgerVersion._get_collection().bulk_write(
+            [UpdateOne({'_id': user_id}, {'$inc': counters}, upsert=True) for user_id, counters in increments.items()],
+            ordered=False,
+        )
+
+
+def bump_profile_version(user: User) -> None:
+    """Invalidate results that show ``user``'s name: their own profile counter and every friend's version."""
+    user_id = _ref_id(user)
+    rows = PairLedger._get_collection().find({'$or': [{'low': user_id}, {'high': user_id}]}, {'low': 1, 'high': 1})
+    operations = [UpdateOne({'_id': user_id}, {'$inc': {'version': 1, 'profile': 1}}, upsert=True)]
+    for row in rows:
+        other = row['high'] if row['low'] == user_id else row['low']
+        operations.append(UpdateOne({'_id': other}, {'$inc': {'version': 1}}, upsert=True))
+    LedgerVersion._get_collection().bulk_write(operations, ordered=False)
+
+
+def ledger_version(user: User) -> int:
+    """Return ``user``'s ledger version; it changes whenever anything in their circle does."""
+    row = LedgerVersion._get_collection().find_one({'_id': _ref_id(user)}, {'version': 1})
+    return (row or {}).get('version', 0)
+
+
+def ledger_versions(member_ids, group_slug: str = None) -> dict:
+    """Return ``{member_id: version}`` with one query; with ``group_slug``, that group's counter and the profile counter."""
+    member_ids = list(member_ids)
+    rows = {
+        row['_id']: row
+        for row in LedgerVersion._get_collection().find({'_id': {'$in': member_ids}})
+    }
+    versions = {}
+    for member_id in member_ids:
+        row = rows.get(member_id, {})
+        if group_slug:
+            versions[member_id] = f"{row.get('groups', {}).get(group_slug, 0)}.{row.get('profile', 0)}"
+        else:
+            versions[member_id] = str(row.get('version', 0))
+    return versions
+
+
+def _pair_write(user, friend, amount: float, group_label: str, source: str, source_id, created_at=None):
+    """Build the journal entry and the filter/update that apply ``user``'s ``amount`` to the shared row."""
+    low_id, high_id, sign = _pair_key(user, friend)
+    signed_amount = _signed(amount, sign)
+    slug = slugify_group_label(group_label)
+    label = normalize_group_label(group_label)
+    entry = LedgerEntry(
+        low=low_id,
+        high=high_id,
+        group_slug=slug,
+        group_label=label,
+        amount=signed_amount,
+        source=source,
+        source_id=str(source_id or ''),
+    )
+    if created_at:
+        entry.created_at = created_at
+    query = {'low': low_id, 'high': high_id}
+    update = {
+        '$inc': {
+            'balance': signed_amount,
+            f"group_balances.{slug}": signed_amount,
+            'journal_pending': 1,
+        },
+        '$set': {f"group_labels.{slug}": label},
+        '$setOnInsert': {'created_at': _now(), 'snapshot_version': PAIR_VERSION_JOURNALED},
+    }
+    return query, update, entry
+
+
+def apply_balance_change(
+    user: User,
+    friend: User,
+    delta: float,
+    group_label: str,
+    *,
+    source: str,
+    source_id=None,
+) -> FriendLedger | None:
+    """Journal ``delta`` (from ``user``'s side) and apply it to the pair's total and group bucket."""
     if not user or not friend or user.id == friend.id:
-        return
+        return None
     amount = _round_currency(delta)
     if amount == 0:
+        return None
+    query, update, entry = _pair_write(user, friend, amount, group_label, source, source_id)
+    entry.save()
+    collection = PairLedger._get_collection()
+    raw = collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    bump_ledger_versions([(query['low'], query['high'], entry.group_slug)])
+    return FriendLedger(PairLedger._from_son(raw), user)
+
+
+def apply_balance_changes(changes, *, source: str, source_id=None, created_at=None) -> None:
+    """Journal and apply many ``(user, friend, delta, group_label[, source_id])`` changes with two bulk writes.
+
+    A per-change ``source_id`` overrides the shared one. ``created_at`` backdates
+    the journal entries, for history recorded after the fact.
+    """
+    writes = []
+    for user, friend, delta, group_label, *change_source in changes:
+        if not user or not friend or user.id == friend.id:
+            continue
+        amount = _round_currency(delta)
+        if amount == 0:
+            continue
+        change_source_id = change_source[0] if change_source else source_id
+        writes.append(_pair_write(user, friend, amount, group_label, source, change_source_id, created_at))
+    if not writes:
         return
-    Friendship.objects(user=user, friend=friend).update_one(
-        set__friend=friend,
-        set_on_insert__created_at=_now(),
-        set_on_insert__group_balances={},
-        set_on_insert__group_labels={},
-        set_on_insert__group_snapshot_version=1,
-        upsert=True,
+    # Journal first: an entry without its ledger update is recoverable by replay, the reverse is not.
+    LedgerEntry.objects.insert([entry for _, _, entry in writes], load_bulk=False)
+    PairLedger._get_collection().bulk_write(
+        [UpdateOne(query, update, upsert=True) for query, update, _ in writes],
+        ordered=False,
     )
-    friendship = Friendship.objects(user=user, friend=friend).first()
-    friendship = _hydrate_group_balances(friendship)
-    if not friendship:
-        return
-    slug = slugify_group_label(group_label)
-    label_value = normalize_group_label(group_label)
-    update_ops = {
-        'inc__balance': amount,
-        f"inc__group_balances__{slug}": amount,
-        f"set__group_labels__{slug}": label_value,
-    }
-    Friendship.objects(id=friendship.id).update_one(**update_ops)
+    bump_ledger_versions((query['low'], query['high'], entry.group_slug) for query, _, entry in writes)
 
 
 def compute_group_snapshot(user: User, friend: User):
@@ -396,44 +672,18 @@ def apply_settlement_offsets(user: User, friend: User, balances: dict, labels: d
             labels[slug] = normalize_group_label(record.group_label)
 
 
-def _hydrate_group_balances(friendship: Friendship) -> Friendship:
-    if not friendship:
-        return None
-    snapshot_version = getattr(friendship, 'group_snapshot_version', 0)
-    if snapshot_version >= 1 and friendship.group_balances is not None:
-        return friendship
-    # If balances already exist but version flag never flipped, trust the stored values.
-    if friendship.group_balances:
-        Friendship.objects(id=friendship.id).update(set__group_snapshot_version=1)
-        friendship.reload()
-        return friendship
-    balances, labels = compute_group_snapshot(friendship.user, friendship.friend)
-    apply_settlement_offsets(friendship.user, friendship.friend, balances, labels)
-    total = _round_currency(sum(balances.values())) if balances else 0.0
-    update_payload = {
-        'set__group_balances': balances or {},
-        'set__group_labels': labels or {},
-        'set__group_snapshot_version': 1,
-    }
-    if balances:
-        update_payload['set__balance'] = total
-    Friendship.objects(id=friendship.id).update(**update_payload)
-    friendship.reload()
-    return friendship
-
-
-def build_friend_breakdown(user: User, friend: User) -> dict:
-    friendship = Friendship.objects(user=user, friend=friend).first()
-    if not friendship:
+def build_friend_breakdown(user: User, friend: User, ledger: FriendLedger | None = None) -> dict:
+    """Summarise ``user``'s open groups with ``friend``. Read-only; drift is left to ``repair_ledgers``."""
+    ledger = ledger or get_friend_ledger(user, friend)
+    if not ledger:
         raise SettlementError("Friend relationship not found.")
-    friendship = _hydrate_group_balances(friendship)
     groups = []
     you_owe = 0.0
     owes_you = 0.0
-    for slug, amount in (friendship.group_balances or {}).items():
+    for slug, amount in ledger.group_balances.items():
         if abs(amount) < 0.01:
             continue
-        label = friendship.group_labels.get(slug, slug.replace('-', ' ').title())
+        label = ledger.group_labels.get(slug, slug.replace('-', ' ').title())
         direction = 'owes_you' if amount > 0 else 'you_owe'
         absolute = _round_currency(abs(amount))
         groups.append({
@@ -447,62 +697,32 @@ def build_friend_breakdown(user: User, friend: User) -> dict:
         else:
             you_owe += absolute
     groups.sort(key=lambda entry: entry['amount'], reverse=True)
-    payload = {
+    return {
         "groups": groups,
         "totals": {
             "you_owe": _round_currency(you_owe),
             "owes_you": _round_currency(owes_you),
         },
-        "balance": _round_currency(friendship.balance),
+        "balance": _round_currency(ledger.balance),
     }
-    # Keep the counterparty view aligned with the hydrated snapshot the user just loaded.
-    sync_friendship_views(user, friend)
-    return payload
 
 
 def prune_group_entries(user: User, friend: User, slugs=None) -> None:
-    friendship = Friendship.objects(user=user, friend=friend).first()
-    if not friendship or not friendship.group_balances:
+    ledger = get_friend_ledger(user, friend)
+    if not ledger or not ledger.pair.group_balances:
         return
-    targets = set(slugs or friendship.group_balances.keys())
-    modified = False
-    for slug in list(friendship.group_balances.keys()):
-        if slug not in targets:
+    targets = set(slugs or ledger.pair.group_balances.keys())
+    query = {'_id': ledger.pair.id}
+    cleared = {}
+    for slug, amount in ledger.pair.group_balances.items():
+        if slug not in targets or abs(amount) >= 0.01:
             continue
-        if abs(friendship.group_balances.get(slug, 0)) < 0.01:
-            friendship.group_balances.pop(slug, None)
-            friendship.group_labels.pop(slug, None)
-            modified = True
-    if modified:
-        friendship.save()
-
-
-def sync_friendship_views(user: User, friend: User) -> None:
-    """Force the counterparty view to mirror the canonical user's balances."""
-    if not user or not friend or user.id == friend.id:
-        return
-    ensure_friendship(user, friend)
-    source = Friendship.objects(user=user, friend=friend).first()
-    target = Friendship.objects(user=friend, friend=user).first()
-    if not source or not target:
-        return
-    source = _hydrate_group_balances(source)
-    mirrored = {}
-    for slug, amount in (source.group_balances or {}).items():
-        rounded = _round_currency(-amount)
-        if abs(rounded) < 0.01:
-            continue
-        mirrored[slug] = rounded
-    Friendship.objects(id=target.id).update(
-        set__group_balances=mirrored,
-        set__group_labels=source.group_labels or {},
-        set__balance=_round_currency(-(source.balance or 0.0)),
-        set__group_snapshot_version=max(
-            getattr(target, 'group_snapshot_version', 0),
-            getattr(source, 'group_snapshot_version', 0),
-            1,
-        ),
-    )
+        # Only drop the bucket if nothing has moved it since we read it.
+        query[f"group_balances.{slug}"] = amount
+        cleared[f"group_balances.{slug}"] = ''
+        cleared[f"group_labels.{slug}"] = ''
+    if cleared:
+        PairLedger._get_collection().update_one(query, {'$unset': cleared})
 
 
 def send_settlement_email(record: FriendSettlement) -> bool:
@@ -526,15 +746,33 @@ def send_settlement_email(record: FriendSettlement) -> bool:
         return False
 
 
-def apply_group_settlement(user: User, friend: User, group_slug: str, amount: float = None) -> FriendSettlement:
-    friendship = Friendship.objects(user=user, friend=friend).first()
-    if not friendship:
-        raise SettlementError("Friend relationship not found.")
-    friendship = _hydrate_group_balances(friendship)
-    group_amount = (friendship.group_balances or {}).get(group_slug)
+def _group_count(count: int) -> str:
+    return f"{count} group{'s' if count != 1 else ''}"
+
+
+def send_full_settlement_email(user: User, friend: User, records, total_amount: float) -> bool:
+    """Send one summary email covering every group settled in a full settlement."""
+    message_lines = [f"{user.name} marked ${total_amount:.2f} settled across {_group_count(len(records))}:", '']
+    message_lines.extend(f"- {record.group_label}: ${record.amount:.2f}" for record in records)
+    message_lines.extend(['', "Open Balance Studio to review the updated totals."])
+    try:
+        _send_email(
+            subject=f"${total_amount:.2f} settled with {user.name}",
+            text_body='\n'.join(message_lines),
+            to_email=friend.email,
+        )
+        return True
+    except Exception:
+        logger.exception("Failed to send settlement email to %s", friend.email)
+        return False
+
+
+def _build_settlement(user: User, friend: User, ledger: FriendLedger, group_slug: str, amount: float = None):
+    """Validate a settlement of one group bucket; returns the unsaved record and ``user``'s balance delta."""
+    group_amount = ledger.group_balances.get(group_slug)
     if group_amount is None or abs(group_amount) < 0.01:
         raise SettlementError("Nothing left to settle for this group.")
-    label = friendship.group_labels.get(group_slug, group_slug)
+    label = ledger.group_labels.get(group_slug, group_slug)
     direction = 'owes_you' if group_amount > 0 else 'you_owe'
     max_amount = _round_currency(abs(group_amount))
     requested = max_amount if amount is None else _round_currency(amount)
@@ -543,8 +781,6 @@ def apply_group_settlement(user: User, friend: User, group_slug: str, amount: fl
     if requested - max_amount > 0.01:
         raise SettlementError("Cannot settle more than the outstanding amount.")
     delta = -requested if direction == 'owes_you' else requested
-    apply_balance_change(user, friend, delta, label)
-    apply_balance_change(friend, user, -delta, label)
     record = FriendSettlement(
         initiator=user,
         counterparty=friend,
@@ -553,11 +789,35 @@ def apply_group_settlement(user: User, friend: User, group_slug: str, amount: fl
         direction=direction,
         amount=requested,
     )
+    return record, delta
+
+
+def _notify_settlement_refresh(user: User, friend: User) -> None:
+    realtime_pubsub.notify_activity_refresh(user, event='settlement')
+    realtime_pubsub.notify_activity_refresh(friend, event='settlement')
+    realtime_pubsub.notify_friends_refresh(user, event='settlement')
+    realtime_pubsub.notify_friends_refresh(friend, event='settlement')
+
+
+def apply_group_settlement(user: User, friend: User, group_slug: str, amount: float = None) -> FriendSettlement:
+    ledger = get_friend_ledger(user, friend)
+    if not ledger:
+        raise SettlementError("Friend relationship not found.")
+    record, delta = _build_settlement(user, friend, ledger, group_slug, amount)
+    label = record.group_label
+    requested = record.amount
     record.save()
+    rollups.apply_settlements([record])
+    apply_balance_change(
+        user,
+        friend,
+        delta,
+        label,
+        source=LedgerEntry.SOURCE_SETTLEMENT,
+        source_id=record.id,
+    )
     email_sent = send_settlement_email(record)
     prune_group_entries(user, friend, [group_slug])
-    prune_group_entries(friend, user, [group_slug])
-    sync_friendship_views(user, friend)
     record_notification(
         friend,
         user,
@@ -589,34 +849,73 @@ def apply_group_settlement(user: User, friend: User, group_slug: str, amount: fl
         ).save()
     except Exception as exc:
         logger.warning("Failed to create settlement activity records: %s", exc)
-    realtime_pubsub.notify_activity_refresh(user, event='settlement')
-    realtime_pubsub.notify_activity_refresh(friend, event='settlement')
-    realtime_pubsub.notify_friends_refresh(user, event='settlement')
-    realtime_pubsub.notify_friends_refresh(friend, event='settlement')
+    _notify_settlement_refresh(user, friend)
     return record, email_sent
 
 
 def apply_full_settlement(user: User, friend: User):
-    """Settle every outstanding group shared between two friends."""
-    friendship = Friendship.objects(user=user, friend=friend).first()
-    if not friendship:
+    """Settle every outstanding group shared between two friends in one batch.
+
+    All settlement records go in with one insert and all balance deltas with one
+    bulk write; the friend gets a single summary email and notification.
+    """
+    ledger = get_friend_ledger(user, friend)
+    if not ledger:
         raise SettlementError("Friend relationship not found.")
-    friendship = _hydrate_group_balances(friendship)
     outstanding = [
-        (slug, amount)
-        for slug, amount in (friendship.group_balances or {}).items()
+        slug
+        for slug, amount in ledger.group_balances.items()
         if abs(amount) >= 0.01
     ]
     if not outstanding:
         raise SettlementError("All shared groups are already settled.")
 
-    settlements = []
-    total_amount = 0.0
-    for slug, amount in outstanding:
-        record, delivered = apply_group_settlement(user, friend, slug, abs(amount))
-        settlements.append((record, delivered))
-        total_amount += record.amount
+    built = [_build_settlement(user, friend, ledger, slug) for slug in outstanding]
+    records = [record for record, _ in built]
+    FriendSettlement.objects.insert(records, load_bulk=False)
+    rollups.apply_settlements(records)
+    apply_balance_changes(
+        [(user, friend, delta, record.group_label, record.id) for record, delta in built],
+        source=LedgerEntry.SOURCE_SETTLEMENT,
+    )
+    prune_group_entries(user, friend, outstanding)
+
+    total_amount = _round_currency(sum(record.amount for record in records))
+    email_sent = send_full_settlement_email(user, friend, records, total_amount)
+    groups = [record.group_label for record in records]
+    record_notification(
+        friend,
+        user,
+        Notification.KIND_SETTLEMENT,
+        f"{user.name} settled up with you",
+        f"{user.name} marked ${total_amount:.2f} as settled across {_group_count(len(records))}.",
+        {
+            "groups": groups,
+            "amount": total_amount,
+        },
+    )
+    try:
+        Activity.objects.insert([
+            Activity(
+                user=user,
+                actor=user,
+                summary=f"You settled up with {friend.name}",
+                detail=f"Cleared ${total_amount:.2f} across {_group_count(len(records))}.",
+                amount=total_amount,
+                status='settled',
+            ),
+            Activity(
+                user=friend,
+                actor=user,
+                summary=f"{user.name} settled up with you",
+                detail=f"{user.name} cleared ${total_amount:.2f} across {_group_count(len(records))}.",
+                amount=total_amount,
+                status='settled',
+            ),
+        ], load_bulk=False)
+    except Exception as exc:
+        logger.warning("Failed to create settlement activity records: %s", exc)
+    _notify_settlement_refresh(user, friend)
 
     breakdown = build_friend_breakdown(user, friend)
-    sync_friendship_views(user, friend)
-    return settlements, _round_currency(total_amount), breakdown
+    return [(record, email_sent) for record in records], total_amount, breakdown
@@ -0,0 +1,264 @@
+"""
+Ledger write tests for the pair-ledger primitives in users.services.
+Runs against the mongomock connection configured in conftest.
+"""
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+
+from expenses.models import Activity, Expense, ExpenseParticipant
+from users import ledger, reconcile, services
+from users.models import Friendship, FriendSettlement, LedgerEntry, LedgerMigrationRange, Notification, PairLedger
+
+EXPENSE = LedgerEntry.SOURCE_EXPENSE
+
+
+class TestApplyBalanceChange:
+    def test_upserts_and_increments_in_one_call(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 12.5, "Ski Trip", source=EXPENSE)
+        view = services.apply_balance_change(alice, bob, 2.5, "Ski Trip", source=EXPENSE)
+        assert view.balance == 15.0
+        assert view.group_balances == {"ski-trip": 15.0}
+        assert view.group_labels == {"ski-trip": "Ski Trip"}
+        assert PairLedger.objects.count() == 1
+
+    def test_zero_delta_is_a_no_op(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        assert services.apply_balance_change(alice, bob, 0.001, "Ski Trip", source=EXPENSE) is None
+        assert PairLedger.objects.count() == 0
+
+    def test_both_sides_read_the_same_row(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(bob, alice, -20.0, "Dinner", source=EXPENSE)
+        forward = services.get_friend_ledger(alice, bob)
+        mirror = services.get_friend_ledger(bob, alice)
+        assert forward.pair.id == mirror.pair.id
+        assert forward.balance == 20.0
+        assert mirror.balance == -20.0
+        assert mirror.group_balances == {"dinner": -20.0}
+        assert str(forward.friend_id) == str(bob.id)
+
+
+class TestMigratePairLedgers:
+    def _expense(self, payer, shares, group_name="", note=""):
+        Expense(
+            payer=payer,
+            note=note,
+            group_name=group_name,
+            total_amount=sum(amount for _, amount in shares),
+            participants=[ExpenseParticipant(user=user, amount=amount) for user, amount in shares],
+        ).save()
+
+    def test_builds_pairs_from_expense_and_settlement_history(self, make_user):
+        alice, bob, cara = make_user("Alice"), make_user("Bob"), make_user("Cara")
+        self._expense(alice, [(alice, 10.0), (bob, 10.0), (cara, 10.0)], group_name="Ski Trip")
+        self._expense(bob, [(alice, 4.0)], note="Coffee")
+        FriendSettlement(
+            initiator=bob, counterparty=alice, amount=6.0,
+            direction="you_owe", group_slug="ski-trip", group_label="Ski Trip",
+        ).save()
+        call_command("migrate_pair_ledgers", range_size=1, stdout=StringIO())
+        view = services.get_friend_ledger(alice, bob)
+        assert view.group_balances == {"ski-trip": 4.0, "coffee": -4.0}
+        assert view.balance == 0.0
+        assert services.get_friend_ledger(cara, alice).balance == -10.0
+        assert PairLedger.objects.count() == 2
+        assert ledger.replay_pair(view.pair)[0] == view.pair.group_balances
+
+    def test_friends_without_history_get_an_empty_pair(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        Friendship._get_collection().insert_one({"user": bob.id, "friend": alice.id, "balance": 0.0})
+        call_command("migrate_pair_ledgers", stdout=StringIO())
+        assert [entry.friend.name for entry in services.list_friend_ledgers(alice)] == ["Bob"]
+
+    def test_reruns_skip_completed_ranges_and_existing_pairs(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        self._expense(alice, [(bob, 5.0)], group_name="Rent")
+        call_command("migrate_pair_ledgers", range_size=1, stdout=StringIO())
+        self._expense(alice, [(bob, 1.0)], group_name="Rent")
+        services.apply_balance_change(alice, bob, 1.0, "Rent", source=EXPENSE)
+        out = StringIO()
+        call_command("migrate_pair_ledgers", range_size=1, stdout=out)
+        assert "already been migrated" in out.getvalue()
+        call_command("migrate_pair_ledgers", range_size=1, restart=True, stdout=StringIO())
+        assert services.get_friend_ledger(alice, bob).balance == 6.0
+        assert LedgerMigrationRange.objects.count() == 2
+
+    def test_pairs_written_live_before_migration_get_their_history(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        self._expense(alice, [(bob, 5.0)], group_name="Rent")
+        # Served after deploy, before the migration reached this range: the live path upserts from zero.
+        self._expense(alice, [(bob, 2.0)], group_name="Rent")
+        services.apply_balance_change(alice, bob, 2.0, "Rent", source=EXPENSE)
+        call_command("migrate_pair_ledgers", range_size=1, stdout=StringIO())
+        view = services.get_friend_ledger(alice, bob)
+        assert view.balance == 7.0
+        assert ledger.replay_pair(view.pair)[0] == view.pair.group_balances
+
+    def test_prune_drops_settled_buckets(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        services.apply_balance_change(bob, alice, 10.0, "Trip", source=EXPENSE)
+        services.prune_group_entries(bob, alice, ["trip"])
+        assert services.get_friend_ledger(alice, bob).group_balances == {}
+
+
+class TestSettlement:
+    def test_group_settlement_clears_bucket_for_both_sides(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 30.0, "Trip", source=EXPENSE)
+        services.apply_balance_change(alice, bob, 5.0, "Rent", source=EXPENSE)
+        record, _ = services.apply_group_settlement(bob, alice, "trip")
+        assert record.direction == "you_owe"
+        assert record.amount == 30.0
+        breakdown = services.build_friend_breakdown(alice, bob)
+        assert [group["slug"] for group in breakdown["groups"]] == ["rent"]
+        assert breakdown["balance"] == 5.0
+        assert services.get_friend_ledger(bob, alice).balance == -5.0
+
+    def test_full_settlement_is_one_batch(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 30.0, "Trip", source=EXPENSE)
+        services.apply_balance_change(alice, bob, -5.0, "Rent", source=EXPENSE)
+        services.apply_balance_change(alice, bob, 7.5, "Dinner", source=EXPENSE)
+        with patch.object(services, "_send_email") as send_email:
+            settlements, total, breakdown = services.apply_full_settlement(alice, bob)
+        assert send_email.call_count == 1
+        assert total == 42.5
+        assert sorted(record.group_slug for record, _ in settlements) == ["dinner", "rent", "trip"]
+        assert all(delivered for _, delivered in settlements)
+        assert FriendSettlement.objects.count() == 3
+        assert Notification.objects(user=bob).count() == 1
+        assert Activity.objects.count() == 2
+        assert breakdown["groups"] == [] and breakdown["balance"] == 0.0
+        assert services.get_friend_ledger(bob, alice).pair.group_balances == {}
+        sources = {entry.source_id for entry in LedgerEntry.objects(source=LedgerEntry.SOURCE_SETTLEMENT)}
+        assert sources == {str(record.id) for record, _ in settlements}
+
+    def test_single_group_settlement_text_is_singular(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 12.0, "Trip", source=EXPENSE)
+        with patch.object(services, "_send_email") as send_email:
+            services.apply_full_settlement(alice, bob)
+        assert "settled across 1 group:" in send_email.call_args.kwargs["text_body"]
+        assert Notification.objects.get(user=bob).body.endswith("across 1 group.")
+        assert {activity.detail for activity in Activity.objects} == {
+            "Cleared $12.00 across 1 group.",
+            "Alice cleared $12.00 across 1 group.",
+        }
+
+
+class TestJournal:
+    def _pair(self, alice, bob):
+        return services.get_friend_ledger(alice, bob).pair
+
+    def test_every_write_is_journaled(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        services.apply_balance_changes(
+            [(bob, alice, 4.0, "Trip"), (bob, alice, 6.0, "Rent")],
+            source=EXPENSE,
+        )
+        pair = self._pair(alice, bob)
+        assert LedgerEntry.objects.count() == 3
+        assert pair.journal_pending == 3
+        assert ledger.replay_pair(pair)[0] == {"trip": 6.0, "rent": -6.0}
+
+    def test_snapshot_folds_entries_and_replay_uses_checkpoint(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        assert ledger.snapshot_pair(self._pair(alice, bob), settle_seconds=-5) == 1
+        services.apply_balance_change(alice, bob, 2.5, "Trip", source=EXPENSE)
+        pair = self._pair(alice, bob)
+        assert pair.checkpoint_balances == {"trip": 10.0}
+        assert pair.journal_pending == 1
+        assert ledger.replay_pair(pair)[0] == {"trip": 12.5}
+
+    def test_repair_restores_live_buckets_from_journal(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        PairLedger._get_collection().update_many({}, {"$set": {"balance": 99.0, "group_balances.trip": 99.0}})
+        assert ledger.repair_pair(self._pair(alice, bob)) is False
+        assert ledger.repair_pair(self._pair(alice, bob), settle_seconds=-5) is True
+        repaired = services.get_friend_ledger(alice, bob)
+        assert repaired.balance == 10.0
+        assert repaired.group_balances == {"trip": 10.0}
+
+    def test_repair_is_a_no_op_when_a_write_lands_in_between(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        PairLedger._get_collection().update_many({}, {"$set": {"balance": 4.0, "group_balances.trip": 4.0}})
+        stale = self._pair(alice, bob)
+        # A live $inc that lands after the repair read the pair.
+        PairLedger._get_collection().update_many({}, {"$inc": {"balance": 1.0, "group_balances.trip": 1.0}})
+        assert ledger.repair_pair(stale, settle_seconds=-5) is False
+        assert services.get_friend_ledger(alice, bob).balance == 5.0
+
+    def test_repair_command_fixes_drifted_pairs_in_bulk(self, make_user):
+        alice, bob, cara = make_user("Alice"), make_user("Bob"), make_user("Cara")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        services.apply_balance_change(alice, cara, 3.0, "Lunch", source=EXPENSE)
+        PairLedger._get_collection().update_one(
+            {"_id": self._pair(alice, bob).id},
+            {"$set": {"balance": 4.0, "group_balances.trip": 4.0}},
+        )
+        out = StringIO()
+        call_command("repair_ledgers", batch_size=1, settle_seconds=-5, stdout=out)
+        assert "repaired 1" in out.getvalue()
+        assert services.get_friend_ledger(bob, alice).balance == -10.0
+
+    def test_breakdown_does_not_write(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        before = PairLedger._get_collection().find_one({})
+        breakdown = services.build_friend_breakdown(bob, alice)
+        assert breakdown["totals"] == {"you_owe": 10.0, "owes_you": 0.0}
+        assert PairLedger._get_collection().find_one({}) == before
+
+
+class TestReconcile:
+    def test_reports_and_fixes_drift_against_history(self, make_user):
+        alice, bob, cara = make_user("Alice"), make_user("Bob"), make_user("Cara")
+        Expense(
+            payer=alice,
+            group_name="Trip",
+            total_amount=20.0,
+            participants=[ExpenseParticipant(user=bob, amount=12.0), ExpenseParticipant(user=cara, amount=8.0)],
+        ).save()
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        services.apply_balance_change(alice, cara, 8.0, "Trip", source=EXPENSE)
+
+        report = reconcile.reconcile_range(*reconcile.user_ranges(10)[0])
+        assert (report["pairs"], report["drifted"], report["fixed"]) == (2, 1, 0)
+        assert report["samples"][0]["difference"] == {"trip": 2.0 if str(alice.id) < str(bob.id) else -2.0}
+
+        out = StringIO()
+        call_command("reconcile_ledgers", fix=True, range_size=1, stdout=out)
+        assert "1 drifted, 1 fixed" in out.getvalue()
+        view = services.get_friend_ledger(alice, bob)
+        assert view.balance == 12.0
+        assert ledger.replay_pair(view.pair)[0] == view.pair.group_balances
+        assert reconcile.reconcile_range(*reconcile.user_ranges(10)[0])["drifted"] == 0
+
+
+class TestLedgerVersions:
+    def test_writes_bump_both_sides_and_group_counters(self, make_user):
+        alice, bob, cara = make_user("Alice"), make_user("Bob"), make_user("Cara")
+        assert services.ledger_version(alice) == 0
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        services.apply_balance_changes([(alice, cara, 4.0, "Trip"), (alice, cara, 6.0, "Rent")], source=EXPENSE)
+        assert services.ledger_version(alice) == 3
+        assert services.ledger_version(bob) == 1
+        assert services.ledger_versions([alice.id, bob.id, cara.id], "rent") == {alice.id: "1.0", bob.id: "0.0", cara.id: "1.0"}
+
+    def test_repair_and_rename_bump_versions(self, make_user):
+        alice, bob = make_user("Alice"), make_user("Bob")
+        services.apply_balance_change(alice, bob, 10.0, "Trip", source=EXPENSE)
+        PairLedger._get_collection().update_many({}, {"$set": {"balance": 99.0, "group_balances.trip": 99.0}})
+        ledger.repair_pair(services.get_friend_ledger(alice, bob).pair, settle_seconds=-5)
+        assert services.ledger_versions([alice.id], "trip") == {alice.id: "2.0"}
+        services.bump_profile_version(bob)
+        assert services.ledger_version(alice) == 3
+        assert services.ledger_versions([bob.id], "trip") == {bob.id: "2.1"}
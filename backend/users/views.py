@@ -1,4 +1,5 @@
 from datetime import timezone
+import logging
 
 from django.conf import settings
 from django.utils.crypto import get_random_string
@@ -11,9 +12,11 @@ from rest_framework_simplejwt.views import TokenViewBase
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 
+from backend.loaders import BatchLoader
+from backend.pagination import TRUTHY_PARAMS, InvalidCursor, paginate
 from realtime import pubsub as realtime_pubsub
 
-from .models import User, FriendInvite, Friendship, Notification
+from .models import User, FriendInvite, Notification
 from .serializers import (
     SignupSerializer,
     LoginSerializer,
@@ -23,6 +26,9 @@ from .serializers import (
 )
 from . import services
 
+logger = logging.getLogger(__name__)
+
+
 def _isoformat_utc(value):
     if not value:
         return None
@@ -41,8 +47,12 @@ def serialize_user(user):
     }
 
 
-def serialize_friendship_entry(entry):
-    friend = entry.friend
+def make_loader() -> BatchLoader:
+    return BatchLoader({User: User.SUMMARY_FIELDS})
+
+
+def serialize_friendship_entry(entry, loader=None):
+    friend = loader.resolve(User, entry.friend_id) if loader else entry.friend
     return {
         "id": str(friend.id),
         "name": friend.name,
@@ -53,13 +63,14 @@ def serialize_friendship_entry(entry):
     }
 
 
-def serialize_invite(invite):
+def serialize_invite(invite, loader=None):
+    inviter = loader.resolve(User, invite._data.get('inviter')) if loader else invite.inviter
     return {
         "id": str(invite.id),
         "status": invite.status,
         "note": invite.note or '',
         "created_at": _isoformat_utc(invite.created_at),
-        "inviter": serialize_user(invite.inviter),
+        "inviter": serialize_user(inviter),
         "invitee_email": invite.invitee_email,
     }
 
@@ -78,9 +89,10 @@ def serialize_settlement_record(record, email_delivered=False):
     }
 
 
-def serialize_notification(notification):
+def serialize_notification(notification, loader=None):
     if not notification:
         return None
+    actor = loader.resolve(User, notification._data.get('actor')) if loader else notification.actor
     return {
         "id": str(notification.id),
         "kind": notification.kind,
@@ -88,7 +100,7 @@ def serialize_notification(notification):
         "body": notification.body or '',
         "is_read": bool(notification.is_read),
         "created_at": _isoformat_utc(notification.created_at),
-        "actor": serialize_user(notification.actor) if notification.actor else None,
+        "actor": serialize_user(actor) if actor else None,
         "data": notification.data or {},
     }
 
@@ -223,8 +235,14 @@ class FriendListView(APIView):
     def get(self, request):
         user = request.user
         services.attach_pending_invites_to_user(user)
-        friendships = Friendship.objects(user=user).order_by('friend__name')
-        results = [serialize_friendship_entry(entry) for entry in friendships]
+        ledgers = services.list_friend_ledgers(user)
+        loader = make_loader()
+        loader.queue(User, *(entry.friend_id for entry in ledgers))
+        friendships = sorted(
+            ledgers,
+            key=lambda entry: ((loader.resolve(User, entry.friend_id) or User()).name or '').lower(),
+        )
+        results = [serialize_friendship_entry(entry, loader) for entry in friendships]
         you_owe = sum(abs(entry.balance) for entry in friendships if entry.balance < 0)
         owes_you = sum(entry.balance for entry in friendships if entry.balance > 0)
         return Response({
@@ -243,11 +261,18 @@ class FriendInviteListView(APIView):
         invites = FriendInvite.objects(
             status=FriendInvite.STATUS_PENDING,
             invitee_user=user,
-        ).order_by('-created_at')
-        serialized = [serialize_invite(invite) for invite in invites]
+        )
+        try:
+            # The pending count drives the nav badge, so it is always included.
+            page = paginate(invites, request.query_params, default_limit=50, max_limit=100, with_total=True)
+        except InvalidCursor as exc:
+            return Response({"error": str(exc)}, status=400)
+        loader = make_loader()
+        loader.queue(User, *(invite._data.get('inviter') for invite in page["items"]))
         return Response({
-            "count": len(serialized),
-            "results": serialized,
+            "count": page["total"],
+            "results": [serialize_invite(invite, loader) for invite in page["items"]],
+            "next": page["next"],
         })
 
 
@@ -314,7 +339,7 @@ class FriendInviteDecisionView(APIView):
         if action == 'accept':
             invite.mark_status(FriendInvite.STATUS_ACCEPTED)
             services.ensure_friendship(invite.inviter, request.user)
-            friendship = Friendship.objects(user=request.user, friend=invite.inviter).first()
+            friendship = services.get_friend_ledger(request.user, invite.inviter)
             payload = {
                 "invite": serialize_invite(invite),
                 "friend": serialize_friendship_entry(friendship) if friendship else None,
@@ -353,11 +378,11 @@ class FriendBreakdownView(APIView):
         friend = User.objects(id=friend_id).first()
         if not friend:
             return Response({"error": "Friend not found."}, status=404)
-        friendship = Friendship.objects(user=request.user, friend=friend).first()
+        friendship = services.get_friend_ledger(request.user, friend)
         if not friendship:
             return Response({"error": "You are not connected to this person."}, status=404)
         try:
-            breakdown = services.build_friend_breakdown(request.user, friend)
+            breakdown = services.build_friend_breakdown(request.user, friend, ledger=friendship)
         except services.SettlementError as exc:
             return Response({"error": str(exc)}, status=400)
         payload = {
@@ -374,7 +399,7 @@ class FriendSettlementView(APIView):
             return Response({"error": "Friend not found."}, status=404)
         if str(friend.id) == str(request.user.id):
             return Response({"error": "You cannot settle with yourself."}, status=400)
-        friendship = Friendship.objects(user=request.user, friend=friend).first()
+        friendship = services.get_friend_ledger(request.user, friend)
         if not friendship:
             return Response({"error": "You are not connected to this person."}, status=404)
         payload = request.data or {}
@@ -407,7 +432,7 @@ class FriendFullSettlementView(APIView):
             return Response({"error": "Friend not found."}, status=404)
         if str(friend.id) == str(request.user.id):
             return Response({"error": "You cannot settle with yourself."}, status=400)
-        friendship = Friendship.objects(user=request.user, friend=friend).first()
+        friendship = services.get_friend_ledger(request.user, friend)
         if not friendship:
             return Response({"error": "You are not connected to this person."}, status=404)
         try:
@@ -430,21 +455,25 @@ class FriendFullSettlementView(APIView):
 
 class NotificationListView(APIView):
     def get(self, request):
-        try:
-            limit = int(request.query_params.get('limit', 20))
-        except (TypeError, ValueError):
-            limit = 20
-        limit = max(1, min(limit, 100))
-        unread_only = str(request.query_params.get('unread_only', '')).lower() in {"1", "true", "yes"}
+        unread_only = str(request.query_params.get('unread_only', '')).lower() in TRUTHY_PARAMS
         queryset = Notification.objects(user=request.user)
         if unread_only:
             queryset = queryset.filter(is_read=False)
-        notifications = list(queryset.order_by('-created_at').limit(limit))
+        try:
+            page = paginate(queryset, request.query_params, default_limit=20, max_limit=100)
+        except InvalidCursor as exc:
+            return Response({"error": str(exc)}, status=400)
         unread_count = Notification.objects(user=request.user, is_read=False).count()
-        return Response({
+        loader = make_loader()
+        loader.queue(User, *(entry._data.get('actor') for entry in page["items"]))
+        payload = {
             "unread": unread_count,
-            "results": [serialize_notification(entry) for entry in notifications],
-        })
+            "results": [serialize_notification(entry, loader) for entry in page["items"]],
+            "next": page["next"],
+        }
+        if "total" in page:
+            payload["total"] = page["total"]
+        return Response(payload)
 
 
 class NotificationReadView(APIView):
@@ -481,6 +510,7 @@ class ProfileUpdateView(APIView):
         user = request.user
         name = request.data.get('name', '').strip()
         username = request.data.get('username', '').strip()
+        previous_profile = (user.name, user.username)
 
         if name:
             user.name = name
@@ -493,6 +523,16 @@ class ProfileUpdateView(APIView):
             user.username = username
         
         user.save()
+        if user.name != previous_profile[0]:
+            # Cached simplification plans show this name.
+            services.bump_profile_version(user)
+        if (user.name, user.username) != previous_profile:
+            # Expenses cache participant names; one indexed update_many refreshes them.
+            try:
+                services.propagate_profile_snapshot(user)
+            except Exception as exc:
+                # The profile is saved; `backfill_expense_snapshots --refresh-profiles` repairs the copies.
+                logger.exception('Profile snapshot propagation failed for user %s: %s', user.id, exc)
         return Response({
             "user": serialize_user(user),
             "message": "Profile updated successfully."
@@ -0,0 +1,27 @@
+import { describe, it, expect } from 'vitest'
+import { parseEventFrames } from '../utils/eventStream.js'
+
+describe('parseEventFrames', () => {
+  it('parses complete frames and keeps the unfinished tail', () => {
+    const { frames, rest } = parseEventFrames(
+      'event: session\ndata: {"session_id": "abc"}\n\nevent: token\ndata: {"text": "Hi "}\n\nevent: tok'
+    )
+    expect(frames).toEqual([
+      { event: 'session', data: { session_id: 'abc' } },
+      { event: 'token', data: { text: 'Hi ' } },
+    ])
+    expect(rest).toBe('event: tok')
+  })
+
+  it('resumes from a tail split mid-frame', () => {
+    const first = parseEventFrames('event: done\ndata: {"stop_')
+    expect(first.frames).toEqual([])
+    const second = parseEventFrames(first.rest + 'reason": "end_turn"}\n\n')
+    expect(second.frames).toEqual([{ event: 'done', data: { stop_reason: 'end_turn' } }])
+    expect(second.rest).toBe('')
+  })
+
+  it('skips frames without JSON data', () => {
+    expect(parseEventFrames(': keepalive\n\nevent: token\ndata: oops\n\n').frames).toEqual([])
+  })
+})
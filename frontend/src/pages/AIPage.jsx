@@ -2,7 +2,7 @@ import { useEffect, useRef, useState } from 'react'
 import ReactMarkdown from 'react-markdown'
 import AppNav from '../components/AppNav.jsx'
 import { useAuth } from '../context/AuthContext.jsx'
-import { sendAIMessage } from '../services/aiApi.js'
+import { streamAIMessage } from '../services/aiApi.js'
 
 const uid = () => Math.random().toString(36).slice(2) + Date.now().toString(36)
 
@@ -75,9 +75,12 @@ const AIPage = () => {
   const [input,   setInput]   = useState('')
   const [loading, setLoading] = useState(false)
   const [error,   setError]   = useState('')
+  // The assistant reply as it streams in; null until the first token arrives.
+  const [draft,   setDraft]   = useState(null)
 
   const bottomRef = useRef(null)
   const inputRef  = useRef(null)
+  const abortRef  = useRef(null)
 
   const activeSession = sessions.find(s => s.id === activeId) ?? null
   const messages      = activeSession?.messages ?? []
@@ -98,10 +101,13 @@ const AIPage = () => {
     return () => { document.body.style.overflow = '' }
   }, [])
 
+  // Stop a reply in flight when leaving the page
+  useEffect(() => () => abortRef.current?.abort(), [])
+
   // Auto-scroll
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' })
-  }, [messages, loading])
+  }, [messages, loading, draft])
 
   // ── Session helpers ────────────────────────────────────────────────
   const createSession = () => {
@@ -135,9 +141,8 @@ const AIPage = () => {
       targetId = s.id
     }
 
-    // Snapshot history BEFORE state update (avoid stale closure in async)
-    const priorMsgs = sessions.find(s => s.id === targetId)?.messages ?? []
-    const history   = priorMsgs.slice(-6)
+    // Snapshot the server session BEFORE state update (avoid stale closure in async)
+    const serverSessionId = sessions.find(s => s.id === targetId)?.serverSessionId ?? null
 
     const userMsg = { role: 'user', content: message }
 
@@ -155,20 +160,39 @@ const AIPage = () => {
     setInput('')
     setLoading(true)
     setError('')
+    setDraft(null)
+
+    const controller = new AbortController()
+    abortRef.current = controller
 
     try {
-      const data = await sendAIMessage({ accessToken, refreshAccessToken }, message, history)
+      const data = await streamAIMessage({ accessToken, refreshAccessToken }, message, serverSessionId, {
+        signal:    controller.signal,
+        onSession: (id) => setSessions(prev => prev.map(s => (
+          s.id === targetId ? { ...s, serverSessionId: id } : s
+        ))),
+        onToken:   (_, reply) => setDraft(reply),
+        onTool:    () => setDraft(null),
+      })
       setSessions(prev => prev.map(s => {
         if (s.id !== targetId) return s
-        return { ...s, messages: [...s.messages, { role: 'assistant', content: data.reply }], updatedAt: Date.now() }
+        return {
+          ...s,
+          messages:        [...s.messages, { role: 'assistant', content: data.reply }],
+          serverSessionId: data.sessionId ?? s.serverSessionId,
+          updatedAt:       Date.now(),
+        }
       }))
     } catch (err) {
+      if (controller.signal.aborted) return
       setError(err.message || 'Something went wrong. Try again.')
       setSessions(prev => prev.map(s => {
         if (s.id !== targetId) return s
         return { ...s, messages: s.messages.filter(m => m !== userMsg) }
       }))
     } finally {
+      if (abortRef.current === controller) abortRef.current = null
+      setDraft(null)
       setLoading(false)
       inputRef.current?.focus()
     }
@@ -282,7 +306,16 @@ const AIPage = () => {
                     </div>
                   ))}
 
-                  {loading && (
+                  {loading && draft && (
+                    <div className="ai-msg ai-msg--ai">
+                      <div className="ai-avatar"><SparkleIcon size={14} /></div>
+                      <div className="ai-bubble ai-bubble--ai">
+                        <ReactMarkdown>{draft}</ReactMarkdown>
+                      </div>
+                    </div>
+                  )}
+
+                  {loading && !draft && (
                     <div className="ai-thinking">
                       <div className="ai-avatar"><SparkleIcon size={14} /></div>
                       <div className="ai-thinking__bubble">
@@ -248,6 +248,7 @@ const ActivityPage = () => {
   const { accessToken, refreshAccessToken, user } = useAuth()
   const [entries, setEntries] = useState([])
   const [total, setTotal] = useState(0)
+  const [nextCursor, setNextCursor] = useState(null)
   const [expensesById, setExpensesById] = useState({})
   const [loading, setLoading] = useState(true)
   const [loadingMore, setLoadingMore] = useState(false)
@@ -260,6 +261,7 @@ const ActivityPage = () => {
     if (!accessToken) {
       setEntries([])
       setTotal(0)
+      setNextCursor(null)
       setExpensesById({})
       setLoading(false)
       return
@@ -268,11 +270,12 @@ const ActivityPage = () => {
     setError('')
     try {
       const [activityPayload, expensesPayload] = await Promise.all([
-        expensesApi.fetchActivity({ accessToken, refreshAccessToken }, { limit: PAGE_SIZE, offset: 0 }),
+        expensesApi.fetchActivity({ accessToken, refreshAccessToken }, { limit: PAGE_SIZE, includeTotal: true }),
         expensesApi.fetchExpenses({ accessToken, refreshAccessToken }),
       ])
       setEntries(activityPayload?.results || [])
       setTotal(activityPayload?.total ?? activityPayload?.count ?? 0)
+      setNextCursor(activityPayload?.next || null)
       const map = {}
       ;(expensesPayload?.results || []).forEach((expense) => {
         map[expense.id] = expense
@@ -286,22 +289,22 @@ const ActivityPage = () => {
   }, [accessToken, refreshAccessToken])
 
   const loadMore = useCallback(async () => {
-    if (!accessToken || loadingMore) return
+    if (!accessToken || loadingMore || !nextCursor) return
     setLoadingMore(true)
     try {
       const activityPayload = await expensesApi.fetchActivity(
         { accessToken, refreshAccessToken },
-        { limit: PAGE_SIZE, offset: entries.length },
+        { limit: PAGE_SIZE, cursor: nextCursor },
       )
       const newEntries = activityPayload?.results || []
       setEntries((prev) => [...prev, ...newEntries])
-      setTotal(activityPayload?.total ?? activityPayload?.count ?? 0)
+      setNextCursor(activityPayload?.next || null)
     } catch (err) {
       setNotice(err?.message || 'Could not load more activity.')
     } finally {
       setLoadingMore(false)
     }
-  }, [accessToken, refreshAccessToken, entries.length, loadingMore])
+  }, [accessToken, refreshAccessToken, nextCursor, loadingMore])
 
   useEffect(() => {
     loadActivityFeed()
@@ -411,7 +414,7 @@ const ActivityPage = () => {
 
       <div className="activity-feed">{renderFeed()}</div>
 
-      {!loading && entries.length > 0 && entries.length < total ? (
+      {!loading && entries.length > 0 && nextCursor ? (
         <div className="activity-load-more">
           <button
             type="button"
@@ -419,7 +422,7 @@ const ActivityPage = () => {
             onClick={loadMore}
             disabled={loadingMore}
           >
-            {loadingMore ? 'Loading…' : `Load more (${total - entries.length} remaining)`}
+            {loadingMore ? 'Loading…' : `Load more (${Math.max(total - entries.length, 0)} remaining)`}
           </button>
         </div>
       ) : null}
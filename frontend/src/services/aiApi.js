@@ -1,7 +1,68 @@
-import { authorizedRequest } from './apiClient.js'
+import { API_BASE_URL, authorizedRequest, baseHeaders } from './apiClient.js'
+import { parseEventFrames } from '../utils/eventStream.js'
 
-export const sendAIMessage = (auth, message, history = []) =>
+// The server keeps the conversation; pass back the session_id from the previous reply.
+export const sendAIMessage = (auth, message, sessionId = null) =>
   authorizedRequest('/api/ai/chat/', auth, {
     method: 'POST',
-    body: JSON.stringify({ message, history }),
+    body: JSON.stringify(sessionId ? { message, session_id: sessionId } : { message }),
   })
+
+// Stream a reply from /api/ai/chat/stream/. `onSession` gets the server session id as soon as
+// the stream opens, `onToken` each text delta and `onTool` the name of each tool the model runs.
+// Resolves with { reply, sessionId } once the reply is done; rejects on an error event.
+export const streamAIMessage = async (auth, message, sessionId = null, handlers = {}, attempt = 0) => {
+  const { accessToken, refreshAccessToken } = auth || {}
+  if (!accessToken) throw new Error('Missing auth token')
+  const { onSession, onToken, onTool, signal } = handlers
+
+  const response = await fetch(`${API_BASE_URL}/api/ai/chat/stream/`, {
+    method: 'POST',
+    headers: { ...baseHeaders, Accept: 'text/event-stream', Authorization: `Bearer ${accessToken}` },
+    body: JSON.stringify(sessionId ? { message, session_id: sessionId } : { message }),
+    signal,
+  })
+
+  if (!response.ok) {
+    if (response.status === 401 && typeof refreshAccessToken === 'function' && attempt === 0) {
+      const freshToken = await refreshAccessToken()
+      return streamAIMessage({ ...auth, accessToken: freshToken }, message, sessionId, handlers, attempt + 1)
+    }
+    const payload = await response.json().catch(() => null)
+    throw new Error(payload?.error || 'AI assistant is unavailable right now. Try again in a moment.')
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let reply = ''
+  let currentSession = sessionId
+  try {
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) break
+      const { frames, rest } = parseEventFrames(buffer + decoder.decode(value, { stream: true }))
+      buffer = rest
+      for (const { event, data } of frames) {
+        if (event === 'session') {
+          currentSession = data.session_id
+          onSession?.(currentSession)
+        } else if (event === 'token') {
+          reply += data.text
+          onToken?.(data.text, reply)
+        } else if (event === 'tool') {
+          // Text before a tool call is thinking aloud; the answer comes in the next round.
+          reply = ''
+          onTool?.(data.name)
+        } else if (event === 'error') {
+          throw new Error(data.error)
+        } else if (event === 'done') {
+          return { reply, sessionId: currentSession }
+        }
+      }
+    }
+  } finally {
+    reader.cancel().catch(() => {})
+  }
+  throw new Error('The reply was cut off. Try again.')
+}
@@ -17,8 +17,12 @@ export const updateExpense = (auth, expenseId, data) =>
 export const deleteExpense = (auth, expenseId) =>
   authorizedRequest(`/api/expenses/${expenseId}/`, auth, { method: 'DELETE' })
 
-export const fetchActivity = (auth, { limit = 40, offset = 0 } = {}) =>
-  authorizedRequest(`/api/activity/?limit=${limit}&offset=${offset}`, auth)
+export const fetchActivity = (auth, { limit = 40, cursor = '', includeTotal = false } = {}) => {
+  const params = new URLSearchParams({ limit: String(limit) })
+  if (cursor) params.set('cursor', cursor)
+  if (includeTotal) params.set('include_total', '1')
+  return authorizedRequest(`/api/activity/?${params.toString()}`, auth)
+}
 
 export const scanReceipt = (auth, imageBase64, mimeType = 'image/jpeg') =>
   authorizedRequest('/api/expenses/scan-receipt/', auth, {
@@ -0,0 +1,21 @@
+// Split Server-Sent Events text into complete frames; the unfinished tail is returned as `rest`.
+export const parseEventFrames = (buffer) => {
+  const parts = buffer.replace(/\r\n/g, '\n').split('\n\n')
+  const rest = parts.pop()
+  const frames = []
+  for (const part of parts) {
+    let event = 'message'
+    const data = []
+    for (const line of part.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) data.push(line.slice(5).trimStart())
+    }
+    if (!data.length) continue
+    try {
+      frames.push({ event, data: JSON.parse(data.join('\n')) })
+    } catch {
+      // Not JSON: skip it rather than break the stream.
+    }
+  }
+  return { frames, rest }
+}